@@ -2,6 +2,7 @@ import re
 
 import pytest
 
+from ValidationTargets.CommandTarget import Command
 from exc import SetupError, ValidationError
 from fixtures.test_data_CommandTarget import command_target_test_data_pass, command_target_test_data_fail, \
     command_target_integration_test_data, command_target_network_context_test_data
@@ -70,3 +71,14 @@ def test__run__network_context__pass(command_with_instance, stack, data):
     set_test_data(e, test)
 
     e.run_test()
+
+
+def test__parse_timeout__pass():
+    assert Command._parse_timeout('5s') == 5.0
+    assert Command._parse_timeout(u'1.5') == 1.5
+
+
+@pytest.mark.parametrize('timeout', ['0s', 'five', '-1'])
+def test__parse_timeout__fail(timeout):
+    with pytest.raises(ValidationError):
+        Command._parse_timeout(timeout)
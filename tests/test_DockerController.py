@@ -1,9 +1,13 @@
+import threading
+
 import pytest
+from docker import errors
 from docker.models.containers import Container
 from docker.models.services import Service
 
 from DockerController import DockerController
 from exc import DeploymentError, NotFoundError, SetupError
+from tools import reaper
 from . import path
 
 
@@ -250,4 +254,129 @@ def test__get_container_logs__pass(controller, container):
     # b = container.exec_run(tty=True)
     logs = controller.get_container_logs(container)
 
-    assert logs
\ No newline at end of file
+    assert logs
+
+def test__get_or_pull_image__memoized(controller, mocker):
+    mocker.patch.object(controller, '_docker')
+    mocker.patch.object(DockerController, '_present_images', set())
+
+    controller.get_or_pull_image('vnfrobot-memo-test')
+    controller.get_or_pull_image('vnfrobot-memo-test')
+
+    controller._docker.images.get.assert_called_once_with('vnfrobot-memo-test')
+    controller._docker.images.pull.assert_not_called()
+
+
+def test__get_or_pull_image__loads_bundle_once(controller, mocker, tmpdir):
+    bundle = tmpdir.join('sidecar.tar')
+    bundle.write('not really a tarball')
+    mocker.patch.object(controller, '_docker')
+    mocker.patch.object(DockerController, '_present_images', set())
+    mocker.patch.object(DockerController, '_loaded_bundles', set())
+    mocker.patch('settings.Settings.sidecar_image_bundle', str(bundle))
+    controller._docker.images.get.side_effect = [errors.ImageNotFound('missing'), None,
+                                                 errors.ImageNotFound('missing'), None]
+
+    controller.get_or_pull_image('vnfrobot-sidecar')
+    controller.get_or_pull_image('busybox')
+
+    assert controller._docker.images.load.call_count == 1
+    controller._docker.images.pull.assert_not_called()
+    assert len(DockerController._loaded_bundles) == 1
+
+
+def test__run_busybox__labels__pass(controller, mocker):
+    mocker.patch.object(controller, '_docker')
+
+    controller.run_busybox(labels={'a': 'b'})
+
+    labels = controller._docker.containers.run.call_args[1]['labels']
+    assert labels['a'] == 'b'
+    assert reaper.owner_label in labels and reaper.created_label in labels
+
+
+def test__bundle_digest__cached_per_mtime(mocker, tmpdir):
+    bundle = tmpdir.join('sidecar.tar')
+    bundle.write('first')
+    bundle.setmtime(1000)
+    mocker.patch.object(DockerController, '_bundle_digests', {})
+    first = DockerController._bundle_digest(str(bundle))
+
+    assert DockerController._bundle_digest(str(bundle)) == first
+    assert len(DockerController._bundle_digests) == 1
+    bundle.write('second')
+    bundle.setmtime(2000)
+    assert DockerController._bundle_digest(str(bundle)) != first
+    assert len(DockerController._bundle_digests) == 2
+
+
+def test__exec_with_timeout__killed(controller, mocker):
+    mocker.patch('DockerController.BuiltIn')
+    kill = mocker.patch.object(controller, 'kill_host_process')
+    released = threading.Event()
+    kill.side_effect = lambda pid: released.set()
+
+    def stream(exec_id, stream=False):
+        yield 'partial output'
+        released.wait(5)
+
+    container = mocker.MagicMock()
+    container.name = 'redis'
+    container.client.api.exec_start.side_effect = stream
+    container.client.api.exec_inspect.return_value = {'Pid': 4242, 'ExitCode': None}
+
+    res = controller._exec_with_timeout(container, 'abcdef', 0.1)
+
+    kill.assert_called_once_with(4242)
+    assert res == {'code': 124, 'res': 'partial output', 'timeout': True}
+
+
+def test__exec_with_timeout__pass(controller, mocker):
+    container = mocker.MagicMock()
+    container.client.api.exec_start.return_value = iter(['PO', 'NG'])
+    container.client.api.exec_inspect.return_value = {'Pid': 4242, 'ExitCode': 0}
+
+    assert controller._exec_with_timeout(container, 'abcdef', 5) == {'code': 0, 'res': 'PONG'}
+
+
+def test__pull_images__pass(controller, mocker):
+    mocker.patch.object(controller, '_docker')
+    mocker.patch.object(controller, '_docker_api')
+    present = mocker.MagicMock()
+    present.attrs = {'RepoDigests': ['redis@sha256:abc']}
+    stale = mocker.MagicMock()
+    stale.attrs = {'RepoDigests': ['nginx@sha256:old']}
+    images = {'redis:alpine': present, 'nginx:1.13': stale}
+
+    def get(image):
+        for name in (image, image + ':latest'):
+            if name in images:
+                return images[name]
+        raise errors.ImageNotFound('missing')
+    controller._docker.images.get.side_effect = get
+    controller._docker_api._result.side_effect = lambda res, json: {
+        'Descriptor': {'digest': 'sha256:abc' if 'redis' in res else 'sha256:new'}}
+    controller._docker_api._get.side_effect = lambda url: url
+    controller._docker_api._url.side_effect = lambda path, image: path.format(image)
+
+    def pull(repository, tag=None):
+        images['{}:{}'.format(repository, tag)] = present
+    controller._docker_api.pull.side_effect = pull
+
+    res = controller.pull_images(['redis:alpine', 'nginx:1.13', 'postgres'], workers=3)
+
+    assert res['redis:alpine'] is None
+    assert res['nginx:1.13'] >= 0
+    assert res['postgres'] >= 0
+    pulled = sorted(c[0][0] + ':' + c[1]['tag'] for c in controller._docker_api.pull.call_args_list)
+    assert pulled == ['nginx:1.13', 'postgres:latest']
+
+
+def test__pull_images__fail(controller, mocker):
+    mocker.patch.object(controller, '_docker')
+    mocker.patch.object(controller, '_docker_api')
+    controller._docker.images.get.side_effect = errors.ImageNotFound('missing')
+    controller._docker_api.pull.side_effect = errors.NotFound('pull access denied for ngnix')
+
+    with pytest.raises(DeploymentError, match='Could not pull image ngnix:latest: pull access denied'):
+        controller.pull_images(['ngnix:latest'])
@@ -0,0 +1,159 @@
+import pytest
+from docker.models.services import Service
+
+from LocalDockerController import LocalDockerController, LocalService
+from exc import DeploymentError
+from tools import compose, reaper
+from . import path
+
+
+class FakeContainer(object):
+    def __init__(self, name, service, status='running', exit_code=0, restarting=False, restarts=0, error=''):
+        self.id = '{}-id'.format(name)
+        self.name = name
+        self.labels = {LocalDockerController.service_label: service, compose.project_label: 'stack'}
+        self.attrs = {
+            'Config': {'Image': 'redis:alpine'},
+            'Mounts': [{'Name': 'stack_data', 'Destination': '/data'}],
+            'RestartCount': restarts,
+            'State': {'Status': status, 'ExitCode': exit_code, 'Restarting': restarting, 'Error': error}
+        }
+
+
+@pytest.fixture
+def local(mocker):
+    ctl = LocalDockerController(base_dir=path)
+    mocker.patch.object(ctl, '_docker')
+    mocker.patch.object(ctl, '_docker_api')
+    return ctl
+
+
+def test__get_services__pass(local):
+    local._docker.containers.list.return_value = [FakeContainer('stack_web_1', 'stack_web'),
+                                                  FakeContainer('stack_db_2', 'stack_db'),
+                                                  FakeContainer('stack_db_1', 'stack_db')]
+
+    services = local.get_services('stack')
+
+    assert [s.name for s in services] == ['stack_db', 'stack_web']
+    assert all(isinstance(s, Service) for s in services)
+    assert services[0].id == 'stack_db'
+    assert services[0].attrs['Spec']['Mode']['Replicated']['Replicas'] == 2
+    assert services[0].attrs['Spec']['Labels'] == {reaper.namespace_label: 'stack', compose.spec_hash_label: None}
+    assert services[0].attrs['Spec']['TaskTemplate']['ContainerSpec']['Image'] == 'redis:alpine'
+    local._docker.containers.list.assert_called_once_with(
+        all=True, filters={'label': '{}=stack'.format(compose.project_label)})
+
+
+def test__get_tasks__pass(local):
+    local._docker.containers.list.return_value = [
+        FakeContainer('stack_web_1', 'stack_web'),
+        FakeContainer('stack_db_1', 'stack_db', status='restarting', exit_code=1, restarting=True, restarts=2),
+        FakeContainer('stack_job_1', 'stack_job', status='exited'),
+        FakeContainer('stack_api_1', 'stack_api', status='created', error='executable file not found in $PATH'),
+        FakeContainer('other_web_1', 'other_web')]
+
+    tasks = dict((t['ServiceID'], t) for t in local.get_tasks(['stack_web', 'stack_db', 'stack_job', 'stack_api']))
+
+    assert sorted(tasks) == ['stack_api', 'stack_db', 'stack_job', 'stack_web']
+    assert tasks['stack_web']['Status']['State'] == 'running'
+    assert tasks['stack_db']['ID'] == 'stack_db_1-id.2'
+    assert tasks['stack_db']['Status'] == {'State': 'failed', 'Err': '', 'ContainerStatus': {'ExitCode': 1}}
+    assert tasks['stack_job']['Status']['State'] == 'complete'
+    assert tasks['stack_api']['Status']['State'] == 'starting'
+    assert tasks['stack_api']['Status']['Err'] == 'executable file not found in $PATH'
+
+
+def test__deploy_stack__pass(local, mocker, tmpdir):
+    mocker.patch.object(local, 'get_or_pull_image')
+    descriptor = tmpdir.join('docker-compose.yml')
+    descriptor.write('''services:
+  web:
+    image: nginx
+    depends_on:
+    - db
+    networks:
+    - front
+    - back
+  db:
+    image: redis
+    networks:
+    - back
+networks:
+  front:
+  back:
+''')
+    local._docker.networks.list.return_value = []
+    local._docker_api.create_container.side_effect = lambda image, name, **kwargs: {'Id': '{}-id'.format(name)}
+
+    assert local.deploy_stack(str(descriptor), 'stack')
+
+    created = [c[1]['name'] for c in local._docker_api.create_container.call_args_list]
+    assert created == ['stack_db_1', 'stack_web_1']
+    started = [c[0][0] for c in local._docker_api.start.call_args_list]
+    assert started == ['stack_db_1-id', 'stack_web_1-id']
+    labels = local._docker_api.create_container.call_args_list[1][1]['labels']
+    assert labels[LocalDockerController.service_label] == 'stack_web'
+    assert labels[compose.service_label] == 'web'
+    assert labels[reaper.namespace_label] == 'stack'
+    assert reaper.owner_label in labels
+    local._docker_api.connect_container_to_network.assert_called_once_with('stack_web_1-id', 'stack_front',
+                                                                          aliases=['web'])
+    networks = sorted(c[0][0] for c in local._docker.networks.create.call_args_list)
+    assert networks == ['stack_back', 'stack_front']
+
+
+def test__deploy_stack__hashes__pass(local, mocker, tmpdir):
+    mocker.patch.object(local, 'get_or_pull_image')
+    descriptor = tmpdir.join('docker-compose.yml')
+    descriptor.write('services:\n  web:\n    image: nginx\n  db:\n    image: redis\n')
+    kept, changed, removed = (FakeContainer('stack_db_1', 'stack_db'), FakeContainer('stack_web_1', 'stack_web'),
+                              FakeContainer('stack_job_1', 'stack_job'))
+    kept.labels[compose.spec_hash_label] = 'same'
+    changed.labels[compose.spec_hash_label] = 'old'
+    for container in (kept, changed, removed):
+        container.remove = mocker.MagicMock()
+    local._docker.containers.list.return_value = [kept, changed, removed]
+    local._docker.networks.list.return_value = []
+    local._docker_api.create_container.side_effect = lambda image, name, **kwargs: {'Id': '{}-id'.format(name)}
+
+    assert local.deploy_stack(str(descriptor), 'stack', hashes={'stack_db': 'same', 'stack_web': 'new'})
+
+    kept.remove.assert_not_called()
+    changed.remove.assert_called_once_with(force=True)
+    removed.remove.assert_called_once_with(force=True)
+    created = local._docker_api.create_container.call_args_list
+    assert [c[1]['name'] for c in created] == ['stack_web_1']
+    assert created[0][1]['labels'][compose.spec_hash_label] == 'new'
+
+
+def test__reset_service__pass(local, mocker):
+    container = FakeContainer('stack_db_1', 'stack_db')
+    container.attrs['Mounts'] = [{'Type': 'volume', 'Name': 'stack_data', 'Destination': '/data'},
+                                 {'Type': 'bind', 'Source': '/etc/db', 'Destination': '/etc/db'}]
+    container.stop, container.reload = mocker.MagicMock(), mocker.MagicMock()
+    local._docker.containers.list.return_value = [container]
+    restore = mocker.patch.object(local, 'restore_volume')
+    recreate = mocker.patch.object(local, '_recreate')
+    service = LocalService.from_containers('stack_db', [container])
+
+    assert local.service_volumes(service) == ['stack_data']
+    local.reset_service(service, {'stack_data': 'snapshot'})
+
+    container.stop.assert_called_once_with()
+    restore.assert_called_once_with('snapshot', 'stack_data')
+    recreate.assert_called_once_with(container, [])
+
+
+def test__find_stack__fail(local):
+    local._docker.containers.list.return_value = []
+
+    with pytest.raises(DeploymentError, match='Stack stack not found'):
+        local.find_stack('stack')
+
+
+def test__update_service__unsupported__fail(local):
+    service = LocalService.from_containers('stack_web', [FakeContainer('stack_web_1', 'stack_web')])
+
+    with pytest.raises(DeploymentError, match='env not supported without Swarm'):
+        local.update_service(service, env=['A=b'])
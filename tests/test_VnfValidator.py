@@ -1,6 +1,7 @@
 import os
 
 from robot.running import TestSuiteBuilder
+from VnfValidator import VnfValidator
 
 
 def test__enforce_validation():
@@ -8,3 +9,35 @@ def test__enforce_validation():
     result = suite.run(output=None, variablefile=os.path.join('fixtures/robot/common.py'))
 
     assert result.statistics.total.all.failed > 0
+
+
+def test__run_keyword__profile__pass(tmpdir, mocker):
+    mocker.patch('VnfValidator.Settings.profile', 'Port')
+    mocker.patch('VnfValidator.BuiltIn')
+    validator = VnfValidator()
+    validator.suite_name = 'My Suite'
+    validator.test_name = 'Test 1'
+    validator.output_dir = str(tmpdir)
+    validator.keywords = {'Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}': lambda *args: 'result',
+                          'Set ${context_type} context to ${context}': lambda *args: None}
+
+    assert validator.run_keyword('Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}',
+                                 ['5000', 'state', 'is', 'open'], {}) == 'result'
+    validator.run_keyword('Set ${context_type} context to ${context}', ['service', 'sut'], {})
+
+    assert os.listdir(str(tmpdir)) == ['vnfrobot-profile-My_Suite-Test_1-001-Port_5000_state_is_open.pstats']
+
+
+def test__run_keyword__history_regression__fail(mocker):
+    mocker.patch('VnfValidator.Settings.history_fail', True)
+    builtin = mocker.patch('VnfValidator.BuiltIn')
+    validator = VnfValidator()
+    validator.history = mocker.MagicMock()
+    validator.history.record.return_value = '"Port 80: state is open" took 5 s'
+    validator.keywords = {'Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}': lambda *args: None}
+
+    validator.run_keyword('Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}', ['80', 'state', 'is', 'open'], {})
+
+    assert validator.history.record.call_args[0][1:] == ('Port 80: state is open', 'Port',
+                                                         mocker.ANY, 'PASS')
+    builtin.return_value.fail.assert_called_once()
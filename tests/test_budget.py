@@ -0,0 +1,118 @@
+import time
+
+from pytest import raises
+
+from exc import SetupError, ValidationError
+from tools import deadline, tracing
+from tools.budget import TimeBreakdown, classify, format_breakdown, parse_budgets
+from VnfValidator import VnfValidator
+
+
+def test__parse_budgets__pass():
+    assert parse_budgets('') == {}
+    assert parse_budgets('Port=3, File = 5.5') == {'Port': 3.0, 'File': 5.5}
+    assert parse_budgets({'Port': '3'}) == {'Port': 3.0}
+
+
+def test__parse_budgets__fail():
+    with raises(SetupError):
+        parse_budgets('Port:3')
+
+
+def test__format_breakdown__pass():
+    assert format_breakdown({'wait': 1.0, 'exec': 0.5}, 2.0) == \
+        'wait 1.00 s, exec 0.50 s, transfer 0.00 s, deploy 0.00 s, api 0.00 s, other 0.50 s'
+
+
+def test__time_breakdown__outermost_span__pass():
+    breakdown = TimeBreakdown()
+    tracing.add_listener(breakdown)
+    try:
+        with tracing.span('Port 80: state is open', 'keyword') as keyword:
+            with tracing.span('prepare', 'phase'):
+                with tracing.span('DockerController.get_container', 'controller'):
+                    with tracing.span('api.inspect_container', 'api'):
+                        time.sleep(0.01)
+            with tracing.span('run', 'phase'):
+                with tracing.span('wait_on_container_status', 'wait'):
+                    with tracing.span('api.inspect_container', 'api'):
+                        time.sleep(0.02)
+                with tracing.span('DockerController.execute', 'controller'):
+                    with tracing.span('api.exec_start', 'api'):
+                        time.sleep(0.01)
+            result = breakdown.collect(keyword['depth'])
+    finally:
+        tracing.remove_listener(breakdown)
+
+    assert sorted(result.keys()) == ['api', 'exec', 'wait']
+    assert result['wait'] >= 0.02
+    assert result['exec'] >= 0.01
+    assert breakdown.suite == result
+    assert breakdown.collect() == {}
+
+
+def test__classify__local_mode__pass():
+    for controller in ('DockerController', 'LocalDockerController'):
+        assert classify({'cat': 'controller', 'name': '{}.execute'.format(controller)}) == 'exec'
+        assert classify({'cat': 'controller', 'name': '{}.put_file'.format(controller)}) == 'transfer'
+        assert classify({'cat': 'controller', 'name': '{}.deploy_stack'.format(controller)}) == 'deploy'
+        assert classify({'cat': 'controller', 'name': '{}.get_container'.format(controller)}) is None
+
+
+def test__run_keyword__budget__fail(mocker):
+    builtin = mocker.patch('VnfValidator.BuiltIn')
+    validator = VnfValidator()
+    validator.keyword_budgets = {'Port': 0.01}
+    validator.keywords = {'Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}': lambda *args: time.sleep(0.02)}
+
+    validator.run_keyword('Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}', ['80', 'state', 'is', 'open'], {})
+
+    message = builtin.return_value.fail.call_args[0][0]
+    assert message.startswith('Time budget exceeded: "Port 80: state is open" took')
+    assert 'other' in message
+
+
+def raise_assertion(message):
+    raise AssertionError(message)
+
+
+def test__run_keyword__budget__stops_keyword(mocker):
+    builtin = mocker.patch('VnfValidator.BuiltIn')
+    builtin.return_value.fail.side_effect = lambda message: raise_assertion(message)
+    validator = VnfValidator()
+    validator.keyword_budgets = {'Port': 0.05}
+
+    def hanging(*args):
+        # like the keywords of the library: validation errors, including DeadlineExceeded, fail the keyword
+        try:
+            while True:
+                deadline.check('polling')
+                time.sleep(0.01)
+        except ValidationError as exc:
+            builtin().fail(exc)
+
+    validator.keywords = {'Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}': hanging}
+    start = time.time()
+
+    with raises(AssertionError) as exc:
+        validator.run_keyword('Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}', ['80', 'state', 'is', 'open'],
+                              {})
+
+    assert time.time() - start < 1
+    assert str(exc.value).startswith('Time budget exceeded: "Port 80: state is open" took')
+    assert 'other' in str(exc.value)
+
+
+def test__run_keyword__suite_budget__fail(mocker):
+    builtin = mocker.patch('VnfValidator.BuiltIn')
+    builtin.return_value.fail.side_effect = AssertionError
+    validator = VnfValidator()
+    validator.suite_budget = 1
+    validator._suite_start = time.time() - 2
+    keyword = mocker.MagicMock()
+    validator.keywords = {'Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}': keyword}
+
+    with raises(AssertionError):
+        validator.run_keyword('Port ${raw_entity}: ${raw_prop} ${matcher} ${raw_val}', ['80', 'state', 'is', 'open'],
+                              {})
+    keyword.assert_not_called()
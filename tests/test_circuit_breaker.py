@@ -0,0 +1,100 @@
+import time
+
+from pytest import raises
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+
+from exc import CircuitOpenError
+from tools.circuit_breaker import CircuitBreaker, guard_requests
+
+
+class FakeApi(object):
+    def __init__(self, error=ConnectionError('Connection refused')):
+        self.calls = 0
+        self.down = True
+        self.error = error
+
+    def _get(self, url, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise self.error
+        return url
+
+
+def fail(breaker, exc):
+    with raises(type(exc)):
+        with breaker.guard(failures=(ConnectionError,)):
+            raise exc
+
+
+def test__circuit_breaker__opens_after_threshold__pass():
+    breaker = CircuitBreaker('Docker daemon', threshold=2, reset_timeout=60)
+    fail(breaker, ConnectionError('refused'))
+    assert breaker.state == CircuitBreaker.CLOSED
+    fail(breaker, ConnectionError('refused'))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with raises(CircuitOpenError, match='Docker daemon is unavailable.*ConnectionError: refused'):
+        breaker.before()
+
+
+def test__circuit_breaker__other_errors_reset__pass():
+    breaker = CircuitBreaker('Docker daemon', threshold=2, reset_timeout=60)
+    fail(breaker, ConnectionError('refused'))
+    fail(breaker, ValueError('not found'))
+    fail(breaker, ConnectionError('refused'))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test__circuit_breaker__half_open__pass():
+    breaker = CircuitBreaker('Docker daemon', threshold=1, reset_timeout=0.05, max_reset_timeout=1)
+    fail(breaker, ConnectionError('refused'))
+    time.sleep(0.06)
+
+    # the probe fails, so the breaker opens again and waits twice as long
+    fail(breaker, ConnectionError('refused'))
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    with raises(CircuitOpenError):
+        breaker.before()
+    time.sleep(0.05)
+
+    with breaker.guard():
+        pass
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test__circuit_breaker__disabled__pass():
+    breaker = CircuitBreaker('Docker daemon', threshold=0)
+    for _ in range(5):
+        fail(breaker, ConnectionError('refused'))
+    breaker.before()
+
+
+def test__guard_requests__fail_fast__pass():
+    api = guard_requests(FakeApi(), CircuitBreaker('Docker daemon', threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with raises(ConnectionError):
+            api._get('/info')
+    with raises(CircuitOpenError):
+        api._get('/info')
+    assert api.calls == 2
+
+
+def test__guard_requests__read_timeout__pass():
+    api = guard_requests(FakeApi(ReadTimeout('Read timed out')), CircuitBreaker('Docker daemon', threshold=2))
+    for _ in range(5):
+        with raises(ReadTimeout):
+            api._get('/containers/sidecar/wait')
+    api.down = False
+    assert api._get('/info') == '/info'
+    assert api.calls == 6
+
+
+def test__guard_requests__connect_timeout__fail():
+    api = guard_requests(FakeApi(ConnectTimeout('Connect timed out')), CircuitBreaker('Docker daemon', threshold=2,
+                                                                                      reset_timeout=60))
+    for _ in range(2):
+        with raises(ConnectTimeout):
+            api._get('/info')
+    with raises(CircuitOpenError):
+        api._get('/info')
@@ -0,0 +1,205 @@
+import os
+
+import pytest
+from ruamel import yaml
+
+from exc import DeploymentError
+from tools import compose
+
+descriptor = '''version: "3.2"
+services:
+  web:
+    image: nginx:${NGINX_TAG:-1.13}
+    depends_on:
+    - api
+    ports:
+    - "8080:80"
+    - "127.0.0.1::443"
+    - "53/udp"
+    networks:
+      front:
+        aliases:
+        - www
+      back:
+    healthcheck:
+      test: ["CMD", "curl", "-f", "http://localhost"]
+      interval: 1m30s
+      retries: 3
+  api:
+    image: api
+    command: serve --port 3000
+    environment:
+      DB: db
+    env_file: api.env
+    expose:
+    - "3000"
+    volumes:
+    - data:/var/lib/api:ro
+    - ./config:/etc/api
+    - /tmp
+    secrets:
+    - token
+    networks:
+    - back
+    deploy:
+      replicas: 2
+      restart_policy:
+        condition: on-failure
+        max_attempts: 5
+  db:
+    image: redis
+networks:
+  front:
+  back:
+    driver: overlay
+volumes:
+  data:
+  shared:
+    external: true
+secrets:
+  token:
+    file: ./token.txt
+'''
+
+
+@pytest.fixture
+def deployment(tmpdir):
+    tmpdir.join('api.env').write('# comment\nDEBUG=1\nDB=other\n')
+    path = tmpdir.join('docker-compose.yml')
+    path.write(descriptor)
+    return compose.parse(str(path), 'stack', env={}), str(tmpdir)
+
+
+def test__interpolate__pass():
+    env = {'A': 'a', 'EMPTY': ''}
+
+    assert compose.interpolate('$A ${A} $$A ${B:-b} ${EMPTY:-e} ${EMPTY-e} $B', env) == 'a a $A b e  '
+    assert compose.interpolate({'k': ['${A}', 1]}, env) == {'k': ['a', 1]}
+    with pytest.raises(DeploymentError, match='Variable B is required: set B'):
+        compose.interpolate('${B:?set B}', env)
+
+
+def test__duration__pass():
+    assert compose.duration('1m30s') == 90
+    assert compose.duration('500ms') == 0.5
+    assert compose.duration(10) == 10
+    with pytest.raises(DeploymentError):
+        compose.duration('10 seconds')
+
+
+def test__start_order__pass():
+    services = {'web': {'depends_on': ['api']}, 'api': {'depends_on': ['db']}, 'db': {}, 'cache': {}}
+
+    assert compose.start_order(services) == ['db', 'api', 'cache', 'web']
+    with pytest.raises(DeploymentError, match='Circular'):
+        compose.start_order({'a': {'depends_on': ['b']}, 'b': {'depends_on': ['a']}})
+
+
+def test__parse__networks_and_volumes__pass(deployment):
+    res, _ = deployment
+
+    assert sorted(res['networks']) == ['back', 'default', 'front']
+    assert res['networks']['back']['name'] == 'stack_back'
+    assert res['networks']['back']['driver'] == 'bridge'
+    assert res['networks']['front']['labels'] == {compose.project_label: 'stack', compose.network_label: 'front'}
+    assert res['volumes']['data']['name'] == 'stack_data'
+    assert res['volumes']['shared'] == dict(res['volumes']['shared'], name='shared', external=True)
+
+
+def test__parse__containers__pass(deployment):
+    res, base_dir = deployment
+    containers = dict((c['name'], c) for c in res['containers'])
+
+    assert [c['name'] for c in res['containers']] == ['stack_api_1', 'stack_api_2', 'stack_db_1', 'stack_web_1']
+
+    web = containers['stack_web_1']
+    assert web['service'] == 'stack_web'
+    assert web['image'] == 'nginx:1.13'
+    assert web['networks'] == [('stack_back', ['web']), ('stack_front', ['web', 'www'])]
+    assert web['host_config']['port_bindings'] == {80: 8080, 443: ('127.0.0.1',), '53/udp': None}
+    assert web['host_config']['restart_policy'] == {'Name': 'always'}
+    assert web['create']['healthcheck'] == {'test': ['CMD', 'curl', '-f', 'http://localhost'],
+                                            'interval': 90 * 10 ** 9, 'retries': 3}
+    assert web['create']['labels'] == {compose.project_label: 'stack', compose.service_label: 'web',
+                                       compose.number_label: '1', compose.oneoff_label: 'False'}
+
+    api = containers['stack_api_2']
+    assert api['create']['labels'][compose.number_label] == '2'
+    assert api['create']['command'] == 'serve --port 3000'
+    assert api['create']['environment'] == {'DB': 'db', 'DEBUG': '1'}
+    assert api['create']['ports'] == [3000]
+    assert api['create']['volumes'] == ['/tmp']
+    assert api['host_config']['binds'] == ['stack_data:/var/lib/api:ro',
+                                           '{}:/etc/api:rw'.format(os.path.join(base_dir, 'config')),
+                                           '{}:/run/secrets/token:ro'.format(os.path.join(base_dir, 'token.txt'))]
+    assert api['host_config']['restart_policy'] == {'Name': 'on-failure', 'MaximumRetryCount': 5}
+    assert api['host_config']['network_mode'] == 'stack_back'
+
+    assert containers['stack_db_1']['networks'] == [('stack_default', ['db'])]
+
+
+def test__unpublish_ports__pass():
+    assert compose.unpublish_ports(['8080:80', '127.0.0.1:8080:80/udp', '443', 53,
+                                    {'target': 80, 'published': 8080, 'mode': 'host'}]) == \
+        ['80', '127.0.0.1::80/udp', '443', '53', {'target': 80, 'mode': 'host'}]
+
+
+def test__parse__remap_ports__pass(tmpdir):
+    tmpdir.join('api.env').write('')
+    path = tmpdir.join('docker-compose.yml')
+    path.write(descriptor)
+
+    res = compose.parse(str(path), 'stack', env={}, remap_ports=True)
+
+    web = [c for c in res['containers'] if c['name'] == 'stack_web_1'][0]
+    assert web['host_config']['port_bindings'] == {80: None, 443: ('127.0.0.1',), '53/udp': None}
+
+
+def test__parse__undefined_network__fail(tmpdir):
+    path = tmpdir.join('docker-compose.yml')
+    path.write('services:\n  web:\n    image: nginx\n    networks:\n    - missing\n')
+
+    with pytest.raises(DeploymentError, match='undefined network missing'):
+        compose.parse(str(path), 'stack', env={})
+
+
+def test__spec_hashes__pass(tmpdir):
+    env_file = tmpdir.join('api.env')
+    env_file.write('DEBUG=1\n')
+    path = tmpdir.join('docker-compose.yml')
+    path.write(descriptor)
+    hashes = compose.spec_hashes(str(path), 'stack', env={})
+
+    assert sorted(hashes) == ['stack_api', 'stack_db', 'stack_web']
+    assert hashes == compose.spec_hashes(str(path), 'stack', env={})
+
+    env_file.write('DEBUG=0\n')
+    changed = compose.spec_hashes(str(path), 'stack', images={'redis': 'redis@sha256:abc'}, env={})
+    assert changed['stack_web'] == hashes['stack_web']
+    assert changed['stack_api'] != hashes['stack_api']
+    assert changed['stack_db'] != hashes['stack_db']
+
+
+def test__render__pass(tmpdir):
+    path = tmpdir.join('docker-compose.yml')
+    path.write(descriptor)
+    hashes = {'stack_web': 'h1', 'stack_api': 'h2', 'stack_db': 'h3'}
+
+    res = yaml.safe_load(compose.render(str(path), 'stack', hashes, images={'redis': 'redis@sha256:abc',
+                                                                            'api': 'sha256:def'}, env={}))
+
+    assert res['services']['web']['image'] == 'nginx:${NGINX_TAG:-1.13}'
+    assert res['services']['web']['deploy']['labels'] == {compose.spec_hash_label: 'h1'}
+    assert res['services']['api']['image'] == 'api'
+    assert res['services']['api']['deploy']['replicas'] == 2
+    assert res['services']['db']['image'] == 'redis@sha256:abc'
+
+
+def test__render__remap_ports__pass(tmpdir):
+    path = tmpdir.join('docker-compose.yml')
+    path.write(descriptor)
+
+    res = yaml.safe_load(compose.render(str(path), 'stack', env={}, remap_ports=True))
+
+    assert res['services']['web']['ports'] == ['80', '127.0.0.1::443', '53/udp']
+    assert 'deploy' not in res['services']['web']
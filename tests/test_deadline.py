@@ -0,0 +1,81 @@
+import subprocess
+import time
+
+from pytest import raises
+from requests.exceptions import ReadTimeout
+
+from exc import DeadlineExceeded
+from tools import deadline
+from tools.deadline import bound_requests
+from tools.wait_on import wait_on_condition, wait_on_process
+
+
+class FakeApi(object):
+    timeout = 60
+
+    def __init__(self):
+        self.timeouts = []
+
+    def _get(self, url, **kwargs):
+        self.timeouts.append(kwargs.get('timeout'))
+        if kwargs.get('timeout') is not None and kwargs.get('timeout') < 0.1:
+            time.sleep(kwargs.get('timeout'))
+            raise ReadTimeout()
+        return url
+
+
+def test__deadline__nested__pass():
+    assert deadline.remaining() is None
+    with deadline.deadline(10, 'outer'):
+        with deadline.deadline(100, 'inner'):
+            assert deadline.remaining() <= 10
+            assert deadline.bound(40, 'wait') <= 10
+        with deadline.deadline(100, 'cleanup', nested=False):
+            assert deadline.remaining() > 10
+        with deadline.deadline(0, 'disabled'):
+            assert deadline.remaining() <= 10
+    assert deadline.remaining() is None
+    assert deadline.bound(40, 'wait') == 40
+
+
+def test__deadline__check__fail():
+    with deadline.deadline(0.01, 'keyword'):
+        time.sleep(0.02)
+        with raises(DeadlineExceeded):
+            deadline.check('run phase')
+
+
+def test__bound_requests__pass():
+    api = bound_requests(FakeApi())
+    assert api._get('/info') == '/info'
+    assert api.timeouts == [None]
+
+    with deadline.deadline(5, 'keyword'):
+        api._get('/info')
+    assert 4 < api.timeouts[-1] <= 5
+
+
+def test__bound_requests__fail():
+    api = bound_requests(FakeApi())
+    with deadline.deadline(0.05, 'keyword'):
+        with raises(DeadlineExceeded):
+            api._get('/containers/json')
+
+
+def test__wait_on_condition__deadline__fail():
+    with deadline.deadline(0.1, 'keyword'):
+        with raises(DeadlineExceeded):
+            wait_on_condition(lambda: False, delay=0.01)
+
+    with raises(AssertionError):
+        wait_on_condition(lambda: False, delay=0.01, timeout=0.05)
+
+
+def test__wait_on_process__deadline__fail(mocker):
+    mocker.patch('tools.wait_on.BuiltIn')
+    proc = subprocess.Popen(['sleep', '5'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    start = time.time()
+    with deadline.deadline(0.1, 'keyword'):
+        with raises(DeadlineExceeded):
+            wait_on_process(proc)
+    assert time.time() - start < 2
@@ -0,0 +1,74 @@
+import os
+
+from mock import MagicMock
+
+from tools.history import KeywordHistory, StartupHistory, percentile, image_digests
+
+
+def test__percentile__pass():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(range(1, 101), 95) == 95
+    assert percentile([1], 95) == 1
+
+
+def test__image_digests__pass():
+    service = MagicMock()
+    service.name = 'sut_web'
+    service.attrs = {'Spec': {'TaskTemplate': {'ContainerSpec': {'Image': 'nginx:latest@sha256:abc'}}}}
+    broken = MagicMock()
+    broken.attrs = {}
+
+    assert image_digests([service, broken]) == {'sut_web': 'nginx:latest@sha256:abc'}
+
+
+def run(history, durations, statement='Port 80: state is open', status='PASS'):
+    history.start_run('suite', __file__, {'sut_web': 'nginx'})
+    return [history.record('test', statement, 'Port', d, status) for d in durations]
+
+
+def test__record__regression__pass(tmpdir):
+    history = KeywordHistory(os.path.join(str(tmpdir), 'history.db'), window=5, min_runs=3, ratio=2)
+
+    for duration in [1.0, 1.1, 0.9]:
+        assert run(history, [duration]) == [None]
+
+    assert run(history, [2.1]) == [None]
+    regression = run(history, [5.0])[0]
+    assert 'Port 80: state is open' in regression
+    assert 'p95 of 2.10 s' in regression
+
+
+def test__record__min_runs_and_failed__pass(tmpdir):
+    history = KeywordHistory(os.path.join(str(tmpdir), 'history.db'), window=5, min_runs=3, ratio=2)
+
+    assert run(history, [1.0, 1.0]) == [None, None]
+    assert run(history, [10.0]) == [None]
+    assert run(history, [100.0], status='FAIL') == [None]
+    assert history.baseline('test', 'Port 80: state is open') == {'runs': 3, 'p50': 1.0, 'p95': 10.0}
+    assert history.baseline('test', 'File /etc: exists') is None
+
+
+def test__startup_history__timeout__pass(tmpdir):
+    history = StartupHistory(str(tmpdir.join('history.db')), min_runs=3, factor=1.5, floor=10, ceiling=600)
+    assert history.timeout('web', 'nginx:1.13', 40) == 40
+    assert history.poll_interval('web', 'nginx:1.13', 0.1) == 0.1
+
+    for duration in (2, 2.5, 3):
+        history.record('web', 'nginx:1.13', duration)
+        history.record('db', 'postgres:10', duration * 30)
+
+    assert history.timeout('web', 'nginx:1.13', 40) == 10
+    assert history.poll_interval('web', 'nginx:1.13', 0.1) == 0.25
+    assert history.timeout('db', 'postgres:10', 40) == 135
+    assert history.poll_interval('db', 'postgres:10', 0.1) == 2.0
+    assert history.timeout('web', 'nginx:1.14', 40) == 40
+
+
+def test__startup_history__key__pass():
+    service = MagicMock()
+    service.name = 'random_name_web'
+    service.attrs = {'Spec': {'Labels': {'com.docker.stack.namespace': 'random_name'},
+                              'TaskTemplate': {'ContainerSpec': {'Image': 'nginx:1.13@sha256:abc'}}}}
+
+    assert StartupHistory.key(service) == ('web', 'nginx:1.13')
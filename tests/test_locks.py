@@ -0,0 +1,37 @@
+import pytest
+
+from settings import Settings
+from tools import locks
+
+
+@pytest.fixture(autouse=True)
+def lock_dir(mocker, tmpdir):
+    mocker.patch.object(Settings, 'lock_dir', str(tmpdir))
+    mocker.patch.object(Settings, 'wait_delay', 0.01)
+
+
+def test__file_lock__pass():
+    with locks.file_lock('volume'):
+        with pytest.raises(AssertionError, match='Timeout'):
+            with locks.file_lock('volume', timeout=0.05):
+                pass
+        with locks.file_lock('other', timeout=0.05):
+            pass
+    with locks.file_lock('volume', timeout=0.05):
+        pass
+
+
+def test__slot__pass():
+    with locks.slot('deploy', 2) as first:
+        with locks.slot('deploy', 2) as second:
+            assert sorted([first, second]) == [0, 1]
+            with pytest.raises(AssertionError, match='Timeout'):
+                with locks.slot('deploy', 2, timeout=0.05):
+                    pass
+        with locks.slot('deploy', 2, timeout=0.05) as third:
+            assert third == second
+
+
+def test__slot__unlimited__pass():
+    with locks.slot('deploy', 0) as number:
+        assert number is None
@@ -0,0 +1,59 @@
+import os
+
+from tools import tracing
+from tools.metrics import Histogram, PrometheusExporter
+
+
+def test__histogram__observe__pass():
+    h = Histogram('latency_seconds', 'Latency.', [1, 0.1], ('call',))
+    h.observe(0.1, 'a')
+    h.observe(0.5, 'a')
+    h.observe(5, 'a')
+
+    lines = h.expose()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{call="a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{call="a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{call="a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{call="a"} 5.6' in lines
+    assert 'latency_seconds_count{call="a"} 3' in lines
+
+
+def test__histogram__escape_labels__pass():
+    h = Histogram('latency_seconds', 'Latency.', [1], ('call',))
+    h.observe(0.1, 'say "hi"')
+
+    assert 'latency_seconds_count{call="say \\"hi\\""} 1' in h.expose()
+
+
+def test__exporter__spans__pass(tmpdir):
+    exporter = PrometheusExporter('suite', [1, 10], [0.01])
+    tracing.add_listener(exporter)
+    try:
+        with tracing.span('Command "ls": stdout contains bla', 'keyword', type='Command'):
+            with tracing.span('sidecar start', 'sidecar', kind='pool'):
+                pass
+        with tracing.span('deploy', 'setup'):
+            with tracing.span('api.create_service', 'api', method='POST'):
+                pass
+        with tracing.span('health check', 'setup'):
+            pass
+        with tracing.span('validate', 'phase'):
+            pass
+    finally:
+        tracing.remove_listener(exporter)
+
+    path = os.path.join(str(tmpdir), 'vnfrobot.prom')
+    exporter.write(path)
+    assert os.listdir(str(tmpdir)) == ['vnfrobot.prom']
+
+    with open(path) as f:
+        content = f.read()
+    assert 'vnfrobot_keyword_duration_seconds_count{suite="suite",type="Command"} 1' in content
+    assert 'vnfrobot_sidecar_lifecycle_seconds_count{suite="suite",operation="start",kind="pool"} 1' in content
+    assert 'vnfrobot_deployment_duration_seconds_count{suite="suite"} 1' in content
+    assert 'vnfrobot_health_check_wait_seconds_count{suite="suite"} 1' in content
+    assert 'vnfrobot_docker_api_duration_seconds_bucket{suite="suite",call="create_service",method="POST",le="0.01"}' \
+           in content
+    assert 'vnfrobot_last_run_timestamp_seconds{suite="suite"}' in content
+    assert 'validate' not in content
@@ -1,10 +1,12 @@
+import threading
 from tempfile import NamedTemporaryFile
 
 import pytest
 from pytest import fixture
 
-from exc import SetupError
-from tools import orchestrator
+from VnfValidator import VnfValidator
+from exc import SetupError, DeadlineExceeded, ValidationError, DeploymentError
+from tools import deadline, orchestrator
 from tools.orchestrator import DockerOrchestrator
 
 
@@ -33,3 +35,200 @@ def test___check_valid_yaml__fail(o, yaml_invalid):
             f.write(yaml_invalid)
             f.seek(0)
             o._check_valid_yaml(f.name)
+
+
+def background_orchestrator(mocker, deploy):
+    mocker.patch('tools.orchestrator.DockerOrchestrator._get_controller')
+    mocker.patch('tools.orchestrator.BuiltIn')
+    instance = VnfValidator()
+    instance.suite_source = 'bla.robot'
+    o = DockerOrchestrator(instance)
+    o.get_or_create_deployment = deploy
+    o.check_or_create_test_tool_volume = mocker.MagicMock()
+    o.warm_sidecar_pool = mocker.MagicMock()
+    return o
+
+
+def test__wait_for_setup__pass(mocker):
+    started = threading.Event()
+    release = threading.Event()
+
+    def deploy():
+        started.set()
+        release.wait(5)
+
+    o = background_orchestrator(mocker, deploy)
+    o.start_setup()
+    assert started.wait(5)
+    assert not o.setup_done()
+
+    with deadline.deadline(0.05, 'keyword'):
+        with pytest.raises(DeadlineExceeded):
+            o.wait_for_setup()
+
+    release.set()
+    o.wait_for_setup()
+    assert o.setup_done()
+    o.controller.get_or_pull_image.assert_called_once()
+    o.warm_sidecar_pool.assert_called_once()
+
+
+def test__wait_for_setup__assertion__fail(mocker):
+    def deploy():
+        assert False, 'docker stack deploy failed'
+
+    o = background_orchestrator(mocker, deploy)
+    replay = mocker.patch('tools.orchestrator.thread_log.replay')
+    o.robot_instance.orchestrator = o
+    for _ in range(2):
+        with pytest.raises(ValidationError, match='fatal error'):
+            o.robot_instance.wait_for_deployment()
+    assert o.robot_instance.fatal_error
+    replay.assert_called_once_with(o.background_log)
+
+
+def test__wait_for_setup__fail(mocker):
+    def deploy():
+        raise SetupError('Descriptor not found')
+
+    o = background_orchestrator(mocker, deploy)
+    with pytest.raises(SetupError, match='Descriptor not found'):
+        o.wait_for_setup()
+    assert o.setup_done()
+
+    o.robot_instance.orchestrator = o
+    with pytest.raises(ValidationError, match='fatal error'):
+        o.robot_instance.wait_for_deployment()
+    assert o.robot_instance.fatal_error
+
+
+def test__update_deployment__pass(mocker):
+    o = background_orchestrator(mocker, None)
+    o.robot_instance.descriptor_file = 'docker-compose.yml'
+    o.pull_images = mocker.MagicMock()
+    o._get_deployment = mocker.MagicMock()
+    ctl = o.controller
+    ctl.spec_hashes.return_value = {'stack_web': 'new', 'stack_db': 'same', 'stack_cache': 'added'}
+    ctl.deployed_hashes.return_value = {'stack_web': 'old', 'stack_db': 'same', 'stack_job': 'gone'}
+    ctl.get_tasks.return_value = [{'ID': 't1'}]
+
+    o._update_deployment('stack')
+
+    ctl.get_tasks.assert_called_once_with(['stack_web'])
+    ctl.deploy_stack.assert_called_once_with('docker-compose.yml', 'stack', hashes=ctl.spec_hashes.return_value,
+                                             owned=True)
+    o._get_deployment.assert_called_once_with('stack', created=True, changed={'stack_web', 'stack_cache'},
+                                              ignore_tasks={'t1'})
+
+
+def test__update_deployment__unchanged__pass(mocker):
+    o = background_orchestrator(mocker, None)
+    o.pull_images = mocker.MagicMock()
+    o._get_deployment = mocker.MagicMock()
+    o.controller.spec_hashes.return_value = {'stack_web': 'same'}
+    o.controller.deployed_hashes.return_value = {'stack_web': 'same'}
+
+    o._update_deployment('stack')
+
+    o.controller.deploy_stack.assert_not_called()
+    o._get_deployment.assert_called_once_with('stack', created=True, changed=set(), ignore_tasks=set())
+
+
+def test__reset_tag__pass():
+    assert orchestrator.reset_tag('reset') == []
+    assert orchestrator.reset_tag('Reset:redis, app') == ['redis', 'app']
+    assert orchestrator.reset_tag('redis') is None
+    assert orchestrator.reset_tag('resets') is None
+
+
+def test__reset_targets__pass(mocker):
+    o = background_orchestrator(mocker, None)
+    test_case = mocker.MagicMock(tags=['reset:redis'], steps=[[''], ['', 'Reset service app']])
+    o.robot_instance.test_cases = [mocker.MagicMock(tags=[], steps=[]), test_case]
+
+    assert o.reset_targets('stack') == ['stack_app', 'stack_redis']
+
+    test_case.tags = ['reset']
+    assert o.reset_targets('stack') is None
+
+
+def test__reset_services__pass(mocker):
+    o = background_orchestrator(mocker, None)
+    mocker.patch('tools.orchestrator.parse_descriptor', return_value={})
+    wait = mocker.patch('tools.orchestrator.wait_on_services_status')
+    instance = o.robot_instance
+    instance.deployment_name = 'stack'
+    redis, app = mocker.MagicMock(id='id1'), mocker.MagicMock(id='id2')
+    redis.name, app.name = 'stack_redis', 'stack_app'
+    instance.services = [redis, app]
+    old_redis, old_app, new_redis = mocker.MagicMock(), mocker.MagicMock(), mocker.MagicMock()
+    ctl = o.controller
+    ctl.service_label = 'label'
+    old_redis.labels, old_app.labels = {'label': 'stack_redis'}, {'label': 'stack_app'}
+    instance.containers = [old_redis, old_app]
+    ctl.get_tasks.return_value = [{'ID': 't1'}]
+    ctl.service_volumes.return_value = ['stack_data']
+    ctl.get_containers_for_service.return_value = [new_redis]
+    o.snapshots = {'stack_data': 'snapshot'}
+
+    o.reset_services(['redis'])
+
+    ctl.get_tasks.assert_called_once_with(['id1'])
+    ctl.reset_service.assert_called_once_with(redis, {'stack_data': 'snapshot'})
+    assert wait.call_args[0][1] == [redis]
+    assert wait.call_args[1]['ignore_tasks'] == {'t1'}
+    assert wait.call_args[1]['readiness'].ready == {'stack_app'}
+    assert instance.containers == [old_app, new_redis]
+
+    with pytest.raises(DeploymentError, match='unknown service stack_web'):
+        o.reset_services(['web'])
+
+
+def test__place__pass(mocker):
+    mocker.patch('tools.orchestrator.Settings.docker_hosts', ['tcp://a', 'tcp://b'])
+    mocker.patch('tools.orchestrator.BuiltIn')
+    place = mocker.patch('tools.orchestrator.placement.place', return_value=(
+        'tcp://b', {'tcp://a': None, 'tcp://b': {'stacks': 1, 'latency': 0.002}}))
+    get_controller = mocker.patch('tools.orchestrator.DockerOrchestrator._get_controller')
+    instance = VnfValidator()
+    instance.suite_source = 'bla.robot'
+
+    o = DockerOrchestrator(instance)
+
+    assert o.docker_host == 'tcp://b'
+    place.assert_called_once_with(['tcp://a', 'tcp://b'], deployment_name=None)
+    get_controller.assert_called_once_with('bla.robot', 'tcp://b')
+
+
+def test__place__fail(mocker):
+    mocker.patch('tools.orchestrator.Settings.docker_hosts', ['tcp://a'])
+    mocker.patch('tools.orchestrator.placement.place', side_effect=DeploymentError('No Docker host is reachable'))
+    instance = VnfValidator()
+    instance.suite_source = 'bla.robot'
+
+    with pytest.raises(SetupError, match='No Docker host is reachable'):
+        DockerOrchestrator(instance)
+
+
+def test__get_deployment__lazy_containers__pass(mocker):
+    o = background_orchestrator(mocker, None)
+    mocker.patch('tools.orchestrator.parse_descriptor', return_value={
+        'stack_app': {'depends_on': {'stack_redis'}}, 'stack_redis': {'depends_on': set()}, 'stack_ui': {}})
+    o._health_check_services = mocker.MagicMock()
+    o.required_services = mocker.MagicMock(return_value=['stack_app'])
+    instance = o.robot_instance
+    services = []
+    for name in ('stack_app', 'stack_redis', 'stack_ui'):
+        service = mocker.MagicMock()
+        service.name = name
+        services.append(service)
+    o.controller.get_services.return_value = services
+    o.controller.get_containers_for_service.side_effect = lambda name: ['{}_1'.format(name)]
+
+    o._get_deployment('stack', created=True)
+
+    assert [c[0][0] for c in o.controller.get_containers_for_service.call_args_list] == ['stack_app', 'stack_redis']
+    assert o.pending_containers == ['stack_ui']
+    instance.orchestrator = o
+    assert instance.containers == ['stack_app_1', 'stack_redis_1', 'stack_ui_1']
+    assert o.pending_containers == []
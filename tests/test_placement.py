@@ -0,0 +1,120 @@
+import json
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from exc import DeploymentError
+from settings import Settings
+from tools import compose, placement, reaper
+
+
+@pytest.fixture(autouse=True)
+def lock_dir(mocker, tmpdir):
+    mocker.patch.object(Settings, 'lock_dir', str(tmpdir))
+
+
+@pytest.fixture
+def daemon():
+    """Stand-in Docker API that runs two stacks, one Swarm stack and one local deployment."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if '/_ping' in self.path:
+                body = 'OK'
+            elif '/services' in self.path:
+                body = json.dumps([{'Spec': {'Labels': {reaper.namespace_label: 'stack'}}},
+                                   {'Spec': {'Labels': {reaper.namespace_label: 'stack'}}}])
+            elif '/containers' in self.path:
+                body = json.dumps([{'Labels': {compose.project_label: 'local'}}])
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'tcp://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test__probe__pass(daemon):
+    load = placement.probe(daemon)
+
+    assert load['stacks'] == 2
+    assert 0 <= load['latency'] < 5
+
+
+def test__probe__unreachable__pass():
+    assert placement.probe('tcp://127.0.0.1:1', probes=1, timeout=1) is None
+
+
+def test__place__least_loaded__pass(mocker):
+    loads = {'tcp://a': {'stacks': 1, 'latency': 0.01},
+             'tcp://b': {'stacks': 3, 'latency': 0.001},
+             'tcp://c': {'stacks': 0, 'latency': 0.05}}
+    mocker.patch('tools.placement.probe', side_effect=lambda host: loads[host])
+
+    host, probed = placement.place(['tcp://a', 'tcp://b', 'tcp://c'])
+
+    assert host == 'tcp://b'
+    assert probed == loads
+
+
+def test__place__claims__pass(mocker):
+    mocker.patch('tools.placement.probe', return_value={'stacks': 0, 'latency': 0.01})
+    owner = mocker.patch('tools.reaper.owner')
+    mocker.patch('tools.reaper.is_orphan', return_value=False)
+    hosts = ['tcp://a', 'tcp://b']
+
+    placed = []
+    for pid in range(3):
+        owner.return_value = 'host:{}'.format(pid)
+        placed.append(placement.place(hosts)[0])
+
+    assert placed == ['tcp://a', 'tcp://b', 'tcp://a']
+    owner.return_value = 'host:1'
+    placement.release('tcp://b')
+    assert placement._read_claims() == {'tcp://a': ['host:0', 'host:2']}
+    assert placement.place(hosts)[0] == 'tcp://b'
+
+
+def test__place__dead_claims__pass(mocker):
+    mocker.patch('tools.placement.probe', return_value={'stacks': 0, 'latency': 0.01})
+    with open(placement.state_file(), 'w') as f:
+        json.dump({'tcp://a': ['gone:1']}, f)
+    mocker.patch('tools.reaper.is_orphan', return_value=True)
+
+    assert placement.place(['tcp://a', 'tcp://b'])[0] == 'tcp://a'
+
+
+def test__place__unreachable__fail(mocker):
+    mocker.patch('tools.placement.probe', return_value=None)
+
+    with pytest.raises(DeploymentError, match='No Docker host is reachable'):
+        placement.place(['tcp://a', 'tcp://b'])
+
+
+def test__place__deployment__pass(mocker):
+    mocker.patch('tools.placement.probe', return_value={'stacks': 0, 'latency': 0.01})
+    mocker.patch('tools.placement._runs', side_effect=lambda host, name: host == 'tcp://b')
+
+    assert placement.place(['tcp://a', 'tcp://b'], deployment_name='stack')[0] == 'tcp://b'
+    assert placement._read_claims() == {}
+
+
+def test__place__deployment__fail(mocker):
+    mocker.patch('tools.placement.probe', return_value={'stacks': 0, 'latency': 0.01})
+    mocker.patch('tools.placement._runs', return_value=False)
+
+    with pytest.raises(DeploymentError, match='Deployment stack not found'):
+        placement.place(['tcp://a', 'tcp://b'], deployment_name='stack')
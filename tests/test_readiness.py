@@ -0,0 +1,130 @@
+import os
+import threading
+
+from tools.readiness import Readiness, listening_ports, parse_descriptor, required_services
+from . import path
+
+proc_net_tcp = '''  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 00000000:0050 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 12345 1
+   1: 0B00007F:A1B2 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 12346 1
+   2: 0100007F:1F90 0100007F:C350 01 00000000:00000000 00:00000000 00000000     0        0 12347 1
+'''
+
+
+class FakeContainer(object):
+    def __init__(self, health=None):
+        self.attrs = {'State': {'Health': {'Status': health}} if health else {}}
+
+
+class FakeController(object):
+    service_label = 'com.docker.swarm.service.name'
+
+    def __init__(self, containers, listening=''):
+        self.containers = containers
+        self.listening = listening
+        self.probed = []
+        self._lock = threading.Lock()
+
+    def get_containers(self, filters=None):
+        service = filters['label'].split('=')[1]
+        with self._lock:
+            self.probed.append(service)
+        return [self.containers[service]] if service in self.containers else []
+
+    def _run_in_container(self, container, command):
+        return {'code': 0, 'res': self.listening}
+
+
+def test__parse_descriptor__pass(tmpdir):
+    descriptor = tmpdir.join('dc.yml')
+    descriptor.write('''version: "3.2"
+services:
+  web:
+    image: nginx
+    depends_on:
+    - api
+    ports:
+    - "8080:80"
+    - "127.0.0.1:8443:443/tcp"
+    - "53/udp"
+    - target: 9000
+      published: 9000
+  api:
+    image: api
+    depends_on:
+    - db
+    expose:
+    - "3000"
+  db:
+    image: redis
+''')
+    graph = parse_descriptor(str(descriptor), 'stack')
+    assert graph['stack_web'] == {'image': 'nginx', 'depends_on': {'stack_api'}, 'ports': {80, 443, 9000}}
+    assert graph['stack_api'] == {'image': 'api', 'depends_on': {'stack_db'}, 'ports': {3000}}
+    assert graph['stack_db'] == {'image': 'redis', 'depends_on': set(), 'ports': set()}
+
+    assert required_services(graph, ['stack_api']) == {'stack_api', 'stack_db'}
+
+
+def test__parse_descriptor__fixture__pass():
+    graph = parse_descriptor(os.path.join(path, 'fixtures', 'dc-test-2svc.yml'), 'stack')
+    assert graph['stack_sut']['ports'] == {80}
+    assert graph['stack_redis']['ports'] == set()
+
+
+def test__parse_descriptor__missing_file__pass():
+    assert parse_descriptor('/does/not/exist.yml', 'stack') == {}
+
+
+def test__listening_ports__pass():
+    assert listening_ports(proc_net_tcp) == {80, 41394}
+
+
+def test__readiness__healthcheck__pass():
+    controller = FakeController({'stack_web': FakeContainer('starting')})
+    readiness = Readiness(controller, {'stack_web': {'depends_on': set(), 'ports': {80}}})
+    assert readiness.update({'stack_web'}) == set()
+
+    controller.containers['stack_web'] = FakeContainer('healthy')
+    assert readiness.update({'stack_web'}) == {'stack_web'}
+
+
+def test__readiness__ports__pass():
+    controller = FakeController({'stack_web': FakeContainer()})
+    readiness = Readiness(controller, {'stack_web': {'depends_on': set(), 'ports': {80}}})
+    assert readiness.update({'stack_web'}) == set()
+
+    controller.listening = proc_net_tcp
+    assert readiness.update({'stack_web'}) == {'stack_web'}
+
+
+def test__readiness__dependency_order__pass():
+    graph = {
+        'stack_web': {'depends_on': {'stack_api'}, 'ports': set()},
+        'stack_api': {'depends_on': {'stack_db'}, 'ports': set()},
+        'stack_db': {'depends_on': set(), 'ports': set()},
+        'stack_cache': {'depends_on': set(), 'ports': set()},
+    }
+    controller = FakeController(dict((s, FakeContainer()) for s in graph))
+    readiness = Readiness(controller, graph)
+    running = set(graph)
+
+    assert readiness.update(running) == {'stack_db', 'stack_cache'}
+    assert sorted(controller.probed) == ['stack_cache', 'stack_db']
+    assert readiness.update(running) == {'stack_db', 'stack_cache', 'stack_api'}
+    readiness.update(running)
+    assert readiness.ready == set(graph)
+
+
+def test__readiness__required__pass():
+    graph = {
+        'stack_web': {'depends_on': {'stack_api'}, 'ports': set()},
+        'stack_api': {'depends_on': set(), 'ports': set()},
+        'stack_slow': {'depends_on': set(), 'ports': set()},
+    }
+    controller = FakeController({'stack_api': FakeContainer()})
+    readiness = Readiness(controller, graph, required=['stack_api'])
+
+    readiness.update(set(graph))
+    assert controller.probed == ['stack_api']
+    assert readiness.ready == {'stack_api'}
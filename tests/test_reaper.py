@@ -0,0 +1,123 @@
+import os
+import socket
+import subprocess
+import time
+
+from docker import errors
+from mock import MagicMock
+
+from tools import reaper
+
+
+def network(name, in_use=0):
+    n = MagicMock()
+    n.name = name
+    n.remove.side_effect = [errors.APIError('network {} has active endpoints'.format(name))] * in_use + [None]
+    return n
+
+
+def test__remove_networks__scoped__pass():
+    client = MagicMock()
+    client.networks.list.return_value = [network('stack_default'), network('stack_m2m', in_use=1)]
+
+    assert reaper.remove_networks(client, 'stack') == ['stack_m2m']
+    client.networks.list.assert_called_once_with(filters={'label': 'com.docker.stack.namespace=stack'})
+
+
+def test__remove_stack__waits_for_networks__pass():
+    client = MagicMock()
+    service = MagicMock()
+    client.services.list.return_value = [service]
+    client.secrets.list.return_value = []
+    client.configs.list.return_value = []
+    m2m = network('stack_m2m', in_use=2)
+    client.networks.list.side_effect = lambda filters: [m2m] if m2m.remove.call_count < 3 else []
+
+    assert reaper.remove_stack(client, 'stack', timeout=5, delay=0.01) == []
+    service.remove.assert_called_once()
+    assert m2m.remove.call_count == 3
+
+
+def test__remove_stack__timeout__fail():
+    client = MagicMock()
+    client.services.list.return_value = []
+    client.secrets.list.return_value = []
+    client.configs.list.return_value = []
+    client.networks.list.return_value = [network('stack_m2m', in_use=100)]
+
+    assert reaper.remove_stack(client, 'stack', timeout=0.05, delay=0.01) == ['stack_m2m']
+
+
+def dead_pid():
+    proc = subprocess.Popen(['true'])
+    proc.wait()
+    return proc.pid
+
+
+def test__labels__pass():
+    res = reaper.labels(foo='bar')
+    assert res[reaper.owner_label] == '{}:{}'.format(socket.gethostname(), os.getpid())
+    assert abs(float(res[reaper.created_label]) - time.time()) < 5
+    assert res['foo'] == 'bar'
+
+
+def test__is_orphan__pass():
+    host = socket.gethostname()
+    now = time.time()
+    alive = {reaper.owner_label: '{}:{}'.format(host, os.getpid()), reaper.created_label: str(now)}
+    dead = {reaper.owner_label: '{}:{}'.format(host, dead_pid()), reaper.created_label: str(now)}
+    remote = {reaper.owner_label: 'other-host:1', reaper.created_label: str(now - 100)}
+
+    assert not reaper.is_orphan(alive, 0, now)
+    assert reaper.is_orphan(dead, 0, now)
+    assert not reaper.is_orphan(remote, 0, now)
+    assert reaper.is_orphan(remote, 60, now)
+    assert not reaper.is_orphan({}, 60, now)
+
+
+def test__is_orphan__old_but_alive__pass():
+    now = time.time()
+    old = {reaper.owner_label: '{}:{}'.format(socket.gethostname(), os.getpid()),
+           reaper.created_label: str(now - 7 * 3600)}
+    remote = {reaper.owner_label: 'other-host:1'}
+
+    assert not reaper.is_orphan(old, 21600, now)
+    assert not reaper.is_orphan(remote, 60, now)
+
+
+def test__reap_orphans__pass():
+    host = socket.gethostname()
+    orphan = {reaper.owner_label: '{}:{}'.format(host, dead_pid()), reaper.created_label: str(time.time())}
+    mine = reaper.labels()
+
+    client = MagicMock()
+    marker = MagicMock()
+    marker.attrs = {'Spec': {'Labels': dict(orphan, **{reaper.namespace_label: 'crashed'})}}
+    client.configs.list.return_value = [marker]
+    client.services.list.return_value = []
+    client.secrets.list.return_value = []
+    client.networks.list.return_value = []
+    leaked, running = MagicMock(labels=orphan), MagicMock(labels=mine)
+    leaked.name, running.name = 'robot_sidecar_for_crashed', 'robot_sidecar_for_me'
+    client.containers.list.side_effect = lambda all, filters: \
+        [leaked, running] if filters['label'] == reaper.owner_label else []
+
+    removed = reaper.reap_orphans(client, 0)
+
+    assert removed == {'stacks': ['crashed'], 'containers': ['robot_sidecar_for_crashed'], 'networks': []}
+    leaked.remove.assert_called_once_with(force=True)
+    running.remove.assert_not_called()
+
+
+def test__remove_stack__without_swarm__pass():
+    client = MagicMock()
+    for collection in (client.services, client.secrets, client.configs):
+        collection.list.side_effect = errors.APIError('This node is not a swarm manager.')
+    container = MagicMock()
+    client.containers.list.return_value = [container]
+    client.networks.list.return_value = [network('stack_default')]
+
+    assert reaper.remove_stack(client, 'stack', timeout=0.05, delay=0.01) == []
+    container.remove.assert_called_once_with(force=True)
+    client.containers.list.assert_called_once_with(all=True, filters={'label': 'com.docker.stack.namespace=stack'})
+    assert reaper.reap_orphans(client, 0) == {'stacks': [], 'containers': [], 'networks': []}
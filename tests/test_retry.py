@@ -0,0 +1,123 @@
+from mock import MagicMock
+from pytest import raises
+from requests.exceptions import ConnectionError
+
+from tools import tracing
+from tools.retry import RetryBudget, RetryPolicy, operation, retry_requests, transient
+from tools.tracing import DaemonCallTracer, trace_requests
+
+
+def response(status, text=''):
+    r = MagicMock()
+    r.status_code = status
+    r.text = text
+    r.headers = {}
+    return r
+
+
+class FakeApi(object):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def _request(self, url, **kwargs):
+        self.calls += 1
+        r = self.responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    _get = _post = _put = _delete = _request
+
+
+def policies(attempts=3, size=50):
+    budget = RetryBudget(size)
+    return dict((name, RetryPolicy(name, attempts=attempts, base_delay=0.001, max_delay=0.002, retry_budget=budget))
+                for name in ('read', 'exec', 'mutate'))
+
+
+def test__operation__pass():
+    assert operation('_get', '/containers/json') == 'read'
+    assert operation('_post', '/containers/abc/exec') == 'exec'
+    assert operation('_post', '/exec/abc/start') == 'exec'
+    assert operation('_post', '/services/create') == 'mutate'
+
+
+def test__transient__pass():
+    assert transient('_get', '/containers/json', response(503, 'rpc error'))
+    assert transient('_post', '/services/create', response(500, 'failed to allocate gateway'))
+    assert transient('_delete', '/networks/abc', response(500, 'internal error'))
+    assert transient('_post', '/containers/abc/exec', response(502))
+
+    assert not transient('_get', '/containers/json', response(200))
+    assert not transient('_get', '/containers/abc/json', response(404, 'No such container'))
+    assert not transient('_post', '/services/create', response(500, 'internal error'))
+    assert not transient('_post', '/exec/abc/start', response(500, 'rpc error'))
+    assert not transient('_post', '/services/abc/update', response(409, 'update out of sequence'))
+
+
+def test__transient__client_errors__fail():
+    assert not transient('_get', '/networks/app_typo', response(404, 'network app_typo not found'))
+    assert not transient('_post', '/services/create', response(
+        409, 'rpc error: code = 2 desc = name conflicts with an existing object'))
+    assert not transient('_post', '/networks/create', response(409, 'network with name app already exists'))
+    assert not transient('_post', '/services/create', response(500, 'rpc error: code = 2 desc = out of sequence'))
+    assert not transient('_post', '/services/create', response(500, 'context deadline exceeded'))
+
+
+def test__retry_requests__transient__pass():
+    api = retry_requests(FakeApi([response(503), response(503), response(200)]), policies())
+    assert api._get('/containers/json').status_code == 200
+    assert api.calls == 3
+
+
+def test__retry_requests__attempts__fail():
+    api = retry_requests(FakeApi([response(503)] * 5), policies(attempts=2))
+    assert api._get('/containers/json').status_code == 503
+    assert api.calls == 3
+
+
+def test__retry_requests__budget__fail():
+    p = policies(size=1)
+    api = retry_requests(FakeApi([response(503), response(503), response(503), response(503)]), p)
+    assert api._get('/containers/json').status_code == 503
+    assert api.calls == 2
+    assert api._get('/containers/json').status_code == 503
+    assert api.calls == 3
+
+
+def test__retry_requests__connection_error__pass():
+    api = retry_requests(FakeApi([ConnectionError('reset'), response(200)]), policies())
+    assert api._get('/info').status_code == 200
+
+    api = retry_requests(FakeApi([ConnectionError('reset'), response(200)]), policies())
+    with raises(ConnectionError):
+        api._post('/services/create')
+
+
+def test__retry_requests__stream__pass():
+    api = retry_requests(FakeApi([response(503), response(200)]), policies())
+    assert api._get('/containers/abc/logs', stream=True).status_code == 503
+
+
+def test__retry_requests__streamed_body__pass():
+    with open(__file__, 'rb') as bundle:
+        api = retry_requests(FakeApi([response(500, 'try again'), response(200)]), policies())
+        assert api._post('/images/load', data=bundle).status_code == 500
+    api = retry_requests(FakeApi([response(500, 'try again'), response(200)]), policies())
+    assert api._post('/build', data=(chunk for chunk in ['a', 'b'])).status_code == 500
+    api = retry_requests(FakeApi([response(500, 'try again'), response(200)]), policies())
+    assert api._post('/services/create', data='{}').status_code == 200
+
+
+def test__retry_requests__traced__pass():
+    tracer = DaemonCallTracer()
+    tracing.add_listener(tracer)
+    try:
+        api = trace_requests(retry_requests(FakeApi([response(503), response(200)]), policies()))
+        api._get('/containers/json')
+    finally:
+        tracing.remove_listener(tracer)
+
+    assert tracer.records[0]['retries'] == 1
+    assert tracer.counters['retry'] == 1
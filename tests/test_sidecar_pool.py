@@ -0,0 +1,73 @@
+from mock import MagicMock
+
+from DockerController import DockerController
+from tools.sidecar_pool import SidecarPool
+
+volumes = {'goss-helper': {'bind': '/goss', 'mode': 'ro'}}
+
+
+def _controller():
+    controller = MagicMock(DockerController)
+    controller.get_or_create_long_running_sidecar.side_effect = \
+        lambda name, **kwargs: MagicMock(id='id_{}'.format(name), name=name)
+    return controller
+
+
+def test__acquire__creates_sidecar():
+    controller = _controller()
+    pool = SidecarPool(controller, size=1)
+
+    sidecar = pool.acquire('net', volumes)
+
+    assert sidecar.name.startswith(pool.prefix)
+    _, kwargs = controller.get_or_create_long_running_sidecar.call_args
+    assert kwargs['network'] == 'net'
+    assert kwargs['volumes'] == volumes
+    assert kwargs['command'] == SidecarPool.idle_command
+
+
+def test__release__reuses_sidecar():
+    controller = _controller()
+    pool = SidecarPool(controller, size=1)
+
+    first = pool.acquire('net', volumes)
+    pool.release(first)
+    second = pool.acquire('net', volumes)
+
+    assert first is second
+    assert controller.get_or_create_long_running_sidecar.call_count == 1
+
+
+def test__release__pool_full__removes_sidecar():
+    controller = _controller()
+    pool = SidecarPool(controller, size=1)
+
+    first = pool.acquire('net', volumes)
+    second = pool.acquire('net', volumes)
+    pool.release(first)
+    pool.release(second)
+
+    controller._kill_and_delete_container.assert_called_once_with(second)
+
+
+def test__acquire__different_network__creates_sidecar():
+    controller = _controller()
+    pool = SidecarPool(controller, size=1)
+
+    pool.release(pool.acquire('net', volumes))
+    pool.acquire('other', volumes)
+
+    assert controller.get_or_create_long_running_sidecar.call_count == 2
+
+
+def test__warm_and_drain__pass():
+    controller = _controller()
+    pool = SidecarPool(controller, size=2)
+
+    pool.warm([('net', volumes)]).join()
+    sidecar = pool.acquire('net', volumes)
+    pool.drain()
+
+    assert controller.get_or_create_long_running_sidecar.call_count == 2
+    assert controller._kill_and_delete_container.call_count == 2
+    assert sidecar.id in [c[0][0] for c in controller._kill_and_delete_container.call_args_list]
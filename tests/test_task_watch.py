@@ -0,0 +1,80 @@
+from pytest import raises
+
+from exc import DeploymentError
+from tools import retry
+from tools.task_watch import TaskWatcher, classify
+
+services = {'id1': 'stack_web', 'id2': 'stack_db'}
+
+
+def task(task_id, service_id, state, err=None, exit_code=None):
+    status = {'State': state}
+    if err:
+        status['Err'] = err
+    if exit_code is not None:
+        status['ContainerStatus'] = {'ExitCode': exit_code}
+    return {'ID': task_id, 'ServiceID': service_id, 'Status': status}
+
+
+def test__classify__pass():
+    assert classify(task('t1', 'id1', 'rejected', 'No such image: ngnix:latest')) == 'terminal'
+    assert classify(task('t1', 'id1', 'rejected', 'invalid mount config for type "bind"')) == 'terminal'
+    assert classify(task('t1', 'id1', 'rejected')) == 'terminal'
+    assert classify(task('t1', 'id1', 'rejected', 'failed to allocate gateway (10.0.0.1)')) == 'transient'
+    assert classify(task('t1', 'id1', 'failed', 'task: non-zero exit (1)', 1)) == 'failed'
+    assert classify(task('t1', 'id1', 'running')) is None
+
+
+def test__task_watcher__ready__pass():
+    watcher = TaskWatcher(services)
+    watcher.update([task('t1', 'id1', 'preparing'), task('t2', 'id2', 'pending')])
+    assert not watcher.ready()
+    watcher.update([task('t1', 'id1', 'running'), task('t2', 'id2', 'starting')])
+    assert not watcher.ready()
+    watcher.update([task('t1', 'id1', 'running'), task('t2', 'id2', 'running')])
+    assert watcher.ready()
+    assert ('stack_db', 't2', 'starting', 'running') in watcher.transitions
+
+
+def test__task_watcher__terminal_error__fail():
+    watcher = TaskWatcher(services)
+    watcher.update([task('t1', 'id1', 'preparing'), task('t2', 'id2', 'pending')])
+    with raises(DeploymentError, match='Service stack_web.*No such image'):
+        watcher.update([task('t1', 'id1', 'rejected', 'No such image: ngnix:latest'), task('t2', 'id2', 'running')])
+
+
+def test__task_watcher__crash_loop__fail():
+    watcher = TaskWatcher(services, crash_loop=3)
+    watcher.update([task('t1', 'id1', 'failed', exit_code=1), task('t2', 'id1', 'running')])
+    watcher.update([task('t1', 'id1', 'failed', exit_code=1), task('t2', 'id1', 'failed', exit_code=1)])
+    with raises(DeploymentError, match='stack_web is in a crash loop, 3 tasks failed. Last error: exit code 1'):
+        watcher.update([task('t1', 'id1', 'failed', exit_code=1), task('t2', 'id1', 'failed', exit_code=1),
+                        task('t3', 'id1', 'failed', exit_code=1)])
+
+
+def test__task_watcher__ignore_existing__pass():
+    watcher = TaskWatcher(services, ignore_existing=True)
+    old = [task('t{}'.format(i), 'id1', 'failed', 'non-zero exit (1)') for i in range(5)]
+    old.append(task('t5', 'id1', 'rejected', 'No such image: ngnix:latest'))
+    watcher.update(old + [task('t6', 'id1', 'running'), task('t7', 'id2', 'running')])
+    assert watcher.ready()
+
+
+def test__task_watcher__ignore__pass():
+    watcher = TaskWatcher(services, ignore=['t1'])
+    watcher.update([task('t1', 'id1', 'running'), task('t2', 'id2', 'running')])
+    assert not watcher.ready()
+    watcher.update([task('t1', 'id1', 'shutdown'), task('t3', 'id1', 'running'), task('t2', 'id2', 'running')])
+    assert watcher.ready()
+
+
+def test__task_watcher__transient_budget__fail():
+    retry.budget.reset(1)
+    try:
+        watcher = TaskWatcher(services)
+        watcher.update([task('t1', 'id1', 'rejected', 'failed to allocate gateway (10.0.0.1)')])
+        with raises(DeploymentError, match='retry budget exhausted'):
+            watcher.update([task('t1', 'id1', 'rejected', 'failed to allocate gateway (10.0.0.1)'),
+                            task('t2', 'id1', 'rejected', 'failed to allocate gateway (10.0.0.1)')])
+    finally:
+        retry.budget.reset(50)
@@ -0,0 +1,33 @@
+import threading
+
+from robot.output import librarylogger
+
+from tools import thread_log
+
+
+def test__collect__background_thread__pass(mocker):
+    messages = []
+
+    def background():
+        with thread_log.collect(messages):
+            librarylogger.write('Image pulls: redis 1.20 s', 'INFO')
+            librarylogger.write('<b>slow</b>', 'WARN', html=True)
+        librarylogger.write('not collected', 'INFO')
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    thread.join()
+
+    assert messages == [('Image pulls: redis 1.20 s', 'INFO', False), ('<b>slow</b>', 'WARN', True)]
+    write = mocker.patch('tools.thread_log.logger.write')
+    thread_log.replay(messages)
+    write.assert_has_calls([mocker.call('Image pulls: redis 1.20 s', 'INFO', False),
+                            mocker.call('<b>slow</b>', 'WARN', True)])
+    assert messages == []
+
+
+def test__collect__main_thread__pass():
+    messages = []
+    with thread_log.collect(messages):
+        librarylogger.write('logged directly', 'INFO')
+    assert messages == []
@@ -0,0 +1,123 @@
+import json
+
+from mock import MagicMock
+from pytest import fixture
+
+from tools import tracing
+from tools.tracing import DaemonCallTracer, trace_methods, trace_requests
+from VnfValidator import VnfValidator
+
+
+@fixture
+def tracer():
+    t = DaemonCallTracer()
+    tracing.add_listener(t)
+    yield t
+    tracing.remove_listener(t)
+
+
+class Dummy(object):
+    def public(self, value):
+        return self._private(value)
+
+    def _private(self, value):
+        return value * 2
+
+
+class FakeApi(object):
+    def _get(self, url, **kwargs):
+        response = MagicMock()
+        response.headers = {'Content-Length': '42'}
+        response.status_code = 200
+        return response
+
+    def inspect_container(self, container):
+        return self._get('/containers/{}/json'.format(container))
+
+
+def test__span__no_listener__pass():
+    with tracing.span('bla', 'keyword') as record:
+        record['size'] = 1
+
+
+def test__span__keyword_attribution__pass(tracer):
+    with tracing.span('Port 5000: state is open', 'keyword'):
+        with tracing.span('get_service', 'controller'):
+            tracing.count('subprocess')
+        tracing.count('wait_iteration', 3)
+
+    counters = tracer.keyword_counters['Port 5000: state is open']
+    assert counters['controller'] == 1
+    assert counters['subprocess'] == 1
+    assert counters['wait_iteration'] == 3
+    assert tracer.counters == {'subprocess': 1, 'wait_iteration': 3}
+    assert [r['depth'] for r in tracer.records] == [1, 0]
+
+
+def test__trace_methods__pass(tracer):
+    d = trace_methods(Dummy(), 'controller')
+
+    assert d.public(2) == 4
+    assert [r['name'] for r in tracer.records] == ['Dummy._private', 'Dummy.public']
+
+
+def test__trace_requests__pass(tracer):
+    api = trace_requests(FakeApi())
+
+    api.inspect_container('abc')
+
+    record = tracer.records[0]
+    assert record['name'] == 'api.inspect_container'
+    assert record['size'] == 42
+    assert record['status'] == 200
+
+
+def test__summary_and_write__pass(tracer, tmpdir):
+    trace_methods(Dummy(), 'controller').public(1)
+
+    assert 'Dummy.public' in tracer.summary()
+    path = tmpdir.join('trace.jsonl')
+    tracer.write(str(path))
+    lines = path.readlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])['name'] == 'Dummy._private'
+
+
+def test__statement__pass():
+    name = 'Port ${raw_entity:\S+}: ${raw_prop:state} ${matcher:is} ${raw_val:\S+}'
+
+    assert VnfValidator._statement(name, ['5000', 'state', 'is', 'open']) == 'Port 5000: state is open'
+
+
+def test__begin_end__nesting__pass(tracer):
+    suite = tracing.begin('suite', 'suite')
+    with tracing.span('Set service context to app', 'keyword'):
+        pass
+    tracing.end(suite)
+    tracing.end(suite)
+
+    assert [r['name'] for r in tracer.records] == ['Set service context to app', 'suite']
+    assert tracer.records[0]['depth'] == 1
+    assert tracing.current_span() is None
+
+
+def test__chrome_trace__write__pass(tmpdir):
+    chrome = tracing.ChromeTrace()
+    tracing.add_listener(chrome)
+    try:
+        with tracing.span('Port 5000: state is open', 'keyword'):
+            with tracing.span('run', 'phase') as record:
+                record['size'] = 3
+    finally:
+        tracing.remove_listener(chrome)
+
+    path = tmpdir.join('trace.json')
+    chrome.write(str(path))
+    trace = json.loads(path.read())
+
+    events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert [e['name'] for e in events] == ['Port 5000: state is open', 'run']
+    assert events[1]['args']['size'] == 3
+    assert events[0]['ts'] <= events[1]['ts']
+    assert events[0]['dur'] >= events[1]['dur']
+    assert [e for e in trace['traceEvents'] if e['ph'] == 'M']
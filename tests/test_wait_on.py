@@ -0,0 +1,49 @@
+import docker
+from docker.models.services import Service
+from mock import MagicMock
+from pytest import raises
+
+from tools.wait_on import wait_on_services_status
+
+
+class FakeStartup(object):
+    def __init__(self, timeouts):
+        self.timeouts = timeouts
+
+    def timeout(self, service, image, default):
+        return self.timeouts.get(service, default)
+
+    def poll_interval(self, service, image, default):
+        return 0.01
+
+
+def service(service_id, name):
+    s = MagicMock(spec=Service)
+    s.id = service_id
+    s.name = name
+    s.attrs = {'Spec': {'Labels': {'com.docker.stack.namespace': 'stack'},
+                        'TaskTemplate': {'ContainerSpec': {'Image': 'nginx'}}}}
+    return s
+
+
+def client(tasks):
+    c = MagicMock()
+    c._docker = MagicMock(spec=docker.DockerClient)
+    c.get_tasks.side_effect = tasks
+    return c
+
+
+def test__wait_on_services_status__converged__pass():
+    running = [{'ID': 't1', 'ServiceID': 'id1', 'Status': {'State': 'running'}}]
+    res = wait_on_services_status(client(lambda services: running), [service('id1', 'stack_web')],
+                                  startup=FakeStartup({}))
+    assert list(res.keys()) == ['stack_web']
+
+
+def test__wait_on_services_status__service_timeout__fail():
+    tasks = [{'ID': 't1', 'ServiceID': 'id1', 'Status': {'State': 'running'}},
+             {'ID': 't2', 'ServiceID': 'id2', 'Status': {'State': 'starting'}}]
+    with raises(AssertionError, match='service stack_web is not ready'):
+        wait_on_services_status(client(lambda services: tasks),
+                                [service('id1', 'stack_db'), service('id2', 'stack_web')],
+                                startup=FakeStartup({'web': 0.05, 'db': 30}))
@@ -7,8 +7,10 @@ import pytest
 from docker.models.containers import Container
 from mock import MagicMock
 
+from DockerController import DockerController
 from exc import TestToolError
 from testtools.GossTool import GossTool
+from tools.data_structures import SUT
 
 target = MagicMock()
 
@@ -129,3 +131,27 @@ def test__run__in_sidecar_with_deployment__pass(sidecar, network, volume_with_go
     assert len(res) > 0
     j = json.loads(res)
     assert j['summary']['failed-count'] == 0
+
+
+def test__serve_command__pass():
+    cmd = GossTool.serve_command(gossfile='/goss.yaml', port=1234)
+
+    assert cmd[:2] == ['sh', '-c']
+    assert '--gossfile /goss.yaml serve' in cmd[2]
+    assert '127.0.0.1:1234' in cmd[2]
+
+
+def test__run__use_server__reloads_before_query():
+    controller = MagicMock(DockerController)
+    controller.execute.return_value = {'code': 0, 'res': '{"summary": {"failed-count": 0}, "results": []}'}
+    g = GossTool(controller, SUT('container', 'robot_goss_server_for_net', 'net'))
+    g.use_server(1234)
+
+    res = g.run(target)
+
+    assert res['summary']['failed-count'] == 0
+    calls = controller.execute.call_args_list
+    assert len(calls) == 2
+    assert calls[0][0] == ('robot_goss_server_for_net', g.reload_command)
+    assert calls[1][0] == ('robot_goss_server_for_net', g.command)
+    assert 'nc 127.0.0.1 1234' in g.command[2]
@@ -1,4 +1,9 @@
+import hashlib
 import os
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 from string import lower
 
 import docker
@@ -6,17 +11,24 @@ from docker import errors
 from docker.models.containers import Container
 from docker.models.networks import Network
 from docker.models.services import Service
+from docker.types import ServiceMode
 from docker.models.volumes import Volume
+from docker.utils import parse_repository_tag
+from requests.exceptions import RequestException
 from robot.api import logger
 from robot.libraries.BuiltIn import BuiltIn
 
 from InfrastructureController import InfrastructureController
 from exc import NotFoundError, SetupError, DeploymentError
 from settings import Settings
-from tools import namesgenerator
+from tools import compose, deadline, namesgenerator, reaper
+from tools.deadline import bound_requests
 from tools.archive import Archive
+from tools.circuit_breaker import CircuitBreaker, guard_requests
+from tools.retry import RetryPolicy, retry_requests
+from tools.tracing import trace_methods, trace_requests
 from tools.wait_on import wait_on_container_status, wait_on_service_replication, wait_on_service_container_status, \
-    start_process, wait_on_process
+    start_process, wait_on_process, wait_on_tasks_stopped
 
 
 class DockerController(InfrastructureController):
@@ -25,25 +37,92 @@ class DockerController(InfrastructureController):
     in terms of stacks, services, containers, networks and images
     """
 
-    def __init__(self, base_dir):
+    # images known to be present and digests of loaded image bundles per Docker host, shared within the process
+    _present_images = set()
+    _loaded_bundles = set()
+    # digests of image bundles by path and modification time, so a bundle is hashed only once
+    _bundle_digests = {}
+    # one circuit breaker per daemon, shared within the process
+    _breakers = {}
+    # label with the name of the service on the containers of a deployment
+    service_label = 'com.docker.swarm.service.name'
+
+    def __init__(self, base_dir, docker_host=None):
         """
         The controller connects to the Docker host that is specified in the settings or to the socket on locallhost.
 
         Args:
             base_dir: str - is used to find docker-compose files.
+            docker_host: str - Docker host to use instead of DOCKER_HOST, e.g. the host a suite was placed on. API
+                calls, docker commands and reaper processes of the controller all use this host.
         """
         super(DockerController, self).__init__()
 
         self.base_dir = base_dir
-        self._docker = docker.from_env()
-        self._docker_api = docker.APIClient(base_url=Settings.docker.get('DOCKER_HOST'))
-        self.helper = 'helper'
+        self.docker_host = docker_host or Settings.docker.get('DOCKER_HOST')
+        timeout = float(Settings.docker.get('DOCKER_TIMEOUT'))
+        self._env = dict(os.environ, DOCKER_HOST=self.docker_host) if docker_host else None
+        self._docker = docker.from_env(timeout=timeout, environment=self._env)
+        self._docker_api = docker.APIClient(base_url=self.docker_host, timeout=timeout)
+        # helper containers of suites that run in parallel must not collide
+        self.helper = 'vnfrobot_helper_{}'.format(os.getpid())
+
+        self.breaker = self.breaker_for(self._docker_api.base_url)
+        self.retry_policies = dict((name, RetryPolicy(name,
+                                                      attempts=Settings.retry_attempts.get(name, 0),
+                                                      base_delay=Settings.retry_base_delay,
+                                                      max_delay=Settings.retry_max_delay))
+                                   for name in ('read', 'exec', 'mutate'))
+        self._hook_requests(self._docker.api, self.breaker, self.retry_policies)
+        self._hook_requests(self._docker_api, self.breaker, self.retry_policies)
+        # report every controller method to the tracing listeners
+        trace_methods(self, 'controller')
 
         if not self.base_dir:
             self.base_dir = os.getcwd()
             BuiltIn().log('base_dir not specified. Assuming current working dir: {}'.format(self.base_dir), level='DEBUG',
                           console=Settings.to_console)
 
+    @classmethod
+    def breaker_for(cls, base_url):
+        """
+        Circuit breaker of a Docker daemon.
+
+        Args:
+            base_url: str - URL of the daemon
+
+        Returns:
+            CircuitBreaker
+
+        """
+        if base_url not in cls._breakers:
+            cls._breakers[base_url] = CircuitBreaker('Docker daemon {}'.format(base_url),
+                                                     threshold=Settings.circuit_breaker_threshold,
+                                                     reset_timeout=Settings.circuit_breaker_reset)
+        return cls._breakers[base_url]
+
+    @staticmethod
+    def _hook_requests(api, breaker, retry_policies):
+        """
+        Hooks into every request of a docker-py APIClient: requests fail fast while the daemon is unavailable,
+        transient errors are retried, the timeout of a request is bounded by the deadline of the current keyword and
+        every request is reported to the tracing listeners.
+
+        Args:
+            api: docker.APIClient
+            breaker: CircuitBreaker of the daemon
+            retry_policies: dict - operation class: RetryPolicy
+
+        Returns:
+            docker.APIClient
+
+        """
+        guard_requests(api, breaker)
+        retry_requests(api, retry_policies)
+        bound_requests(api)
+        trace_requests(api)
+        return api
+
     def run_busybox(self, **kwargs):
         """
         Helper method for conftest.py to create a running dummy container.
@@ -59,25 +138,29 @@ class DockerController(InfrastructureController):
         try:
             name = namesgenerator.get_random_name()
             command = kwargs.pop('command', 'sh -c "while true; do $(echo date "GET / HTTP/1.1"); sleep 1; done"')
-            self._docker.containers.run('busybox', command=command, name=name, detach=True, **kwargs)
+            # the owner labels are added to the labels of the caller
+            labels = reaper.labels(**kwargs.pop('labels', None) or {})
+            self._docker.containers.run('busybox', command=command, name=name, detach=True, labels=labels, **kwargs)
             return self._docker.containers.get(name)
         except docker.errors.NotFound as exc:
             raise NotFoundError(exc)
         except docker.errors.APIError as exc:
             raise DeploymentError(exc)
 
-    def execute(self, entity=None, command=None):
+    def execute(self, entity=None, command=None, timeout=None):
         """
         Executes a command within a Docker container.
 
         Args:
             entity: Container object or container name or container id
             command: str or list - command to execute in the container
+            timeout: float - seconds after which the command is killed, None to wait until it terminates
 
         Returns:
             dict: {
                 'code': int,
-                'rest': str
+                'rest': str,
+                'timeout': bool - only present if the command was killed after the timeout
             }
 
         """
@@ -96,17 +179,18 @@ class DockerController(InfrastructureController):
         BuiltIn().log('Running "{}" in {}'.format(command, target.name), level='INFO', console=Settings.to_console)
         container_status = target.status
         if 'created' in container_status:
-            return self.run_sidecar(sidecar=target)
+            return self.run_sidecar(sidecar=target, timeout=timeout)
         else:
-            return self._run_in_container(container=target, command=command)
+            return self._run_in_container(container=target, command=command, timeout=timeout)
 
-    def _run_in_container(self, container=None, command=None):
+    def _run_in_container(self, container=None, command=None, timeout=None):
         """
         Helper method for execute().
 
         Args:
             container:
             command:
+            timeout: float - seconds after which the command is killed
 
         Returns:
 
@@ -119,6 +203,8 @@ class DockerController(InfrastructureController):
 
             # idea from https://github.com/docker/docker-py/issues/1989
             exec_id = container.client.api.exec_create(container.id, command)['Id']
+            if timeout:
+                return self._exec_with_timeout(container, exec_id, timeout)
             res = container.client.api.exec_start(exec_id)
             # res = container.exec_run(cmd=command)
             # res = container.exec_run(cmd=command, tty=True, stderr=True, stdout=True)
@@ -130,6 +216,75 @@ class DockerController(InfrastructureController):
         except (docker.errors.APIError, AttributeError) as exc:
             raise SetupError(exc)
 
+    def _exec_with_timeout(self, container, exec_id, timeout):
+        """
+        Streams the output of an exec instance. If it does not terminate within the timeout, its process is killed.
+
+        Args:
+            container: docker.models.containers.Container
+            exec_id: str - id of the exec instance
+            timeout: float - seconds, bounded by the deadline of the keyword
+
+        Returns:
+            dict: code, res and timeout
+
+        """
+        timeout = deadline.bound(timeout, 'exec in {}'.format(container.name))
+        output = []
+        failures = []
+
+        def read():
+            try:
+                for chunk in container.client.api.exec_start(exec_id, stream=True):
+                    output.append(chunk)
+            except RequestException as exc:
+                failures.append(exc)
+
+        reader = threading.Thread(target=read, name='exec-{}'.format(exec_id[:12]))
+        reader.daemon = True
+        reader.start()
+        reader.join(timeout)
+
+        if reader.is_alive():
+            pid = container.client.api.exec_inspect(exec_id).get('Pid')
+            BuiltIn().log('Command in {} did not terminate within {:.1f} s, killing process {}'.format(
+                container.name, timeout, pid), level='WARN', console=Settings.to_console)
+            self.kill_host_process(pid)
+            reader.join(Settings.cleanup_timeout)
+            return {
+                'code': 124,
+                'res': ''.join(output),
+                'timeout': True
+            }
+
+        if failures:
+            raise SetupError(failures[0])
+        return {
+            'code': container.client.api.exec_inspect(exec_id)['ExitCode'],
+            'res': ''.join(output)
+        }
+
+    def kill_host_process(self, pid):
+        """
+        Kills a process on the Docker host, e.g. the process of an exec instance. As the Docker host might be remote,
+        a helper container in the PID namespace of the host sends the signal.
+
+        Args:
+            pid: int - process id on the Docker host
+
+        Returns:
+            None
+
+        """
+        if not pid:
+            return
+        self.get_or_pull_image(Settings.sidecar_image)
+        try:
+            self._docker.containers.run(Settings.sidecar_image, ['kill', '-9', str(pid)], pid_mode='host',
+                                        remove=True)
+        except (docker.errors.ContainerError, docker.errors.APIError) as exc:
+            BuiltIn().log('Could not kill process {}: {}'.format(pid, exc), level='WARN', console=Settings.to_console)
+
     def get_containers_for_service(self, service, state='running'):
         """
         For the given service, wait until a timeout occurs or at least one container is in the specified state.
@@ -150,7 +305,7 @@ class DockerController(InfrastructureController):
             wait_on_service_container_status(self, service)
             res = self._docker.containers.list(all=True,
                                                filters={
-                                                   'label': 'com.docker.swarm.service.name={}'.format(service),
+                                                   'label': '{}={}'.format(self.service_label, service),
                                                    'status': lower(state)
                                                })
             # BuiltIn().log('Get containers for services {}: {}'.format(
@@ -198,6 +353,19 @@ class DockerController(InfrastructureController):
         else:
             return c.attrs['Config']
 
+    def swarm_active(self):
+        """
+        Checks if the Docker host is part of a swarm.
+
+        Returns:
+            bool
+
+        """
+        try:
+            return self._docker.info().get('Swarm', {}).get('LocalNodeState') == 'active'
+        except (docker.errors.APIError, RequestException):
+            return False
+
     def get_node(self, node_id):
         """
         Retrieves a Node object for a given node ide
@@ -390,23 +558,32 @@ class DockerController(InfrastructureController):
         except docker.errors.APIError as exc:
             raise DeploymentError('Could not connect network to container: {}'.format(exc))
 
-    def clean_networks(self):
+    def clean_networks(self, stack):
         """
-        Helper method. Sometimes the list of networks is in an unclean state and requires manual cleanup.
+        Helper method. Sometimes the networks of a stack are left behind and require manual cleanup. Only networks
+        labelled with the namespace of the stack are removed.
+
+        Args:
+            stack: str - name of the deployment
 
         Returns:
-            None
+            list of str: names of the networks that are still in use
 
         """
-        self._docker_api.prune_networks()
+        return reaper.remove_networks(self._docker, stack)
 
-    def deploy_stack(self, descriptor, name):
+    def deploy_stack(self, descriptor, name, owned=True, hashes=None):
         """
         Deploy a docker-compose.yml file on a Docker Swarm.
 
         Args:
             descriptor: str
             name: str
+            owned: bool - mark the stack as owned by the current process, so it is removed as orphan once the process
+                is gone. Deployments that are kept for later suites must not be owned.
+            hashes: dict - service name: hash, see spec_hashes(). If given, the services are labelled with their hash
+                and services that are not in the descriptor anymore are removed. Swarm only updates services whose
+                spec changed.
 
         Returns:
             True
@@ -414,11 +591,117 @@ class DockerController(InfrastructureController):
         """
         assert name, "name is required for deploy_stack"
         assert descriptor, "descriptor is required for deploy_stack"
-        res = self._dispatch(['stack', 'deploy', '-c', descriptor, name])
+        if owned:
+            self._create_stack_marker(name)
+        if not hashes and not Settings.remap_ports:
+            res = self._dispatch(['stack', 'deploy', '-c', descriptor, name])
+        else:
+            images = compose.load(descriptor).get('services') or {}
+            rendered = compose.render(descriptor, name, hashes, self.image_references(
+                set(s.get('image') for s in images.values() if s and s.get('image'))) if hashes else None,
+                remap_ports=Settings.remap_ports)
+            # relative paths in the descriptor are resolved against its directory
+            f = tempfile.NamedTemporaryFile(prefix='.vnfrobot-', suffix='.yml', dir=os.path.dirname(descriptor),
+                                            delete=False)
+            try:
+                f.write(rendered)
+                f.close()
+                res = self._dispatch(['stack', 'deploy'] + (['--prune'] if hashes else []) + ['-c', f.name, name])
+            finally:
+                os.remove(f.name)
         if res.stderr:
             raise DeploymentError(res.stderr)
         return True
 
+    def spec_hashes(self, descriptor, name):
+        """
+        Hashes of the services of a descriptor, including the digests their images resolve to on the Docker host.
+
+        Args:
+            descriptor: str
+            name: str - name of the deployment
+
+        Returns:
+            dict - service name: hash
+
+        """
+        services = compose.load(descriptor).get('services') or {}
+        images = self.image_references(set(s.get('image') for s in services.values() if s and s.get('image')))
+        return compose.spec_hashes(descriptor, name, images, remap_ports=Settings.remap_ports)
+
+    def deployed_hashes(self, name):
+        """
+        Hashes the services of a deployment were deployed with.
+
+        Args:
+            name: str - name of the deployment
+
+        Returns:
+            dict - service name: hash, None if the service was deployed without hash
+
+        """
+        return dict((s.name, (s.attrs.get('Spec', {}).get('Labels') or {}).get(compose.spec_hash_label))
+                    for s in self.get_services(name))
+
+    def image_references(self, images):
+        """
+        Resolves images to the digest of the repository or, for images that were never pushed or pulled, to the
+        image ID.
+
+        Args:
+            images: iterable of image references
+
+        Returns:
+            dict - image: reference with digest or image ID, images that are not present are missing
+
+        """
+        references = {}
+        for image in images:
+            try:
+                attrs = self._docker.images.get(image).attrs
+            except (docker.errors.ImageNotFound, docker.errors.APIError):
+                continue
+            repository = parse_repository_tag(image.split('@')[0])[0]
+            digests = attrs.get('RepoDigests') or []
+            matching = [d for d in digests if d.split('@')[0] in (repository, 'docker.io/' + repository,
+                                                                 'docker.io/library/' + repository)]
+            references[image] = '{}@{}'.format(repository, (matching or digests)[0].split('@')[1]) \
+                if digests else attrs.get('Id')
+        return references
+
+    def _create_stack_marker(self, name):
+        """
+        Stacks cannot be labelled as a whole. A config with the namespace of the stack carries the owner labels instead,
+        it is removed together with the stack.
+
+        Args:
+            name: str - name of the deployment
+
+        Returns:
+            None
+
+        """
+        try:
+            self._docker.configs.create(name='{}_vnfrobot'.format(name), data='vnfrobot',
+                                        labels=reaper.labels(**{reaper.namespace_label: name}))
+        except docker.errors.APIError as exc:
+            BuiltIn().log('Could not mark stack {} as owned: {}'.format(name, exc), level='DEBUG',
+                          console=Settings.to_console)
+
+    def reap_orphans_detached(self, log_file, ttl=0):
+        """
+        Removes orphaned stacks, containers and networks in a detached process, see tools/reaper.py.
+
+        Args:
+            log_file: str - output of the reaper process
+            ttl: float - seconds after which a resource is an orphan, 0 to only check the owner process
+
+        Returns:
+            int: pid of the reaper process
+
+        """
+        return reaper.spawn(['--orphans', '--ttl', str(ttl)], log_file, docker_host=self.docker_host)
+
     def undeploy_stack(self, name):
         """
         Removes a docker-compose.yml deployment from a Docker Swarm
@@ -431,9 +714,23 @@ class DockerController(InfrastructureController):
 
         """
         a = self._dispatch(['stack', 'rm', name])
-        self.clean_networks()
+        self.clean_networks(name)
         return a
 
+    def undeploy_stack_detached(self, name, log_file):
+        """
+        Removes a deployment in a detached process, see tools/reaper.py.
+
+        Args:
+            name: str
+            log_file: str - output of the reaper process
+
+        Returns:
+            int: pid of the reaper process
+
+        """
+        return reaper.spawn([name], log_file, docker_host=self.docker_host)
+
     def get_network(self, name):
         """
         Retrieves a network by name
@@ -468,7 +765,8 @@ class DockerController(InfrastructureController):
                 name=name,
                 driver=driver,
                 scope='swarm' if driver == 'overlay' else 'local',
-                attachable=True)
+                attachable=True,
+                labels=reaper.labels())
         except docker.errors.APIError as exc:
             if 'already exists' in exc.explanation:
                 return self._docker.networks.get(name)
@@ -587,7 +885,10 @@ class DockerController(InfrastructureController):
                       level='INFO',
                       console=Settings.to_console)
         try:
-            res = self._dispatch(['run', '-v', '{}:/data'.format(volume), '--name', self.helper, 'busybox', 'true'])
+            self.get_or_pull_image(Settings.sidecar_image)
+            labels = ['--label={}={}'.format(k, v) for k, v in sorted(reaper.labels().items())]
+            res = self._dispatch(['run', '-v', '{}:/data'.format(volume), '--name', self.helper] + labels +
+                                 [Settings.sidecar_image, 'true'])
             assert len(res.stderr) == 0
             res = self._dispatch(['cp', '{}/.'.format(path), '{}:/data'.format(self.helper)])
             assert len(res.stderr) == 0
@@ -614,12 +915,108 @@ class DockerController(InfrastructureController):
         except DeploymentError as exc:
             raise exc
 
-        res = self._dispatch(['run', '--rm', '-v', '{}:/data'.format(volume), 'busybox', 'ls', '/data'])
+        self.get_or_pull_image(Settings.sidecar_image)
+        res = self._dispatch(['run', '--rm', '-v', '{}:/data'.format(volume), Settings.sidecar_image, 'ls', '/data'])
         assert len(res.stderr) == 0
 
         return res
 
-    def get_or_create_sidecar(self, image='busybox', command='true', name='', volumes=None, network=None):
+    def snapshot_volume(self, volume):
+        """
+        Copies the content of a volume to a new volume, see restore_volume().
+
+        Args:
+            volume: str - name of the volume
+
+        Returns:
+            str - name of the snapshot volume
+
+        """
+        snapshot = '{}-snapshot-{}'.format(volume, namesgenerator.get_random_name())
+        try:
+            self._docker.volumes.create(name=snapshot, labels=reaper.labels())
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not create snapshot of volume {}: {}'.format(volume, exc))
+        self._copy_volume(volume, snapshot)
+        return snapshot
+
+    def restore_volume(self, snapshot, volume):
+        """
+        Replaces the content of a volume with the content of a snapshot. No container may write to the volume.
+
+        Args:
+            snapshot: str - name of the snapshot volume
+            volume: str - name of the volume
+
+        Returns:
+            None
+
+        """
+        self._copy_volume(snapshot, volume, clear=True)
+
+    def _copy_volume(self, source, target, clear=False):
+        command = 'cp -a /source/. /target/'
+        if clear:
+            command = 'rm -rf /target/..?* /target/.[!.]* /target/* && ' + command
+        self.get_or_pull_image(Settings.sidecar_image)
+        labels = ['--label={}={}'.format(k, v) for k, v in sorted(reaper.labels().items())]
+        res = self._dispatch(['run', '--rm', '-v', '{}:/source:ro'.format(source), '-v', '{}:/target'.format(target)] +
+                             labels + [Settings.sidecar_image, 'sh', '-c', command])
+        if res.stderr:
+            raise DeploymentError('Could not copy volume {} to {}: {}'.format(source, target, res.stderr))
+
+    def service_volumes(self, service):
+        """
+        Names of the named volumes the tasks of a service mount.
+
+        Args:
+            service: Service
+
+        Returns:
+            list of str
+
+        """
+        mounts = service.attrs.get('Spec', {}).get('TaskTemplate', {}).get('ContainerSpec', {}).get('Mounts') or []
+        return sorted(set(m['Source'] for m in mounts if m.get('Type', 'volume') == 'volume' and m.get('Source')))
+
+    def reset_service(self, service, snapshots=None):
+        """
+        Restores a service to the state after the deployment: its tasks are replaced with new tasks and its volumes
+        are restored from their snapshots. For the restore, the service is scaled to 0 and back.
+        Volumes are restored on the Docker host of the controller.
+
+        Args:
+            service: Service
+            snapshots: dict - volume: snapshot volume, see snapshot_volume()
+
+        Returns:
+            None
+
+        """
+        assert isinstance(service, Service)
+        volumes = [v for v in self.service_volumes(service) if v in (snapshots or {})]
+        try:
+            service.reload()
+            spec = service.attrs['Spec']
+            if not volumes:
+                force = spec.get('TaskTemplate', {}).get('ForceUpdate', 0) + 1
+                service.update(force_update=force)
+                return
+            replicas = spec.get('Mode', {}).get('Replicated', {}).get('Replicas')
+            if replicas is None:
+                raise DeploymentError('Cannot restore the volumes of global service {}'.format(service.name))
+
+            service.update(mode=ServiceMode('replicated', 0))
+            wait_on_tasks_stopped(self, [service.id])
+            for volume in volumes:
+                self.restore_volume(snapshots[volume], volume)
+            service.reload()
+            service.update(mode=ServiceMode('replicated', replicas))
+            service.reload()
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not reset service {}: {}'.format(service.name, exc))
+
+    def get_or_create_sidecar(self, image=Settings.sidecar_image, command='true', name='', volumes=None, network=None):
         """
         Helper method for run_sidecar().
         A container is created with the provided parameters.
@@ -671,6 +1068,7 @@ class DockerController(InfrastructureController):
                                                   auto_remove=False,
                                                   volumes=volumes,
                                                   network=network,
+                                                  labels=reaper.labels(),
                                                   tty=True)
         except docker.errors.APIError as exc:
             raise DeploymentError('Could not deploy sidecar: {}'.format(exc))
@@ -682,9 +1080,44 @@ class DockerController(InfrastructureController):
                           console=Settings.to_console)
             raise DeploymentError('Error: {}'.format(exc))
 
+    def get_or_create_long_running_sidecar(self, name, image=Settings.sidecar_image, command='true', volumes=None,
+                                           network=None):
+        """
+        Like get_or_create_sidecar(), but the container is started and kept running so that commands can be executed
+        in it. A running container with an identical name is re-used.
+
+        Args:
+            name: str - name
+            image: str - image
+            command: str - command that keeps the container running
+            volumes:
+            network:
+
+        Returns:
+            docker.models.containers.Container
+
+        """
+        try:
+            c = self._docker.containers.get(name)
+            if lower(c.status) == 'running':
+                return c
+        except docker.errors.NotFound:
+            pass
+
+        sidecar = self.get_or_create_sidecar(image, command, name, volumes, network)
+        try:
+            sidecar.start()
+            wait_on_container_status(self, sidecar)
+            sidecar.reload()
+            return sidecar
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not start sidecar {}: {}'.format(name, exc))
+
     def get_or_pull_image(self, image):
         """
-        Retrieves an image from hub.docker.com.
+        Makes sure that an image is present on the Docker host.
+        If it is missing, it is loaded from the sidecar image bundle if the bundle contains it, otherwise it is pulled
+        from hub.docker.com. Images that are known to be present are remembered for the lifetime of the process.
 
         Args:
             image: str - image name
@@ -693,17 +1126,145 @@ class DockerController(InfrastructureController):
             None
 
         """
+        if (self.docker_host, image) in DockerController._present_images:
+            return
+
         try:
             self._docker.images.get(image)
         except docker.errors.ImageNotFound:
+            if not self._load_image_bundle(image):
+                try:
+                    logger.console(
+                        'Fetching sidecar image...')
+                    self._docker.images.pull(image)
+                except docker.errors.ImageNotFound as exc:
+                    raise NotFoundError('Image {} not found: {}'.format(image, exc))
+        DockerController._present_images.add((self.docker_host, image))
+
+    def pull_images(self, images, workers=4):
+        """
+        Pulls images concurrently. Images that are present on the Docker host with the digest the registry reports
+        are skipped.
+
+        Args:
+            images: list of str - image references, e.g. from a descriptor
+            workers: int - number of concurrent pulls
+
+        Returns:
+            dict - image: seconds the pull took, None if the image was present
+
+        Raises:
+            DeploymentError: if an image cannot be pulled
+
+        """
+        if not images:
+            return {}
+
+        def pull(image):
+            if self._image_present(image):
+                return None
+            start = time.time()
+            repository, tag = parse_repository_tag(image)
             try:
-                logger.console(
-                    'Fetching sidecar image...')
-                self._docker.images.pull(image)
-            except docker.errors.ImageNotFound as exc:
-                raise NotFoundError('Image {} not found: {}'.format(image, exc))
+                self._docker_api.pull(repository, tag=tag or 'latest')
+                self._docker.images.get(image)
+            except docker.errors.APIError as exc:
+                raise DeploymentError('Could not pull image {}: {}'.format(image, exc))
+            return time.time() - start
 
-    def run_sidecar(self, name='', sidecar=None, image='busybox', command='true', volumes=None, network=None):
+        pool = ThreadPool(max(min(workers, len(images)), 1))
+        try:
+            return dict(zip(images, pool.map(pull, images)))
+        finally:
+            pool.close()
+
+    def _image_present(self, image):
+        """
+        Checks if an image is present on the Docker host. Images referenced by tag must have the digest that the
+        registry reports for the tag, if the daemon can query the registry.
+
+        Args:
+            image: str
+
+        Returns:
+            bool
+
+        """
+        try:
+            local = self._docker.images.get(image)
+        except docker.errors.ImageNotFound:
+            return False
+        except docker.errors.APIError:
+            return False
+        if '@' in image:
+            return True
+        try:
+            # GET /distribution/<image>/json, API 1.30+
+            res = self._docker_api._result(
+                self._docker_api._get(self._docker_api._url('/distribution/{0}/json', image)), True)
+            digest = res['Descriptor']['digest']
+        except (docker.errors.APIError, KeyError, TypeError, ValueError):
+            return True
+        return any(d.endswith('@' + digest) for d in local.attrs.get('RepoDigests') or [])
+
+    def _load_image_bundle(self, image):
+        """
+        Helper method for get_or_pull_image().
+        Loads the image bundle specified in the settings into the Docker host. A bundle is loaded only once per process,
+        identified by its digest.
+
+        Args:
+            image: str - image that is expected in the bundle
+
+        Returns:
+            True if the image is available after loading the bundle
+
+        """
+        bundle = Settings.sidecar_image_bundle
+        if not bundle or not os.path.isfile(bundle):
+            return False
+
+        digest = self._bundle_digest(bundle)
+
+        if (self.docker_host, digest) not in DockerController._loaded_bundles:
+            BuiltIn().log('Loading image bundle {} ({})...'.format(bundle, digest), level='INFO',
+                          console=Settings.to_console)
+            try:
+                with open(bundle, 'rb') as f:
+                    self._docker.images.load(f)
+            except docker.errors.APIError as exc:
+                raise NotFoundError('Could not load image bundle {}: {}'.format(bundle, exc))
+            DockerController._loaded_bundles.add((self.docker_host, digest))
+
+        try:
+            self._docker.images.get(image)
+            return True
+        except docker.errors.ImageNotFound:
+            return False
+
+    @classmethod
+    def _bundle_digest(cls, bundle):
+        """
+        Helper method for _load_image_bundle().
+
+        Args:
+            bundle: str - path of the image bundle
+
+        Returns:
+            str - sha256 digest of the bundle, computed again only if the file was modified
+
+        """
+        key = (os.path.abspath(bundle), os.path.getmtime(bundle))
+        if key not in cls._bundle_digests:
+            sha = hashlib.sha256()
+            with open(bundle, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            cls._bundle_digests[key] = 'sha256:{}'.format(sha.hexdigest())
+        return cls._bundle_digests[key]
+
+    def run_sidecar(self, name='', sidecar=None, image=Settings.sidecar_image, command='true', volumes=None,
+                    network=None, timeout=None):
         """
         Run a sidecar container with the specified parameters. It waits for the command to finish and returns stdout.
         If stderr is not empty, a DeploymentError is raised with stderr.
@@ -715,6 +1276,7 @@ class DockerController(InfrastructureController):
             command: str - command to run
             volumes:
             network:
+            timeout: float - seconds after which the sidecar is killed, None to wait until it terminates
 
         Returns:
             str - stdout
@@ -733,7 +1295,20 @@ class DockerController(InfrastructureController):
                 sidecar = self.get_or_create_sidecar(image, command, name, volumes, network)
             wait_on_container_status(self, sidecar, ['Created', 'Exited'])
             sidecar.start()
-            sidecar.wait()
+            if timeout:
+                try:
+                    sidecar.wait(timeout=deadline.bound(timeout, 'sidecar {}'.format(sidecar.name)))
+                except RequestException:
+                    BuiltIn().log('Sidecar {} did not terminate within {} s'.format(sidecar.name, timeout),
+                                  level='WARN', console=Settings.to_console)
+                    sidecar.kill()
+                    return {
+                        'code': 124,
+                        'res': sidecar.logs(stdout=True, stderr=False) or '',
+                        'timeout': True
+                    }
+            else:
+                sidecar.wait()
             stdout = sidecar.logs(stdout=True, stderr=False) or ''
             stderr = sidecar.logs(stdout=False, stderr=True) or ''
 
@@ -774,7 +1349,7 @@ class DockerController(InfrastructureController):
         """
         project_options = project_options or []
         o = project_options + options
-        proc = start_process(self.base_dir, o)
+        proc = start_process(self.base_dir, o, env=self._env)
         return wait_on_process(proc, returncode=returncode)
 
     def find_stack(self, deployment_name):
@@ -879,6 +1454,22 @@ class DockerController(InfrastructureController):
         except docker.errors.APIError as exc:
             raise DeploymentError('Could not get services for {}: {}'.format(stack, exc))
 
+    def get_tasks(self, services):
+        """
+        Retrieve the tasks of services with one query.
+
+        Args:
+            services: list of str - names or IDs of the services
+
+        Returns:
+            [dict]
+
+        """
+        try:
+            return self._docker_api.tasks(filters={'service': list(services)})
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not get tasks for {}: {}'.format(', '.join(services), exc))
+
     def _kill_and_delete_container(self, name):
         """
         Removes a container.
@@ -23,6 +23,14 @@ class InfrastructureController:
     def undeploy_stack(self, name):
         raise NotImplementedError('Needs implementation.')
 
+    @abstractmethod
+    def undeploy_stack_detached(self, name, log_file):
+        raise NotImplementedError('Needs implementation.')
+
+    @abstractmethod
+    def reap_orphans_detached(self, log_file, ttl=0):
+        raise NotImplementedError('Needs implementation.')
+
     @abstractmethod
     def get_node(self, node_id):
         raise NotImplementedError('Needs implementation.')
@@ -69,6 +77,10 @@ class InfrastructureController:
     def get_or_create_sidecar(self):
         raise NotImplementedError('Needs implementation.')
 
+    @abstractmethod
+    def get_or_create_long_running_sidecar(self, name):
+        raise NotImplementedError('Needs implementation.')
+
     @abstractmethod
     def run_sidecar(self):
         raise NotImplementedError('Needs implementation.')
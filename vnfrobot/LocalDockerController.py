@@ -0,0 +1,515 @@
+import docker
+from docker.models.networks import Network
+from docker.models.services import Service
+from docker.models.volumes import Volume
+from robot.libraries.BuiltIn import BuiltIn
+
+from DockerController import DockerController
+from exc import NotFoundError, DeploymentError
+from settings import Settings
+from tools import compose, reaper
+from tools.data_structures import ProcessResult
+from tools.wait_on import wait_on_container_status, wait_on_service_container_status
+
+
+class LocalService(Service):
+    """
+    A service of a deployment without Swarm, i.e. the containers of one service of the descriptor. It provides the
+    attributes of a Swarm service that vnf-robot reads, its ID is the name of the service.
+    """
+
+    @classmethod
+    def from_containers(cls, name, containers):
+        """
+        Args:
+            name: str - <deployment>_<service>
+            containers: list of Container
+
+        Returns:
+            LocalService
+
+        """
+        container = sorted(containers, key=lambda c: c.name)[0]
+        labels = container.labels or {}
+        return cls(attrs={
+            'ID': name,
+            'Spec': {
+                'Name': name,
+                'Labels': {reaper.namespace_label: labels.get(compose.project_label),
+                           compose.spec_hash_label: labels.get(compose.spec_hash_label)},
+                'Mode': {'Replicated': {'Replicas': len(containers)}},
+                'TaskTemplate': {
+                    'ContainerSpec': {
+                        'Image': container.attrs.get('Config', {}).get('Image'),
+                        'Labels': labels,
+                        'Mounts': [{'Source': m.get('Name') or m.get('Source'), 'Target': m.get('Destination')}
+                                   for m in container.attrs.get('Mounts') or []]
+                    }
+                }
+            }
+        })
+
+    def reload(self):
+        # the attributes are derived from the containers, get a new instance with LocalDockerController.get_service()
+        pass
+
+
+class LocalDockerController(DockerController):
+    """
+    LocalDockerController deploys a docker-compose.yml file as plain containers on bridge networks through the API of
+    a single Docker host without Swarm. Containers, networks and volumes are named and labelled like docker-compose
+    does, and every container carries the name of its service in a label, so keywords find the containers of a service
+    as in a Swarm deployment.
+    """
+
+    service_label = 'vnfrobot.service'
+
+    def deploy_stack(self, descriptor, name, owned=True, hashes=None):
+        """
+        Creates the networks, volumes and containers of a docker-compose.yml file and starts the containers in the
+        order of depends_on. See tools/compose.py for the supported keys.
+
+        Args:
+            descriptor: str
+            name: str
+            owned: bool - label the containers and networks with the current process, so they are removed as orphans
+                once the process is gone. Deployments that are kept for later suites must not be owned.
+            hashes: dict - service name: hash, see spec_hashes(). If given, the containers are labelled with the hash
+                of their service, containers with the current hash are kept and all other containers of the
+                deployment are replaced or removed.
+
+        Returns:
+            True
+
+        """
+        assert name, "name is required for deploy_stack"
+        assert descriptor, "descriptor is required for deploy_stack"
+        deployment = compose.parse(descriptor, name, hashes=hashes, remap_ports=Settings.remap_ports)
+        owner = reaper.labels(**{reaper.namespace_label: name}) if owned else {reaper.namespace_label: name}
+
+        for network in deployment['networks'].values():
+            self._get_or_create_stack_network(network, owner)
+        for volume in deployment['volumes'].values():
+            self._get_or_create_stack_volume(volume)
+
+        current = self._remove_changed_containers(name, hashes) if hashes else set()
+        created = []
+        for spec in deployment['containers']:
+            if spec['name'] not in current:
+                created.append(self._create_stack_container(spec, owner))
+        for container_id in created:
+            try:
+                self._docker_api.start(container_id)
+            except docker.errors.APIError as exc:
+                raise DeploymentError('Could not start container {}: {}'.format(container_id[:12], exc))
+        return True
+
+    def _remove_changed_containers(self, name, hashes):
+        """
+        Helper method for deploy_stack(). Removes the containers of a deployment whose service changed or is not part
+        of the descriptor anymore.
+
+        Args:
+            name: str - name of the deployment
+            hashes: dict - service name: hash
+
+        Returns:
+            set of str: names of the containers that are kept
+
+        """
+        kept = set()
+        for container in self._docker.containers.list(all=True, filters={
+                'label': '{}={}'.format(compose.project_label, name)}):
+            labels = container.labels or {}
+            service = labels.get(self.service_label)
+            if service in hashes and labels.get(compose.spec_hash_label) == hashes[service]:
+                kept.add(container.name)
+                continue
+            try:
+                container.remove(force=True)
+            except docker.errors.NotFound:
+                pass
+            except docker.errors.APIError as exc:
+                raise DeploymentError('Could not remove container {}: {}'.format(container.name, exc))
+        return kept
+
+    def _get_or_create_stack_network(self, network, owner):
+        if network['external']:
+            try:
+                return self.get_network(network['name'])
+            except NotFoundError:
+                raise DeploymentError('External network {} not found'.format(network['name']))
+        # the name filter also matches parts of names
+        existing = [n for n in self._docker.networks.list(names=[network['name']]) if n.name == network['name']]
+        if existing:
+            return existing[0]
+        try:
+            return self._docker.networks.create(network['name'],
+                                                driver=network['driver'],
+                                                options=network['options'] or None,
+                                                internal=network['internal'],
+                                                check_duplicate=True,
+                                                labels=dict(network['labels'], **owner))
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not create network {}: {}'.format(network['name'], exc))
+
+    def _get_or_create_stack_volume(self, volume):
+        if volume['external']:
+            self.get_volume(volume['name'])
+            return
+        try:
+            self._docker.volumes.create(name=volume['name'], driver=volume['driver'],
+                                        driver_opts=volume['options'] or None, labels=volume['labels'])
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not create volume {}: {}'.format(volume['name'], exc))
+
+    def _create_stack_container(self, spec, owner):
+        """
+        Helper method for deploy_stack(). Creates the container of a service and connects it to all networks of the
+        service, the service name is an alias in every network.
+
+        Args:
+            spec: dict - container of compose.parse()
+            owner: dict - labels of the deployment
+
+        Returns:
+            str: ID of the container
+
+        """
+        try:
+            self.get_or_pull_image(spec['image'])
+        except NotFoundError as exc:
+            raise DeploymentError(exc)
+
+        labels = dict(spec['create']['labels'], **owner)
+        labels[self.service_label] = spec['service']
+        networks = spec['networks']
+        api = self._docker_api
+        try:
+            res = api.create_container(
+                spec['image'],
+                name=spec['name'],
+                host_config=api.create_host_config(**spec['host_config']),
+                networking_config=api.create_networking_config({
+                    networks[0][0]: api.create_endpoint_config(aliases=networks[0][1])
+                }) if networks else None,
+                **dict(spec['create'], labels=labels))
+            for network, aliases in networks[1:]:
+                api.connect_container_to_network(res['Id'], network, aliases=aliases)
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not create container {}: {}'.format(spec['name'], exc))
+        return res['Id']
+
+    def find_stack(self, deployment_name):
+        """
+        Find a deployment by name.
+
+        Args:
+            deployment_name: str - name of the deployment
+
+        Returns:
+            True
+
+        """
+        if not self._docker.containers.list(all=True, filters={
+                'label': '{}={}'.format(compose.project_label, deployment_name)}):
+            raise DeploymentError('Stack {} not found.'.format(deployment_name))
+        return True
+
+    def undeploy_stack(self, name):
+        """
+        Removes the containers and networks of a deployment, named volumes are kept like `docker stack rm` does.
+
+        Args:
+            name: str
+
+        Returns:
+            ProcessResult
+
+        """
+        in_use = reaper.remove_stack(self._docker, name, timeout=Settings.cleanup_timeout)
+        return ProcessResult('', 'Networks still in use: {}'.format(', '.join(in_use)) if in_use else '')
+
+    def get_services(self, stack):
+        """
+        Retrieve services for a deployment.
+
+        Args:
+            stack: str - name of deployment
+
+        Returns:
+            [LocalService]
+
+        """
+        try:
+            containers = self._docker.containers.list(all=True, filters={
+                'label': '{}={}'.format(compose.project_label, stack)})
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not get services for {}: {}'.format(stack, exc))
+
+        services = {}
+        for container in containers:
+            name = (container.labels or {}).get(self.service_label)
+            if name:
+                services.setdefault(name, []).append(container)
+        return [LocalService.from_containers(name, services[name]) for name in sorted(services)]
+
+    def get_service(self, service):
+        """
+        Retrieve a service.
+
+        Args:
+            service: LocalService or service name
+
+        Returns:
+            LocalService
+
+        """
+        name = service.name if isinstance(service, Service) else service
+        try:
+            containers = self._service_containers(name)
+        except docker.errors.APIError as exc:
+            raise NotFoundError('Cannot find service {}: {}'.format(name, exc))
+        if not containers:
+            raise NotFoundError('Cannot find service {}'.format(name))
+        return LocalService.from_containers(name, containers)
+
+    def get_tasks(self, services):
+        """
+        Describes the containers of services like the tasks of Swarm services. Every restart of a container counts as
+        new task.
+
+        Args:
+            services: list of str - names of the services
+
+        Returns:
+            [dict]
+
+        """
+        services = set(services)
+        try:
+            containers = self._docker.containers.list(all=True, filters={'label': self.service_label})
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not get tasks for {}: {}'.format(', '.join(services), exc))
+        return [self._task(c) for c in containers if (c.labels or {}).get(self.service_label) in services]
+
+    def _task(self, container):
+        state = container.attrs.get('State') or {}
+        status = state.get('Status')
+        if state.get('Restarting') or status == 'dead' or (status == 'exited' and state.get('ExitCode')):
+            task_state = 'failed'
+        elif status == 'exited':
+            task_state = 'complete'
+        elif status in ('running', 'paused'):
+            task_state = status
+        else:
+            task_state = 'starting'
+        return {
+            'ID': '{}.{}'.format(container.id, container.attrs.get('RestartCount') or 0),
+            'ServiceID': container.labels.get(self.service_label),
+            'Status': {
+                'State': task_state,
+                'Err': state.get('Error') or '',
+                'ContainerStatus': {'ExitCode': state.get('ExitCode')}
+            }
+        }
+
+    def get_containers_for_service(self, service, state='running'):
+        """
+        For the given service, wait until a timeout occurs or at least one container is in the specified state.
+
+        Args:
+            service: LocalService or service name
+            state: expected state of service
+
+        Returns:
+            [Container]
+
+        """
+        service = service.name if isinstance(service, Service) else service
+        assert isinstance(service, basestring)
+
+        wait_on_service_container_status(self, service)
+        res = self._docker.containers.list(all=True, filters={
+            'label': '{}={}'.format(self.service_label, service),
+            'status': state.lower()
+        })
+        if not res:
+            BuiltIn().log('No containers found for service {}'.format(service), level='INFO', console=True)
+            raise NotFoundError('No containers found for service {}'.format(service))
+        return res
+
+    def get_node(self, node_id):
+        raise NotFoundError('Nodes are only available in a swarm')
+
+    def get_or_create_network(self, name, driver='bridge'):
+        return super(LocalDockerController, self).get_or_create_network(name, driver)
+
+    def connect_network_to_service(self, service, network):
+        """
+        Connect the given network to all containers of the given service.
+
+        Args:
+            service: LocalService or service name
+            network: docker.models.networks.Network or network name
+
+        Returns:
+            docker.models.containers.Container
+
+        """
+        try:
+            n = network if isinstance(network, Network) else self.get_network(network)
+            s = service if isinstance(service, Service) else self.get_service(service)
+        except NotFoundError as exc:
+            raise DeploymentError('Entity not found: {}'.format(exc))
+
+        BuiltIn().log('Connecting network {} to service {}...'.format(n.name, s.name),
+                      level='INFO',
+                      console=Settings.to_console)
+        return self.update_service(s, networks=[n.name])
+
+    def connect_volume_to_service(self, service, volume):
+        """
+        Connect a given volume to a given service. In case the volume is already connected, just return a container
+        of the service.
+
+        Args:
+            service: LocalService or service name
+            volume: docker.models.volumes.Volume or volume name
+
+        Returns:
+            Container
+
+        """
+        if not volume:
+            raise DeploymentError('You must provide a volume to connect it to a service.')
+        if not service:
+            raise DeploymentError('You must provide a service to connect a volume.')
+
+        try:
+            v = volume if isinstance(volume, Volume) else self.get_volume(volume)
+            s = service if isinstance(service, Service) else self.get_service(service)
+        except NotFoundError as exc:
+            raise DeploymentError('Entity not found: {}'.format(exc))
+
+        for mount in s.attrs['Spec']['TaskTemplate']['ContainerSpec']['Mounts']:
+            if v.name == mount.get('Source'):
+                return self.get_containers_for_service(s)[0]
+
+        BuiltIn().log('Connecting volume {} to service {}...'.format(v.name, s.name),
+                      level='INFO',
+                      console=Settings.to_console)
+        return self.update_service(s, mounts=['{}:/goss:ro'.format(v.name)])
+
+    def update_service(self, service, **kwargs):
+        """
+        Update the containers of a service. Networks are connected to the running containers, containers are
+        recreated with the same configuration for new mounts.
+
+        Args:
+            service: LocalService
+            **kwargs: networks - list of network names, mounts - list of <source>:<target>:<mode>
+
+        Returns:
+            Container: Instance of Container
+
+        """
+        assert isinstance(service, Service)
+        unsupported = set(kwargs) - {'networks', 'mounts'}
+        if unsupported:
+            raise DeploymentError('Could not update service {}: {} not supported without Swarm'.format(
+                service.name, ', '.join(sorted(unsupported))))
+
+        alias = service.name.split('_', 1)[-1]
+        try:
+            containers = self.get_containers_for_service(service)
+            for container in containers:
+                for network in kwargs.get('networks') or []:
+                    if network not in container.attrs['NetworkSettings']['Networks']:
+                        self._docker_api.connect_container_to_network(container.id, network, aliases=[alias])
+            if kwargs.get('mounts'):
+                containers = [self._recreate(c, kwargs['mounts']) for c in containers]
+            c = self._docker.containers.get(containers[0].id)
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not update service {}: {}'.format(service.name, exc))
+        wait_on_container_status(self, c)
+        return c
+
+    def service_volumes(self, service):
+        """
+        Names of the named volumes the containers of a service mount.
+
+        Args:
+            service: LocalService
+
+        Returns:
+            list of str
+
+        """
+        return sorted(set(m['Name'] for c in self._service_containers(service.name)
+                          for m in c.attrs.get('Mounts') or [] if m.get('Type') == 'volume' and m.get('Name')))
+
+    def reset_service(self, service, snapshots=None):
+        """
+        Restores a service to the state after the deployment: its containers are stopped, its volumes are restored
+        from their snapshots and the containers are recreated with the same configuration.
+
+        Args:
+            service: LocalService
+            snapshots: dict - volume: snapshot volume, see snapshot_volume()
+
+        Returns:
+            None
+
+        """
+        assert isinstance(service, Service)
+        volumes = [v for v in self.service_volumes(service) if v in (snapshots or {})]
+        try:
+            containers = self._service_containers(service.name)
+            for container in containers:
+                container.stop()
+            for volume in volumes:
+                self.restore_volume(snapshots[volume], volume)
+            for container in containers:
+                container.reload()
+                self._recreate(container, [])
+        except docker.errors.APIError as exc:
+            raise DeploymentError('Could not reset service {}: {}'.format(service.name, exc))
+
+    def _service_containers(self, service):
+        return self._docker.containers.list(all=True, filters={'label': '{}={}'.format(self.service_label, service)})
+
+    def _recreate(self, container, binds):
+        """
+        Helper method for update_service(). Replaces a container with a container of the same configuration and
+        additional bind mounts.
+
+        Args:
+            container: Container
+            binds: list of str - <source>:<target>:<mode>
+
+        Returns:
+            Container
+
+        """
+        config = dict(container.attrs['Config'])
+        if config.get('Hostname') == container.id[:12]:
+            del config['Hostname']
+        host_config = dict(container.attrs['HostConfig'])
+        host_config['Binds'] = (host_config.get('Binds') or []) + binds
+        config['HostConfig'] = host_config
+
+        networks = container.attrs['NetworkSettings']['Networks']
+        aliases = dict((n, [a for a in (s.get('Aliases') or []) if a != container.id[:12]])
+                       for n, s in networks.items())
+        first = host_config.get('NetworkMode') if host_config.get('NetworkMode') in networks else None
+        if first:
+            config['NetworkingConfig'] = {'EndpointsConfig': {first: {'Aliases': aliases[first]}}}
+
+        container.remove(force=True)
+        res = self._docker_api.create_container_from_config(config, container.name)
+        for network in sorted(networks):
+            if network != first:
+                self._docker_api.connect_container_to_network(res['Id'], network, aliases=aliases[network])
+        self._docker_api.start(res['Id'])
+        return self._docker.containers.get(res['Id'])
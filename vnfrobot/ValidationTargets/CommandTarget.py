@@ -1,4 +1,5 @@
 from ValidationTargets.ValidationTarget import ValidationTarget
+from exc import ValidationError
 from testtools.DockerTool import DockerTool
 from tools import validators, matchers
 from tools.testutils import call_validator, validate_value
@@ -29,6 +30,9 @@ class Command(ValidationTarget):
     def __init__(self, instance=None):
         super(Command, self).__init__(instance)
 
+        # seconds after which the command is killed, the return code of a killed command is 124
+        self.timeout = None
+
         self.options = {
             'test_tool': DockerTool,
             'command': 'run_in_container',
@@ -41,6 +45,8 @@ class Command(ValidationTarget):
 
         call_validator(self.instance.sut.target_type, validators.Context, Command.allowed_contexts)
         call_validator(self.property, validators.Property, Command.properties)
+        if self.timeout is not None:
+            self.timeout = self._parse_timeout(self.timeout)
         if 'empty' in self.value:
             if 'is' in self.matcher or 'is not' in self.matcher:
                 self.matcher = '{} {}'.format(self.matcher, self.value)
@@ -50,6 +56,16 @@ class Command(ValidationTarget):
         if 'empty' not in self.matcher:
             validate_value(Command.properties, self.property, self.value)
 
+    @staticmethod
+    def _parse_timeout(timeout):
+        try:
+            seconds = float(unicode(timeout).strip().rstrip('s'))
+        except ValueError:
+            raise ValidationError('Invalid timeout "{}", expected seconds, e.g. 5s'.format(timeout))
+        if seconds <= 0:
+            raise ValidationError('Invalid timeout "{}", must be greater than 0'.format(timeout))
+        return seconds
+
     def _prepare_transform(self):
         self.options['sidecar_command'] = self.entity
 
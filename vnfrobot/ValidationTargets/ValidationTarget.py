@@ -1,4 +1,5 @@
 import copy
+import os
 from abc import ABCMeta, abstractmethod, abstractproperty
 
 from docker.models.containers import Container
@@ -10,6 +11,7 @@ from exc import SetupError, ValidationError, NotFoundError, DeploymentError
 from settings import Settings, set_breakpoint
 from testtools.GossTool import GossTool
 from testtools.TestTool import TestTool
+from tools import deadline, tracing
 from tools.data_structures import SUT
 from tools.orchestrator import Orchestrator
 
@@ -37,6 +39,8 @@ class ValidationTarget(object):
         self.data = {}
         self.transformed_data = {}
         self._options = None
+        self.goss_server = None
+        self.pooled_sidecar = None
 
         assert isinstance(self.instance.orchestrator, Orchestrator)
         assert isinstance(self.instance.orchestrator.controller, InfrastructureController)
@@ -217,47 +221,59 @@ class ValidationTarget(object):
         sidecar_required = self.options.get('sidecar_required', False)
 
         try:
-            self.validate()
-            self._prepare_transform()
-            self.transform()
+            deadline.check('validate phase')
+            with tracing.span('validate', 'phase'):
+                self.validate()
+                self._prepare_transform()
+                self.transform()
         except (ValidationError, NotFoundError, DeploymentError) as exc:
             self._cleanup()
             raise exc
 
         try:
-            self.instance.orchestrator.get_or_create_deployment()
+            deadline.check('deployment phase')
+            with tracing.span('deployment', 'phase'):
+                self.instance.wait_for_deployment()
         except (ValidationError, NotFoundError, DeploymentError) as exc:
             self._cleanup()
             raise exc
 
         try:
-            if test_volume_required:
-                self._create_test_volume()
-            if sidecar_required:
-                sidecar_command = self.options.get('sidecar_command', None)
-                self._create_sidecar(command=sidecar_command)
-            if not sidecar_required and test_volume_required:
-                self._connect_volume_to_sut()
-            tool_instance = self.options.get('test_tool', None)(
-                controller=self.instance.orchestrator.controller,
-                sut=self.instance.sut
-            )
-            self._prepare_run(tool_instance)
-            tool_instance.command = self.options.get('command', None) or tool_instance.command
+            deadline.check('prepare phase')
+            with tracing.span('prepare', 'phase'):
+                if test_volume_required:
+                    self._create_test_volume()
+                if sidecar_required:
+                    sidecar_command = self.options.get('sidecar_command', None)
+                    self._create_sidecar(command=sidecar_command)
+                if not sidecar_required and test_volume_required:
+                    self._connect_volume_to_sut()
+                tool_instance = self.options.get('test_tool', None)(
+                    controller=self.instance.orchestrator.controller,
+                    sut=self.instance.sut
+                )
+                self._prepare_run(tool_instance)
+                tool_instance.command = self.options.get('command', None) or tool_instance.command
+                if self.goss_server:
+                    tool_instance.use_server(Settings.goss_serve_port)
         except (ValidationError, NotFoundError, DeploymentError) as exc:
             self._cleanup()
             raise exc
 
         try:
             # set_breakpoint()
-            tool_instance.run(self)
+            deadline.check('run phase')
+            with tracing.span('run', 'phase', tool=type(tool_instance).__name__):
+                tool_instance.run(self)
         except (ValidationError, NotFoundError, DeploymentError) as exc:
             raise exc
         finally:
-            self._cleanup()
+            with tracing.span('cleanup', 'phase'):
+                self._cleanup()
 
         try:
-            self.evaluate_results(tool_instance)
+            with tracing.span('evaluate', 'phase'):
+                self.evaluate_results(tool_instance)
         except ValidationError as exc:
             raise exc
 
@@ -272,24 +288,35 @@ class ValidationTarget(object):
             None
 
         """
-        if not command:
+        run_goss = not command
+        if run_goss:
             command = GossTool(controller=self.instance.orchestrator.controller).command
         network_name = self.instance.sut.service_id if 'network' in self.instance.sut.target_type else None
         if network_name:
             assert self.instance.orchestrator.controller.get_network(
             network_name), '_create_sidecar: cannot find network {}'.format(network_name)
 
-        volumes = {
-            self.instance.test_volume: {
-                'bind': '/goss',
-                'mode': 'ro'
-            }
-        }
-        self.instance.sidecar = self.instance.orchestrator.controller.get_or_create_sidecar(
-            name='robot_sidecar_for_{}'.format(self.instance.deployment_name),
-            command=command,
-            network=network_name,
-            volumes=volumes)
+        volumes = self.instance.orchestrator.sidecar_volumes(self.instance.test_volume)
+        with tracing.span('sidecar start', 'sidecar') as record:
+            if Settings.goss_serve and network_name and run_goss:
+                record['args']['kind'] = 'goss server'
+                self.goss_server = self.instance.orchestrator.get_or_create_goss_server(network_name, volumes)
+                self.instance.update_sut(target_type='container', target=self.goss_server.name)
+                return
+
+            pool = self.instance.orchestrator.sidecar_pool
+            if pool:
+                record['args']['kind'] = 'pool'
+                self.pooled_sidecar = pool.acquire(network=network_name, volumes=volumes)
+                self.instance.update_sut(target_type='container', target=self.pooled_sidecar.name)
+                return
+
+            record['args']['kind'] = 'sidecar'
+            self.instance.sidecar = self.instance.orchestrator.controller.get_or_create_sidecar(
+                name='robot_sidecar_for_{}_{}'.format(self.instance.deployment_name, os.getpid()),
+                command=command,
+                network=network_name,
+                volumes=volumes)
         self.instance.update_sut(target_type='container', target=self.instance.sidecar.name)
         if network_name:
             assert network_name in self.instance.sidecar.attrs['NetworkSettings']['Networks'].keys()
@@ -366,21 +393,33 @@ class ValidationTarget(object):
         Returns:
 
         """
+        # the cleanup gets its own deadline, so sidecars are also removed if the deadline of the keyword expired
+        with deadline.deadline(Settings.cleanup_timeout, 'cleanup', nested=False):
+            self._remove_sidecar()
+
+    def _remove_sidecar(self):
+        if self.pooled_sidecar:
+            with tracing.span('sidecar stop', 'sidecar', kind='pool'):
+                self.instance.orchestrator.sidecar_pool.release(self.pooled_sidecar)
+            self.pooled_sidecar = None
+
         if self.instance.sidecar:
             BuiltIn().log('Cleanup sidecar: removing {}'.format(self.instance.sidecar.name),
                           level='INFO',
                           console=Settings.to_console)
             assert isinstance(self.instance.sidecar, Container)
-            try:
-                self.instance.sidecar.kill()
-            except APIError:
-                pass
-
-            try:
-                self.instance.sidecar.remove()
-            except APIError as exc:
-                if 'No such container' not in exc.explanation:
-                    BuiltIn().log('Cleanup failed: could not remove {}: exc'.format(self.instance.sidecar.name, exc),
-                                  level='ERROR',
-                                  console=Settings.to_console)
+            with tracing.span('sidecar stop', 'sidecar', kind='sidecar'):
+                try:
+                    self.instance.sidecar.kill()
+                except APIError:
+                    pass
+
+                try:
+                    self.instance.sidecar.remove()
+                except APIError as exc:
+                    if 'No such container' not in exc.explanation:
+                        BuiltIn().log('Cleanup failed: could not remove {}: exc'.format(self.instance.sidecar.name,
+                                                                                        exc),
+                                      level='ERROR',
+                                      console=Settings.to_console)
             self.instance.sidecar = None
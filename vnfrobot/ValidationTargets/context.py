@@ -1,3 +1,5 @@
+import os
+
 from robot.libraries.BuiltIn import BuiltIn
 
 from exc import NotFoundError, SetupError, ValidationError
@@ -6,7 +8,7 @@ from tools.wait_on import wait_on_service_container_status
 
 
 def _generate_sidecar_name(service_id):
-    return 'robot_sidecar_for_{}'.format(service_id)
+    return 'robot_sidecar_for_{}_{}'.format(service_id, os.getpid())
 
 
 def set_context(instance, context_type=None, context=None):
@@ -1,4 +1,12 @@
 # -*- coding: utf-8 -*-
+import cProfile
+import itertools
+import os
+import pstats
+import re
+import time
+from StringIO import StringIO
+
 from rflint.parser import parser
 from robot.libraries.BuiltIn import BuiltIn, RobotNotRunningError
 
@@ -7,16 +15,20 @@ from robot.api.deco import keyword
 from ValidationTargets.CommandTarget import Command
 from ValidationTargets.FileTarget import File
 from ValidationTargets.PlacementTarget import Placement
-from exc import SetupError, NotFoundError, ValidationError
+from exc import SetupError, NotFoundError, ValidationError, DeadlineExceeded, CircuitOpenError, DeploymentError
 from ValidationTargets.AddressTarget import Address
 from ValidationTargets.PortTarget import Port
 from ValidationTargets.VariableTarget import Variable
 from settings import Settings, set_breakpoint
-from tools import matchers
+from tools import deadline, matchers, retry, tracing
 from ValidationTargets.context import set_context
 from robotlibcore import DynamicCore
 from tools.data_structures import SUT
-from tools.orchestrator import DockerOrchestrator
+from tools.orchestrator import DockerOrchestrator, reset_tag
+from tools.budget import TimeBreakdown, format_breakdown, parse_budgets
+from tools.history import KeywordHistory, image_digests
+from tools.metrics import PrometheusExporter
+from tools.tracing import DaemonCallTracer, ChromeTrace
 from version import VERSION
 from tools.matchers import string_matchers, all_matchers
 
@@ -50,7 +62,8 @@ class VnfValidator(DynamicCore):
         self.sut = SUT(None, None, None)
         self.deployment_options = {
             'SKIP_UNDEPLOY': False,
-            'USE_DEPLOYMENT': None
+            'USE_DEPLOYMENT': None,
+            'REDEPLOY': False
         }
         self.test_volume = None
         self.sidecar = None
@@ -63,6 +76,24 @@ class VnfValidator(DynamicCore):
         self.current_keywords = []
         self.fatal_error = False
         self.validation_attempted = False
+        self._setup_done = False
+        self.reset_error = None
+
+        # instrumentation
+        self.suite_name = None
+        self.test_name = None
+        self.output_dir = None
+        self.tracer = None
+        self.chrome_trace = None
+        self.metrics = None
+        self.history = None
+        self.time_breakdown = None
+        self.keyword_budgets = {}
+        self.suite_budget = 0
+        self._suite_start = None
+        self._spans = {}
+        self._keyword_spans = []
+        self._profiles = itertools.count(1)
 
         try:
             self.deployment_options['USE_DEPLOYMENT'] = \
@@ -72,10 +103,29 @@ class VnfValidator(DynamicCore):
                     BuiltIn().get_variable_value("${SKIP_UNDEPLOY}") or
                     Settings.skip_undeploy):
                 self.deployment_options['SKIP_UNDEPLOY'] = True
+            if Settings.redeploy or BuiltIn().get_variable_value("${REDEPLOY}"):
+                self.deployment_options['REDEPLOY'] = True
         except RobotNotRunningError:
             pass
 
     # noinspection PyUnusedLocal
+    @property
+    def containers(self):
+        """
+        Containers of the deployment. The containers of services the suite does not need are retrieved on first use.
+
+        Returns:
+            list of docker.models.containers.Container
+
+        """
+        if self.orchestrator and getattr(self.orchestrator, 'pending_containers', None):
+            self.orchestrator.collect_containers()
+        return self._containers
+
+    @containers.setter
+    def containers(self, containers):
+        self._containers = containers
+
     def _start_suite(self, name, attrs):
         """
         Listener method by the Robot Framework that is called when on suite setup.
@@ -90,6 +140,27 @@ class VnfValidator(DynamicCore):
         """
         self.suite_source = attrs.get('source', None)
         self.descriptor_file = BuiltIn().get_variable_value("${DESCRIPTOR}") or 'docker-compose.yml'
+        self.suite_name = name
+        self.output_dir = Settings.output_dir or BuiltIn().get_variable_value("${OUTPUT DIR}") or os.getcwd()
+
+        if Settings.trace:
+            self.tracer = DaemonCallTracer()
+            tracing.add_listener(self.tracer)
+        if Settings.chrome_trace:
+            self.chrome_trace = ChromeTrace()
+            tracing.add_listener(self.chrome_trace)
+        self._suite_start = time.time()
+        retry.budget.reset(Settings.retry_budget)
+        self.keyword_budgets = parse_budgets(BuiltIn().get_variable_value("${KEYWORD_BUDGETS}") or
+                                             Settings.keyword_budgets)
+        self.suite_budget = float(BuiltIn().get_variable_value("${SUITE_BUDGET}") or Settings.suite_budget)
+        if self.keyword_budgets or self.suite_budget:
+            self.time_breakdown = TimeBreakdown()
+            tracing.add_listener(self.time_breakdown)
+        if Settings.metrics_dir:
+            self.metrics = PrometheusExporter(name, Settings.metrics_buckets, Settings.metrics_api_buckets)
+            tracing.add_listener(self.metrics)
+        self._spans['suite'] = tracing.begin(name, 'suite', source=self.suite_source)
 
         # parse robot file
         self.parsed_descriptor = parser.RobotFactory(self.suite_source)
@@ -104,11 +175,60 @@ class VnfValidator(DynamicCore):
                           level='INFO',
                           console=True)
             self.orchestrator = DockerOrchestrator(self)
-            self.orchestrator.get_or_create_deployment()
-        except SetupError as exc:
+            if Settings.reap_orphans:
+                self.orchestrator.controller.reap_orphans_detached(self.output_file('reaper', 'log'),
+                                                                   ttl=Settings.reaper_ttl)
+            self.orchestrator.start_setup()
+        except (SetupError, DeadlineExceeded, CircuitOpenError) as exc:
             BuiltIn().log('_start_suite: {}'.format(exc), level='ERROR')
             self.fatal_error = True
 
+        if Settings.history_db:
+            self.history = KeywordHistory(Settings.history_db,
+                                          window=Settings.history_window,
+                                          min_runs=Settings.history_min_runs,
+                                          ratio=Settings.history_ratio)
+            self.history.start_run(name, self.descriptor_file)
+
+        if not Settings.background_setup:
+            self.wait_for_deployment()
+
+    def wait_for_deployment(self):
+        """
+        Blocks until the deployment that was started in the background at suite start is ready. Keywords call this
+        only when they need the deployment, validation of statements does not wait.
+
+        Returns:
+            None
+
+        Raises:
+            ValidationError: if the setup of the suite failed
+
+        """
+        if self.orchestrator and not self.fatal_error and not self._setup_done:
+            try:
+                try:
+                    self.orchestrator.wait_for_setup()
+                finally:
+                    self.orchestrator.replay_log()
+                self._setup_done = True
+                if self.orchestrator.image_pulls:
+                    BuiltIn().log('Image pulls: {}'.format(', '.join(
+                        '{} {}'.format(image, 'present' if seconds is None else '{:.2f} s'.format(seconds))
+                        for image, seconds in sorted(self.orchestrator.image_pulls.items()))),
+                        level='INFO', console=Settings.to_console)
+                if self.history:
+                    self.history.set_images(image_digests(self.services))
+            except Exception as exc:
+                if not self.orchestrator.setup_done():
+                    # the deadline of the keyword expired, the setup is still running
+                    raise
+                # any error of the setup, e.g. a failed assertion of a background task, fails the suite once
+                BuiltIn().log('_start_suite: {}: {}'.format(type(exc).__name__, exc), level='ERROR')
+                self.fatal_error = True
+        if self.fatal_error:
+            raise ValidationError('We do not start validation as a fatal error occured during test setup.')
+
     def _check_test_steps(self):
         """
         Helper method to check if for every test case in the suite, there is at least one command for
@@ -142,7 +262,173 @@ class VnfValidator(DynamicCore):
                 None
         """
         if self.orchestrator:
-            self.orchestrator.remove_deployment()
+            try:
+                self.wait_for_deployment()
+            except ValidationError:
+                pass
+            with tracing.span('suite teardown', 'teardown'):
+                self.orchestrator.remove_goss_servers()
+                self.orchestrator.remove_sidecar_pool()
+                self.orchestrator.remove_snapshots()
+                self.orchestrator.remove_deployment()
+        tracing.end(self._spans.pop('suite', None))
+
+        if self.time_breakdown:
+            tracing.remove_listener(self.time_breakdown)
+            self.time_breakdown.collect()
+            elapsed = time.time() - self._suite_start
+            level = 'ERROR' if self.suite_budget and elapsed > self.suite_budget else 'INFO'
+            BuiltIn().log('Suite {} took {:.2f} s, budget {} s ({})'.format(
+                name, elapsed, self.suite_budget or '-', format_breakdown(self.time_breakdown.suite, elapsed)),
+                level=level, console=Settings.to_console)
+            self.time_breakdown = None
+
+        if self.chrome_trace:
+            tracing.remove_listener(self.chrome_trace)
+            trace_file = self.output_file('trace', 'json')
+            self.chrome_trace.write(trace_file)
+            BuiltIn().log('Chrome trace of suite {}: {}'.format(name, trace_file), level='INFO',
+                          console=Settings.to_console)
+            self.chrome_trace = None
+
+        if self.tracer:
+            tracing.remove_listener(self.tracer)
+            trace_file = self.output_file('trace', 'jsonl')
+            self.tracer.write(trace_file)
+            BuiltIn().log('Daemon calls of suite {} (raw trace: {}):\n{}'.format(
+                name, trace_file, self.tracer.summary()), level='INFO', console=Settings.to_console)
+            self.tracer = None
+
+        if self.metrics:
+            tracing.remove_listener(self.metrics)
+            metrics_file = self.output_file('metrics', 'prom', directory=Settings.metrics_dir)
+            self.metrics.write(metrics_file)
+            BuiltIn().log('Metrics of suite {}: {}'.format(name, metrics_file), level='INFO',
+                          console=Settings.to_console)
+            self.metrics = None
+
+        if self.history:
+            self.history.close()
+            self.history = None
+
+    # noinspection PyUnusedLocal
+    def _start_test(self, name, attrs):
+        """
+        Listener method by the Robot Framework that is called when a test case starts.
+
+        Args:
+            name: name of the test case
+            attrs: attributes of the test case
+
+        Returns:
+            None
+
+        """
+        self.test_name = name
+        self._spans['test'] = tracing.begin(name, 'test', tags=attrs.get('tags', []))
+        self._reset_for_test(attrs.get('tags', []))
+
+    def _reset_for_test(self, tags):
+        """
+        Resets the services named by the reset tags of a test case before it starts. Listener methods cannot fail a
+        test, an error is kept and fails the first keyword of the test instead.
+
+        Args:
+            tags: list of str
+
+        Returns:
+            None
+
+        """
+        names = set()
+        for tag in tags:
+            parsed = reset_tag(tag)
+            if parsed == []:
+                names = None
+                break
+            names.update(parsed or [])
+        if names is not None and not names:
+            return
+        try:
+            self.wait_for_deployment()
+            self.orchestrator.reset_services(sorted(names) if names is not None else None)
+        except (DeploymentError, SetupError, ValidationError, DeadlineExceeded, CircuitOpenError) as exc:
+            BuiltIn().log('Reset before test {} failed: {}'.format(self.test_name, exc), level='ERROR')
+            self.reset_error = exc
+
+    # noinspection PyUnusedLocal
+    def _end_test(self, name, attrs):
+        """
+        Listener method by the Robot Framework that is called when a test case ends.
+
+        Args:
+            name: name of the test case
+            attrs: attributes of the test case
+
+        Returns:
+            None
+
+        """
+        record = self._spans.pop('test', None)
+        if record:
+            record['args']['status'] = attrs.get('status')
+        tracing.end(record)
+        self.test_name = None
+        self.reset_error = None
+
+    def _start_keyword(self, name, attrs):
+        """
+        Listener method by the Robot Framework that is called when a keyword starts. Keywords of this library are
+        measured in run_keyword(), all other keywords, e.g. user keywords, are measured here.
+
+        Args:
+            name: name of the keyword
+            attrs: attributes of the keyword
+
+        Returns:
+            None
+
+        """
+        if attrs.get('libname') == type(self).__name__:
+            self._keyword_spans.append(None)
+        else:
+            self._keyword_spans.append(tracing.begin(attrs.get('kwname') or name, 'robot keyword',
+                                                     type=attrs.get('type')))
+
+    # noinspection PyUnusedLocal
+    def _end_keyword(self, name, attrs):
+        """
+        Listener method by the Robot Framework that is called when a keyword ends.
+
+        Args:
+            name: name of the keyword
+            attrs: attributes of the keyword
+
+        Returns:
+            None
+
+        """
+        if self._keyword_spans:
+            tracing.end(self._keyword_spans.pop())
+
+    def output_file(self, kind, extension, directory=None, parts=None):
+        """
+        Path of a file in the output directory that belongs to the current suite.
+
+        Args:
+            kind: str - e.g. trace
+            extension: str - file extension
+            directory: str - directory, defaults to the output directory
+            parts: list of str - further parts of the file name, e.g. test and keyword
+
+        Returns:
+            str
+
+        """
+        name = '-'.join([self.suite_name or 'suite'] + [p[:60] for p in (parts or [])])
+        name = re.sub('[^\w.-]+', '_', name)
+        return os.path.join(directory or self.output_dir or os.getcwd(),
+                            'vnfrobot-{}-{}.{}'.format(kind, name, extension))
 
     def update_sut(self, **kwargs):
         """
@@ -191,6 +477,7 @@ class VnfValidator(DynamicCore):
             temp_sut: namedtuple
 
         """
+        self.wait_for_deployment()
         try:
             if temp_sut.target_type == 'network':
                 self.orchestrator.controller.get_network(temp_sut.service_id)
@@ -219,8 +506,111 @@ class VnfValidator(DynamicCore):
         self.context = BuiltIn().get_library_instance(all=True)
 
         # logger.info(u"\nRunning keyword '%s' with arguments %s." % (name, args), also_console=True)
+        statement = self._statement(name, args)
+        keyword_type = name.split(' ')[0].strip(':')
+        self._check_suite_budget()
+        if self.reset_error:
+            BuiltIn().fail(u'Services could not be reset before the test: {}'.format(self.reset_error))
+        # the budget bounds the keyword like its deadline, so an overrun is stopped instead of detected afterwards
+        budget = self.keyword_budgets.get(keyword_type)
+        limits = [t for t in (Settings.keyword_timeout, budget) if t]
+        with tracing.span(statement, 'keyword', type=keyword_type) as record, \
+                deadline.deadline(min(limits) if limits else None, u'"{}"'.format(statement)):
+            start = time.time()
+            status = 'FAIL'
+            try:
+                result = self._run_keyword(statement, name, args, kwargs)
+                status = 'PASS'
+            except Exception:
+                # keywords turn the expired deadline into a failure of their own, so a keyword that ran out of its
+                # budget fails with the breakdown below, whatever it raised
+                if not budget or time.time() - start < budget:
+                    raise
+                result = None
+            finally:
+                duration = time.time() - start
+                breakdown = self.time_breakdown.collect(record['depth']) if self.time_breakdown else None
+                regression = self.history.record(self.test_name, statement, keyword_type, duration, status) \
+                    if self.history else None
+
+            if regression:
+                if Settings.history_fail:
+                    BuiltIn().fail(u'Latency regression: {}'.format(regression))
+                BuiltIn().log(u'Latency regression: {}'.format(regression), level='WARN', console=Settings.to_console)
+
+            if budget and duration >= budget:
+                BuiltIn().fail(u'Time budget exceeded: "{}" took {:.2f} s, the budget of {} keywords is {} s ({})'
+                               .format(statement, duration, keyword_type, budget,
+                                       format_breakdown(breakdown, duration)))
+            return result
+
+    def _check_suite_budget(self):
+        """
+        Fails the keyword if the suite already took longer than its budget.
+
+        Returns:
+            None
+
+        """
+        if not self.suite_budget or not self._suite_start:
+            return
+        elapsed = time.time() - self._suite_start
+        if elapsed > self.suite_budget:
+            if self.time_breakdown:
+                self.time_breakdown.collect()
+            BuiltIn().fail('Time budget exceeded: suite {} is running for {:.2f} s, the budget is {} s ({})'.format(
+                self.suite_name, elapsed, self.suite_budget,
+                format_breakdown(self.time_breakdown.suite if self.time_breakdown else None, elapsed)))
+
+    def _run_keyword(self, statement, name, args, kwargs):
+        if Settings.profile and re.search(Settings.profile, statement):
+            return self._run_profiled(statement, self.keywords[name], args, kwargs)
         return self.keywords[name](*args, **kwargs)
 
+    def _run_profiled(self, statement, func, args, kwargs):
+        """
+        Runs a keyword with cProfile. The profile is saved as .pstats file named after the suite, test and keyword,
+        and the functions with the highest cumulative time are logged.
+
+        Args:
+            statement: str - validation statement
+            func: keyword method
+            args: list
+            kwargs: dict
+
+        Returns:
+            return value of the keyword
+
+        """
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            profile_file = self.output_file('profile', 'pstats', parts=[
+                self.test_name or 'setup', '{:03d}'.format(next(self._profiles)), statement])
+            profile.dump_stats(profile_file)
+
+            summary = StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(Settings.profile_top)
+            BuiltIn().log(u'Profile of "{}" ({}):\n{}'.format(statement, profile_file, summary.getvalue()),
+                          level='INFO')
+
+    @staticmethod
+    def _statement(name, args):
+        """
+        Helper method to reconstruct the validation statement from the name of a keyword with embedded arguments.
+
+        Args:
+            name: str - keyword name
+            args: list - embedded arguments
+
+        Returns:
+            str
+
+        """
+        args = iter(args)
+        return re.sub('\$\{[^}]*\}', lambda m: u'{}'.format(next(args, m.group(0))), name)
+
     @keyword('Set ${context_type:\S+} context to ${context:\S+}')
     def set_context_kw(self, context_type=None, context=None):
         """
@@ -271,6 +661,42 @@ class VnfValidator(DynamicCore):
         except ValidationError as exc:
             BuiltIn().fail(exc)
 
+    @keyword('Command ${{raw_entity:{}}} with timeout ${{raw_timeout:{}}}: ${{raw_prop:{}}} ${{matcher:{}}} '
+             '${{raw_val:{}}}'.format(
+                 matchers.quoted_or_unquoted_string,
+                 '\d+\.?\d*s?',
+                 '|'.join(Command.properties.keys()),
+                 '|'.join(all_matchers.keys()),
+                 matchers.quoted_or_unquoted_string))
+    def command_timeout_kw(self, raw_entity, raw_timeout, raw_prop, matcher, raw_val):
+        """
+        'Command' keyword with timeout. A command that does not terminate within the timeout is killed and has the
+        return code 124.
+
+        Args:
+            raw_entity: str
+            raw_timeout: str - seconds, e.g. 5s
+            raw_prop: str
+            matcher: str
+            raw_val: str
+
+        Returns:
+            None
+
+        """
+        try:
+            validation_target = Command(self)
+            validation_target.set_as_dict({
+                'context': self.sut,
+                'entity': raw_entity,
+                'property': raw_prop,
+                'matcher': matcher,
+                'value': raw_val,
+                'timeout': raw_timeout})
+            validation_target.run_test()
+        except ValidationError as exc:
+            BuiltIn().fail(exc)
+
     @keyword('File ${{raw_entity:{}}}: ${{matcher:{}}} ${{raw_val:{}}}'.format(
         matchers.quoted_or_unquoted_string,
         '|'.join(string_matchers.keys()),
@@ -449,6 +875,25 @@ class VnfValidator(DynamicCore):
         except ValidationError as exc:
             BuiltIn().fail(exc)
 
+    @keyword('Reset service ${service:\S+}')
+    def reset_service_kw(self, service):
+        """
+        'Reset service' keyword: restores a service to its state after the deployment, see
+        DockerOrchestrator.reset_services().
+
+        Args:
+            service: str - name of the service in the descriptor
+
+        Returns:
+            None
+
+        """
+        try:
+            self.wait_for_deployment()
+            self.orchestrator.reset_services([service])
+        except (DeploymentError, SetupError) as exc:
+            BuiltIn().fail(exc)
+
     @keyword('Remove deployment')
     def remove_deployment_kw(self):
         """
@@ -45,3 +45,17 @@ class DeploymentError(RuntimeError):
     Error that is thrown if there is a problem with a deployment.
     """
     pass
+
+
+class DeadlineExceeded(ValidationError):
+    """
+    Error that is thrown if the deadline of a keyword or of the suite setup expired.
+    """
+    pass
+
+
+class CircuitOpenError(ValidationError):
+    """
+    Error that is thrown if a call fails fast because the Docker daemon or the deployment failed repeatedly.
+    """
+    pass
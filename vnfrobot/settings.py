@@ -1,4 +1,5 @@
 import os
+import tempfile
 # noinspection PyPackageRequirements
 from dotenv import load_dotenv, find_dotenv
 
@@ -50,13 +51,119 @@ class Settings:
     to_console = os.environ.get('VNFROBOT_TO_CONSOLE') or False
     use_deployment = os.environ.get('VNFROBOT_USE_DEPLOYMENT') or ''
     skip_undeploy = True if use_deployment else (os.environ.get('VNFROBOT_SKIP_UNDEPLOY') or False)
+    redeploy = str2bool(os.environ.get('VNFROBOT_REDEPLOY') or 'False')
     respect_breakpoints = str2bool(os.environ.get('VNFROBOT_RESPECT_BREAKPOINTS')) or False
+    trace = str2bool(os.environ.get('VNFROBOT_TRACE') or 'False')
+    chrome_trace = str2bool(os.environ.get('VNFROBOT_CHROME_TRACE') or 'False')
+    output_dir = os.environ.get('VNFROBOT_OUTPUT_DIR') or ''
+    # Regular expression, keywords whose validation statement matches are run with cProfile
+    profile = os.environ.get('VNFROBOT_PROFILE') or ''
+    profile_top = int(os.environ.get('VNFROBOT_PROFILE_TOP') or 25)
+
+    # History of keyword durations in a SQLite database. Disabled if no database is set.
+    history_db = os.environ.get('VNFROBOT_HISTORY_DB') or ''
+    history_window = int(os.environ.get('VNFROBOT_HISTORY_WINDOW') or 20)
+    history_min_runs = int(os.environ.get('VNFROBOT_HISTORY_MIN_RUNS') or 5)
+    history_ratio = float(os.environ.get('VNFROBOT_HISTORY_RATIO') or 1.5)
+    history_fail = str2bool(os.environ.get('VNFROBOT_HISTORY_FAIL') or 'False')
+
+    # Time budgets in seconds per keyword type, e.g. "Port=3,File=5", and for the whole suite. 0 disables the budget.
+    # Can be overridden with the Robot variables ${KEYWORD_BUDGETS} and ${SUITE_BUDGET}.
+    keyword_budgets = os.environ.get('VNFROBOT_KEYWORD_BUDGETS') or ''
+    suite_budget = float(os.environ.get('VNFROBOT_SUITE_BUDGET') or 0)
+
+    # Prometheus metrics, e.g. for the textfile collector of the node exporter. Disabled if no directory is set.
+    metrics_dir = os.environ.get('VNFROBOT_METRICS_DIR') or ''
+    metrics_buckets = [float(b) for b in (os.environ.get('VNFROBOT_METRICS_BUCKETS') or
+                                          '0.1,0.25,0.5,1,2.5,5,10,20,40,80').split(',')]
+    metrics_api_buckets = [float(b) for b in (os.environ.get('VNFROBOT_METRICS_API_BUCKETS') or
+                                              '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5').split(',')]
 
     # Docker orchestrator
     docker = {
         'DOCKER_HOST': (os.environ.get('DOCKER_HOST') or 'unix://var/run/docker.sock'),
         # 'DOCKER_CERT_PATH': (os.environ.get('DOCKER_CERT_PATH') or ''),
-        'DOCKER_TIMEOUT': (os.environ.get('DOCKER_TIMEOUT') or '2.0')
+        'DOCKER_TIMEOUT': (os.environ.get('DOCKER_TIMEOUT') or '60')
     }
 
-    goss_helper_volume = 'goss-helper'
\ No newline at end of file
+    # Several Docker hosts, comma separated, instead of DOCKER_HOST: every suite is placed on the host with the lowest
+    # load and stays there until it ends, see tools/placement.py
+    docker_hosts = [h.strip() for h in (os.environ.get('VNFROBOT_DOCKER_HOSTS') or '').split(',') if h.strip()]
+
+    # Deployment mode: swarm deploys the descriptor with `docker stack deploy`, local deploys it as plain containers on
+    # bridge networks of a single Docker host, auto uses local if the Docker host is not part of a swarm
+    docker_mode = (os.environ.get('VNFROBOT_DOCKER_MODE') or 'swarm').lower()
+
+    # Circuit breakers: after this many consecutive connection errors to the Docker daemon or failed health checks
+    # of the deployment, statements fail at once. The daemon or deployment is probed again after the reset timeout.
+    # A threshold of 0 disables the circuit breaker.
+    circuit_breaker_threshold = int(os.environ.get('VNFROBOT_CIRCUIT_BREAKER_THRESHOLD') or 3)
+    health_breaker_threshold = int(os.environ.get('VNFROBOT_HEALTH_BREAKER_THRESHOLD') or 2)
+    circuit_breaker_reset = float(os.environ.get('VNFROBOT_CIRCUIT_BREAKER_RESET') or 10)
+
+    # Retries of transient Docker API errors per operation class with exponential backoff and jitter. The number of
+    # retries within a suite is limited by the retry budget.
+    retry_attempts = dict((k.strip(), int(v)) for k, v in (
+        item.split('=') for item in (os.environ.get('VNFROBOT_RETRY_ATTEMPTS') or 'read=4,exec=2,mutate=3').split(',')))
+    retry_base_delay = float(os.environ.get('VNFROBOT_RETRY_BASE_DELAY') or 0.2)
+    retry_max_delay = float(os.environ.get('VNFROBOT_RETRY_MAX_DELAY') or 5)
+    retry_budget = int(os.environ.get('VNFROBOT_RETRY_BUDGET') or 50)
+
+    # Deadlines in seconds for a keyword, the suite setup and the cleanup after a keyword. Every Docker API call,
+    # subprocess and wait loop is bounded by the time left. 0 disables the deadline.
+    keyword_timeout = float(os.environ.get('VNFROBOT_KEYWORD_TIMEOUT') or 300)
+    setup_timeout = float(os.environ.get('VNFROBOT_SETUP_TIMEOUT') or 900)
+    cleanup_timeout = float(os.environ.get('VNFROBOT_CLEANUP_TIMEOUT') or 30)
+
+    # Deploy in the background at suite start, keywords wait for the deployment only when they need it
+    background_setup = str2bool(os.environ.get('VNFROBOT_BACKGROUND_SETUP') or 'True')
+
+    # Remove the deployment in a detached process at the end of the suite instead of waiting for it
+    detached_teardown = str2bool(os.environ.get('VNFROBOT_DETACHED_TEARDOWN') or 'True')
+
+    # Remove stacks, sidecars and helper containers of crashed runs in a detached process at suite start. Resources
+    # are orphans if their owner process on this host is gone. Resources of other hosts, whose owner cannot be checked,
+    # are orphans once they are older than the TTL in seconds, 0 never removes them.
+    reap_orphans = str2bool(os.environ.get('VNFROBOT_REAP_ORPHANS') or 'False')
+    reaper_ttl = float(os.environ.get('VNFROBOT_REAPER_TTL') or 21600)
+
+    # Number of images of the descriptor that are pulled concurrently before the deployment
+    pull_workers = int(os.environ.get('VNFROBOT_PULL_WORKERS') or 4)
+
+    # Number of failed tasks after which a service is considered to be in a crash loop during deployment.
+    # 0 disables the detection.
+    crash_loop_threshold = int(os.environ.get('VNFROBOT_CRASH_LOOP_THRESHOLD') or 3)
+
+    # Default timeout and delay in seconds of all wait loops. If a history database is set, the health check learns
+    # the timeout and poll interval of every service from its previous startups: factor times the p99 of the
+    # startup times, bounded by the floor and the ceiling.
+    wait_timeout = float(os.environ.get('VNFROBOT_WAIT_TIMEOUT') or 40)
+    wait_delay = float(os.environ.get('VNFROBOT_WAIT_DELAY') or 0.1)
+    wait_timeout_factor = float(os.environ.get('VNFROBOT_WAIT_TIMEOUT_FACTOR') or 1.5)
+    wait_timeout_floor = float(os.environ.get('VNFROBOT_WAIT_TIMEOUT_FLOOR') or 10)
+    wait_timeout_ceiling = float(os.environ.get('VNFROBOT_WAIT_TIMEOUT_CEILING') or 600)
+
+    # Number of services whose readiness is probed in parallel during the health check
+    readiness_workers = int(os.environ.get('VNFROBOT_READINESS_WORKERS') or 4)
+
+    goss_helper_volume = 'goss-helper'
+
+    # Parallel suites on one Docker host: shared resources, e.g. the test tool volume, are prepared under file locks
+    # in the lock directory and at most deploy_slots stacks are deployed at once, 0 for no limit. With remap_ports,
+    # Docker assigns the published ports of the descriptor, so deployments of the same descriptor do not collide.
+    lock_dir = os.environ.get('VNFROBOT_LOCK_DIR') or tempfile.gettempdir()
+    deploy_slots = int(os.environ.get('VNFROBOT_DEPLOY_SLOTS') or 0)
+    remap_ports = str2bool(os.environ.get('VNFROBOT_REMAP_PORTS') or 'False')
+
+    # Keep one `goss serve` sidecar per network context instead of a new sidecar for every statement
+    goss_serve = str2bool(os.environ.get('VNFROBOT_GOSS_SERVE') or 'False')
+    goss_serve_port = int(os.environ.get('VNFROBOT_GOSS_SERVE_PORT') or 8080)
+
+    # Number of idle, running sidecars that are kept per network and volume combination. 0 disables the pool.
+    sidecar_pool_size = int(os.environ.get('VNFROBOT_SIDECAR_POOL_SIZE') or 0)
+
+    # Image for sidecars and helper containers. If it is missing on the Docker host, it is loaded from the image bundle
+    # before it is pulled. Build the bundle with `make tools-sidecar`.
+    sidecar_image = os.environ.get('VNFROBOT_SIDECAR_IMAGE') or 'busybox'
+    sidecar_image_bundle = os.environ.get('VNFROBOT_SIDECAR_IMAGE_BUNDLE') or \
+        os.path.join(os.path.dirname(os.path.realpath(__file__)), 'tools', 'sidecar', 'sidecar.tar')
\ No newline at end of file
@@ -64,7 +64,8 @@ class DockerTool(TestTool):
             target = self.controller.get_containers_for_service(self.sut.service_id)[0]
         else:
             target = self.sut.target
-        self.test_results = self.controller.execute(target, self.target.entity)
+        self.test_results = self.controller.execute(target, self.target.entity,
+                                                    timeout=getattr(self.target, 'timeout', None))
 
     def placement(self):
         """
@@ -96,14 +97,20 @@ class DockerTool(TestTool):
 
         if not get_truth(actual, all_matchers[target.matcher], target.value):
             raise ValidationError(
-                'Expected: {} {} {} "{}", \nActual: {}'.format(
+                'Expected: {} {} {} "{}", \nActual: {}{}'.format(
                     '"{}":'.format(target.entity) if target.entity else '',
                     target.property if target.property else target.entity,
                     target.matcher,
                     target.value if target.value else '',
-                    actual)
+                    actual,
+                    self._timeout_note())
             )
 
+    def _timeout_note(self):
+        if isinstance(self.test_results, dict) and self.test_results.get('timeout'):
+            return ' (command timed out after {} s)'.format(getattr(self.target, 'timeout', None))
+        return ''
+
     def _process_env_vars(self, entity):
         return [e.split('=')[1] for e in self.test_results if entity == e.split('=')[0]]
 
@@ -16,6 +16,45 @@ class GossTool(TestTool):
 
         self.gossfile = gossfile
         self.command = '/goss/goss-linux-amd64 --gossfile {} validate --format json'.format(self.gossfile)
+        self.reload_command = None
+
+    @staticmethod
+    def serve_command(gossfile='/goss.yaml', port=8080):
+        """
+        Command for a long-running sidecar that keeps a goss server listening on localhost.
+        goss reads the gossfile only once on startup, so the loop restarts the server after it was killed by the
+        reload command.
+
+        Args:
+            gossfile: str - path to the gossfile within the sidecar
+            port: int - port the goss server listens on
+
+        Returns:
+            list
+
+        """
+        return ['sh', '-c', 'while true; do /goss/goss-linux-amd64 --gossfile {} serve --format json '
+                            '--listen-addr 127.0.0.1:{} > /dev/null 2>&1; sleep 0.1; done'.format(gossfile, port)]
+
+    def use_server(self, port=8080):
+        """
+        Query a goss server started with serve_command() instead of running `goss validate`.
+        Before querying the health endpoint, the server is restarted so that it picks up the injected gossfile.
+
+        Args:
+            port: int - port the goss server listens on
+
+        Returns:
+            None
+
+        """
+        self.reload_command = ['sh', '-c', 'p=$(pidof goss-linux-amd64); [ -z "$p" ] || kill $p; '
+                                           'while [ -n "$p" ] && [ "$(pidof goss-linux-amd64)" = "$p" ]; '
+                                           'do sleep 0.05; done']
+        self.command = ['sh', '-c', 'for i in $(seq 1 100); do '
+                                    'r=$(printf "GET /healthz HTTP/1.0\\r\\n\\r\\n" | nc 127.0.0.1 {} 2>/dev/null); '
+                                    '[ -n "$r" ] && break; sleep 0.05; done; '
+                                    'printf "%s" "$r" | tr -d "\\r" | sed "1,/^$/d"'.format(port)]
 
     def run(self, target):
         res = ''
@@ -25,6 +64,8 @@ class GossTool(TestTool):
             if not self.controller:
                 raise AttributeError('Controller is necessary to run goss.')
 
+            if self.reload_command:
+                self.controller.execute(self.sut.target, self.reload_command)
             res = self.controller.execute(self.sut.target, self.command)
             if isinstance(res, basestring):
                 self.test_results = json.loads(res).strip()
@@ -0,0 +1,158 @@
+import threading
+
+from exc import SetupError
+
+# Controller methods that are attributed to a category as a whole, including the Docker API calls they issue. Spans
+# are named <class>.<method>, the methods apply to DockerController and LocalDockerController alike.
+controller_categories = {
+    'execute': 'exec',
+    '_run_in_container': 'exec',
+    'run_sidecar': 'exec',
+    'put_file': 'transfer',
+    'get_file': 'transfer',
+    'add_data_to_volume': 'transfer',
+    'deploy_stack': 'deploy',
+    'pull_images': 'deploy',
+    'undeploy_stack': 'deploy',
+    'get_or_create_sidecar': 'deploy',
+    'get_or_create_long_running_sidecar': 'deploy',
+    'connect_volume_to_service': 'deploy',
+    'connect_network_to_service': 'deploy',
+    'update_service': 'deploy',
+}
+
+# Setup spans that are attributed to a category
+setup_categories = {
+    'deploy': 'deploy',
+    'image pull': 'deploy',
+    'health check': 'wait',
+    'volume prep': 'transfer',
+}
+
+categories = ('wait', 'exec', 'transfer', 'deploy', 'api')
+
+
+def parse_budgets(value):
+    """
+    Parses keyword budgets, e.g. "Port=3, File=5".
+
+    Args:
+        value: str or dict
+
+    Returns:
+        dict - keyword type: seconds
+
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return dict((k, float(v)) for k, v in value.items())
+
+    budgets = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        try:
+            keyword_type, seconds = item.split('=')
+            budgets[keyword_type.strip()] = float(seconds)
+        except ValueError:
+            raise SetupError('Invalid keyword budget "{}", expected <keyword type>=<seconds>'.format(item.strip()))
+    return budgets
+
+
+def classify(record):
+    """
+    Category of a span for the time breakdown.
+
+    Args:
+        record: dict - span record
+
+    Returns:
+        str or None if the span is not attributed to a category
+
+    """
+    category = record['cat']
+    if category == 'wait':
+        return 'wait'
+    if category == 'setup':
+        return setup_categories.get(record['name'])
+    if category == 'sidecar':
+        return 'deploy'
+    if category == 'controller':
+        return controller_categories.get(record['name'].rsplit('.', 1)[-1])
+    if category == 'api':
+        if 'exec' in record['name']:
+            return 'exec'
+        if 'archive' in record['name']:
+            return 'transfer'
+        return 'api'
+    return None
+
+
+def format_breakdown(breakdown, total):
+    """
+    Breakdown as text. The time that is not attributed to a category is reported as other.
+
+    Args:
+        breakdown: dict - category: seconds
+        total: float - seconds
+
+    Returns:
+        str
+
+    """
+    breakdown = breakdown or {}
+    parts = ['{} {:.2f} s'.format(c, breakdown.get(c, 0.0)) for c in categories]
+    parts.append('other {:.2f} s'.format(max(total - sum(breakdown.values()), 0.0)))
+    return ', '.join(parts)
+
+
+class TimeBreakdown(object):
+    """
+    Tracing listener that attributes the time of keywords and of the suite to waiting, command execution, file
+    transfer, deployment and other Docker API calls. A span is attributed to the category of its outermost
+    classified span, e.g. the API calls of a wait loop count as waiting.
+    """
+
+    def __init__(self):
+        self.suite = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def on_span(self, record):
+        category = classify(record)
+        if not category:
+            return
+        with self._lock:
+            pending = self._pending.setdefault(record['tid'], [])
+            # deeper spans that started within this span are its children and are attributed to it
+            pending[:] = [p for p in pending if p[0] <= record['depth'] or p[3] < record['start']]
+            pending.append((record['depth'], category, record['duration'], record['start']))
+
+    def on_count(self, name, n, record):
+        pass
+
+    def collect(self, depth=-1, tid=None):
+        """
+        Sums up the spans below the given depth, e.g. below a keyword span, and adds them to the suite breakdown.
+
+        Args:
+            depth: int - depth of the enclosing span, -1 for all spans
+            tid: thread id, defaults to the current thread, all threads if depth is -1
+
+        Returns:
+            dict - category: seconds
+
+        """
+        tid = tid or threading.current_thread().ident
+        breakdown = {}
+        with self._lock:
+            for thread, pending in self._pending.items():
+                if depth >= 0 and thread != tid:
+                    continue
+                for entry in [p for p in pending if p[0] > depth]:
+                    breakdown[entry[1]] = breakdown.get(entry[1], 0.0) + entry[2]
+                    pending.remove(entry)
+            for category, seconds in breakdown.items():
+                self.suite[category] = self.suite.get(category, 0.0) + seconds
+        return breakdown
@@ -0,0 +1,188 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.exceptions import ConnectionError, Timeout
+
+from exc import CircuitOpenError
+
+
+class CircuitBreaker(object):
+    """
+    Fails calls at once after repeated failures of a dependency, e.g. the Docker daemon or the health check of the
+    deployment, instead of letting every call run into its own timeout.
+
+    The breaker opens after `threshold` consecutive failures. While it is open, calls fail with CircuitOpenError that
+    contains the original cause. After `reset_timeout` seconds, the breaker is half-open and lets a single probe call
+    through: if it succeeds, the breaker closes, otherwise it opens again and the time until the next probe doubles
+    up to `max_reset_timeout`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, threshold=3, reset_timeout=10, max_reset_timeout=120):
+        """
+
+        Args:
+            name: str - name of the dependency, used in error messages
+            threshold: int - consecutive failures after which the breaker opens, 0 disables the breaker
+            reset_timeout: float - seconds until the first probe
+            max_reset_timeout: float - upper bound for the time between probes
+        """
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cause = None
+        self.opened_at = None
+        self._timeout = reset_timeout
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        """
+        Must be called before a call to the dependency.
+
+        Returns:
+            None
+
+        Raises:
+            CircuitOpenError: if the breaker is open or a probe is already running
+
+        """
+        if not self.threshold:
+            return
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            waited = time.time() - self.opened_at
+            if waited >= self._timeout and not self._probing:
+                self.state = self.HALF_OPEN
+                self._probing = True
+                return
+            raise CircuitOpenError('{} is unavailable, failing fast (circuit open for {:.0f} s, next probe in '
+                                   '{:.0f} s). Cause: {}'.format(self.name, waited, max(self._timeout - waited, 0),
+                                                                 self.cause))
+
+    def success(self):
+        """
+        Records a successful call. Closes the breaker if it was half-open.
+
+        Returns:
+            None
+
+        """
+        if not self.threshold:
+            return
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cause = None
+            self._timeout = self.reset_timeout
+            self._probing = False
+
+    def failure(self, cause):
+        """
+        Records a failed call. Opens the breaker after too many consecutive failures or if a probe failed.
+
+        Args:
+            cause: exception or str - original cause of the failure
+
+        Returns:
+            None
+
+        """
+        if not self.threshold:
+            return
+        with self._lock:
+            self.failures += 1
+            self.cause = '{}: {}'.format(type(cause).__name__, cause) if isinstance(cause, Exception) else cause
+            if self.state == self.HALF_OPEN:
+                self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+            self._probing = False
+
+    def neutral(self):
+        """
+        Records a call that tells nothing about the dependency, e.g. one that ran into the timeout of the caller. A
+        half-open breaker lets the next call through as probe.
+
+        Returns:
+            None
+
+        """
+        if not self.threshold:
+            return
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def guard(self, failures=(Exception,), neutral=()):
+        """
+        Runs the enclosed block as call to the dependency.
+
+        Args:
+            failures: tuple of exception types that count as failure of the dependency, all other exceptions are
+                treated as success of the dependency
+            neutral: tuple of exception types that count neither as failure nor as success
+
+        Returns:
+            None
+
+        """
+        self.before()
+        try:
+            yield
+        except failures as exc:
+            self.failure(exc)
+            raise
+        except neutral:
+            self.neutral()
+            raise
+        except Exception:
+            self.success()
+            raise
+        else:
+            self.success()
+
+
+def guard_requests(api, breaker, verbs=('_get', '_post', '_put', '_delete')):
+    """
+    Wraps the HTTP methods of a docker-py APIClient with a circuit breaker. Connection errors, including connect
+    timeouts, count as failures of the daemon, every response, including error responses, counts as success. Read
+    timeouts are not counted: they are mostly the timeout or deadline of the caller, e.g. of a long exec or of a
+    sidecar the caller waits for, and say nothing about the daemon.
+
+
+    Args:
+        api: docker.APIClient
+        breaker: CircuitBreaker
+        verbs: names of the HTTP methods of the APIClient
+
+    Returns:
+        api
+
+    """
+    for verb in verbs:
+        request = getattr(api, verb, None)
+        if request is None or getattr(request, 'guarded', False):
+            continue
+        setattr(api, verb, _guarded_request(request, breaker))
+    return api
+
+
+def _guarded_request(request, breaker):
+    def wrapper(url, *args, **kwargs):
+        # ConnectTimeout is a ConnectionError
+        with breaker.guard(failures=(ConnectionError,), neutral=(Timeout,)):
+            return request(url, *args, **kwargs)
+
+    wrapper.guarded = True
+    return wrapper
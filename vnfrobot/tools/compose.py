@@ -0,0 +1,561 @@
+"""
+Translates a compose descriptor into the networks, volumes and containers of a deployment without Swarm. Names and
+labels follow docker-compose: containers are named <project>_<service>_<number>, networks and volumes
+<project>_<name>, so `docker-compose -p <deployment>` can inspect the deployment.
+"""
+import hashlib
+import json
+import os
+import re
+
+from ruamel import yaml
+
+from exc import DeploymentError
+
+project_label = 'com.docker.compose.project'
+service_label = 'com.docker.compose.service'
+number_label = 'com.docker.compose.container-number'
+oneoff_label = 'com.docker.compose.oneoff'
+network_label = 'com.docker.compose.network'
+volume_label = 'com.docker.compose.volume'
+# hash of the definition of a service, see spec_hashes()
+spec_hash_label = 'vnfrobot.spec-hash'
+
+# $$, ${VAR}, ${VAR:-default}, ${VAR-default}, ${VAR:?error}, ${VAR?error} and $VAR
+variable = re.compile(r'\$(?:(\$)|\{(\w+)(?:(:?[-?])([^}]*))?\}|(\w+))')
+
+# restart_policy.condition of the deploy section: restart policy of the container
+restart_conditions = {'none': 'no', 'on-failure': 'on-failure', 'any': 'always'}
+
+duration_units = {'us': 0.000001, 'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def interpolate(value, env=None):
+    """
+    Substitutes environment variables in the strings of a descriptor, like `docker stack deploy`.
+
+    Args:
+        value: str, list or dict
+        env: dict - variables, defaults to the environment
+
+    Returns:
+        value with substituted variables
+
+    """
+    env = os.environ if env is None else env
+    if isinstance(value, dict):
+        return dict((k, interpolate(v, env)) for k, v in value.items())
+    if isinstance(value, list):
+        return [interpolate(v, env) for v in value]
+    if not isinstance(value, basestring):
+        return value
+
+    def substitute(match):
+        escaped, name, operator, argument, plain = match.groups()
+        if escaped:
+            return '$'
+        if plain:
+            return env.get(plain, '')
+        found = env.get(name)
+        missing = found is None or (operator and operator.startswith(':') and not found)
+        if missing and operator and operator.endswith('?'):
+            raise DeploymentError('Variable {} is required: {}'.format(name, argument or 'not set'))
+        if missing and operator:
+            return argument
+        return found or ''
+
+    return variable.sub(substitute, value)
+
+
+def duration(value):
+    """
+    Converts a compose duration, e.g. 1m30s, to seconds.
+
+    Args:
+        value: str or number
+
+    Returns:
+        float or None
+
+    """
+    if value is None or isinstance(value, (int, long, float)):
+        return value
+    parts = re.findall(r'(\d+(?:\.\d+)?)(us|ms|s|m|h)', value)
+    if not parts or ''.join(n + u for n, u in parts) != value.strip():
+        raise DeploymentError('Invalid duration {}'.format(value))
+    return sum(float(n) * duration_units[u] for n, u in parts)
+
+
+def _nanoseconds(value):
+    seconds = duration(value)
+    return int(seconds * 10 ** 9) if seconds is not None else None
+
+
+def _as_dict(value, separator='='):
+    # compose accepts lists of KEY=VALUE and mappings for environment, labels and extra_hosts
+    if isinstance(value, dict):
+        return dict((k, '' if v is None else '{}'.format(v)) for k, v in value.items())
+    res = {}
+    for item in value or []:
+        key, _, val = '{}'.format(item).partition(separator)
+        res[key] = val
+    return res
+
+
+def _read_env_file(path):
+    env = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    key, _, val = line.partition('=')
+                    env[key.strip()] = val
+    except (IOError, OSError) as exc:
+        raise DeploymentError('Cannot read env_file {}: {}'.format(path, exc))
+    return env
+
+
+def _resolve(base_dir, source):
+    # relative paths of bind mounts and files are relative to the descriptor
+    return os.path.realpath(os.path.join(base_dir, os.path.expanduser(source)))
+
+
+def _is_path(source):
+    return source.startswith(('/', '.', '~'))
+
+
+def _port(port):
+    """
+    Published and container port of a port definition.
+
+    Returns:
+        tuple - container port (int or '<port>/udp'), host binding (None, port or (ip, port))
+
+    """
+    if isinstance(port, dict):
+        target = port.get('target')
+        published = port.get('published')
+        protocol = port.get('protocol', 'tcp')
+        return target if protocol == 'tcp' else '{}/{}'.format(target, protocol), published
+
+    port = '{}'.format(port)
+    protocol = 'tcp'
+    if '/' in port:
+        port, protocol = port.split('/', 1)
+    parts = port.split(':')
+    if '-' in parts[-1]:
+        raise DeploymentError('Port ranges are not supported without Swarm: {}'.format(port))
+    target = int(parts[-1])
+    if len(parts) == 1:
+        published = None
+    elif len(parts) == 2:
+        published = int(parts[0])
+    else:
+        published = (parts[0], int(parts[1])) if parts[1] else (parts[0],)
+    return target if protocol == 'tcp' else '{}/{}'.format(target, protocol), published
+
+
+def unpublish_ports(ports):
+    """
+    Removes the published ports from port definitions, so Docker assigns free ports to the deployment. Host IPs and
+    protocols are kept.
+
+    Args:
+        ports: list of port definitions in short or long syntax
+
+    Returns:
+        list
+
+    """
+    res = []
+    for port in ports or []:
+        if isinstance(port, dict):
+            res.append(dict((k, v) for k, v in port.items() if k != 'published'))
+            continue
+        port = '{}'.format(port)
+        protocol = ''
+        if '/' in port:
+            port, protocol = port.split('/', 1)
+            protocol = '/' + protocol
+        parts = port.split(':')
+        res.append('{}::{}{}'.format(parts[0], parts[-1], protocol) if len(parts) == 3 else parts[-1] + protocol)
+    return res
+
+
+def _mounts(service, volumes, secrets, configs, base_dir):
+    binds = []
+    anonymous = []
+    for volume in service.get('volumes') or []:
+        if isinstance(volume, dict):
+            source, target = volume.get('source'), volume.get('target')
+            mode = 'ro' if volume.get('read_only') else 'rw'
+            if volume.get('type') == 'tmpfs':
+                continue
+        else:
+            parts = volume.split(':')
+            if len(parts) == 1:
+                source, target, mode = None, parts[0], 'rw'
+            else:
+                source, target, mode = parts[0], parts[1], parts[2] if len(parts) > 2 else 'rw'
+        if not source:
+            anonymous.append(target)
+            continue
+        if not _is_path(source):
+            if source not in volumes:
+                raise DeploymentError('Volume {} is not defined'.format(source))
+            source = volumes[source]['name']
+        else:
+            source = _resolve(base_dir, source)
+        binds.append('{}:{}:{}'.format(source, target, mode))
+
+    # swarm secrets and configs are bind mounts of their files
+    for kind, defined, default_target in (('secrets', secrets, '/run/secrets/{}'), ('configs', configs, '/{}')):
+        for item in service.get(kind) or []:
+            source = item.get('source') if isinstance(item, dict) else item
+            target = item.get('target') if isinstance(item, dict) else None
+            definition = defined.get(source) or {}
+            if not definition.get('file'):
+                raise DeploymentError('Only {} with a file are supported without Swarm: {}'.format(kind, source))
+            if target and not target.startswith('/'):
+                target = default_target.format(target)
+            binds.append('{}:{}:ro'.format(_resolve(base_dir, definition['file']),
+                                           target or default_target.format(source)))
+    return binds, anonymous
+
+
+def _healthcheck(healthcheck):
+    if not healthcheck:
+        return None
+    if healthcheck.get('disable'):
+        return {'test': ['NONE']}
+    res = {
+        'test': healthcheck.get('test'),
+        'interval': _nanoseconds(healthcheck.get('interval')),
+        'timeout': _nanoseconds(healthcheck.get('timeout')),
+        'retries': healthcheck.get('retries'),
+        'start_period': _nanoseconds(healthcheck.get('start_period')),
+    }
+    return dict((k, v) for k, v in res.items() if v is not None)
+
+
+def _restart_policy(service):
+    deploy = service.get('deploy') or {}
+    policy = deploy.get('restart_policy') or {}
+    if policy:
+        name = restart_conditions.get(policy.get('condition', 'any'), 'always')
+        res = {'Name': name}
+        if name == 'on-failure' and policy.get('max_attempts'):
+            res['MaximumRetryCount'] = int(policy['max_attempts'])
+        return res
+    if service.get('restart'):
+        name, _, count = '{}'.format(service['restart']).partition(':')
+        res = {'Name': '' if name == 'no' else name}
+        if count:
+            res['MaximumRetryCount'] = int(count)
+        return res
+    # swarm restarts tasks on any exit by default
+    return {'Name': 'always'}
+
+
+def start_order(services):
+    """
+    Orders services so that every service comes after the services it depends on.
+
+    Args:
+        services: dict - service name: definition
+
+    Returns:
+        list of service names
+
+    """
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise DeploymentError('Circular depends_on at service {}'.format(name))
+        visiting.add(name)
+        for dependency in sorted(services.get(name, {}).get('depends_on') or []):
+            if dependency in services:
+                visit(dependency)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in sorted(services):
+        visit(name)
+    return order
+
+
+def load(descriptor, env=None):
+    """
+    Reads a compose file and substitutes its variables.
+
+    Args:
+        descriptor: str - path of the compose file
+        env: dict - variables, defaults to the environment
+
+    Returns:
+        dict
+
+    """
+    try:
+        with open(descriptor, 'r') as f:
+            content = yaml.safe_load(f)
+    except (IOError, OSError, yaml.YAMLError) as exc:
+        raise DeploymentError('Cannot read descriptor {}: {}'.format(descriptor, exc))
+    if not isinstance(content, dict):
+        raise DeploymentError('Descriptor {} is not a compose file'.format(descriptor))
+    return interpolate(content, env)
+
+
+def _references(service, kind):
+    # names of the networks, volumes, secrets or configs of the descriptor that a service uses
+    items = service.get(kind) or []
+    if isinstance(items, dict):
+        return sorted(items)
+    names = []
+    for item in items:
+        if isinstance(item, dict):
+            names.append(item.get('source'))
+        elif kind == 'volumes':
+            names.append(item.split(':')[0] if ':' in item else None)
+        else:
+            names.append(item)
+    return sorted(n for n in names if n)
+
+
+def spec_hashes(descriptor, project, images=None, env=None, remap_ports=False):
+    """
+    Hashes the definition of every service together with the definitions of the networks, volumes, secrets and
+    configs it uses, the contents of its env files and the reference its image resolves to. A deployed service needs
+    an update if its hash changed.
+
+    Args:
+        descriptor: str - path of the compose file
+        project: str - name of the deployment
+        images: dict - image of the descriptor: resolved reference, e.g. with digest
+        env: dict - variables, defaults to the environment
+        remap_ports: bool - the deployment publishes its ports on ports Docker assigns, see unpublish_ports()
+
+    Returns:
+        dict - <project>_<service>: hash
+
+    """
+    content = load(descriptor, env)
+    base_dir = os.path.dirname(os.path.abspath(descriptor))
+    images = images or {}
+    hashes = {}
+    for name, service in (content.get('services') or {}).items():
+        service = service or {}
+        if remap_ports and service.get('ports'):
+            service = dict(service, ports=unpublish_ports(service['ports']))
+        uses = {}
+        for kind in ('networks', 'volumes', 'secrets', 'configs'):
+            defined = content.get(kind) or {}
+            uses[kind] = dict((n, defined[n]) for n in _references(service, kind) if n in defined)
+        env_files = service.get('env_file') or []
+        uses['env_file'] = [_read_env_file(_resolve(base_dir, f))
+                            for f in ([env_files] if isinstance(env_files, basestring) else env_files)]
+        uses['image'] = images.get(service.get('image'), service.get('image'))
+        data = json.dumps({'service': service, 'uses': uses}, sort_keys=True)
+        hashes['{}_{}'.format(project, name)] = hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+    return hashes
+
+
+def render(descriptor, project, hashes=None, images=None, env=None, remap_ports=False):
+    """
+    Derives a compose file for `docker stack deploy` that labels every service with its hash and pins images to
+    the resolved digests, so the deployed services can be compared with the descriptor later.
+
+    Args:
+        descriptor: str - path of the compose file
+        project: str - name of the deployment
+        hashes: dict - see spec_hashes(), None to not label the services
+        images: dict - image of the descriptor: resolved reference, only references with a digest are pinned
+        env: dict - variables, defaults to the environment
+        remap_ports: bool - let Docker assign the published ports, see unpublish_ports()
+
+    Returns:
+        str - YAML
+
+    """
+    resolved = load(descriptor, env).get('services') or {}
+    try:
+        with open(descriptor, 'r') as f:
+            content = yaml.safe_load(f)
+    except (IOError, OSError, yaml.YAMLError) as exc:
+        raise DeploymentError('Cannot read descriptor {}: {}'.format(descriptor, exc))
+
+    images = images or {}
+    for name, service in (content.get('services') or {}).items():
+        service = service if service is not None else {}
+        content['services'][name] = service
+        if remap_ports and service.get('ports'):
+            service['ports'] = unpublish_ports(service['ports'])
+        if hashes:
+            deploy = service.setdefault('deploy', {})
+            labels = deploy.get('labels') or {}
+            if isinstance(labels, list):
+                labels = _as_dict(labels)
+            labels[spec_hash_label] = hashes['{}_{}'.format(project, name)]
+            deploy['labels'] = labels
+        pinned = images.get((resolved.get(name) or {}).get('image'))
+        if pinned and '@' in pinned:
+            service['image'] = pinned
+    return yaml.safe_dump(content, default_flow_style=False)
+
+
+def parse(descriptor, project, env=None, hashes=None, remap_ports=False):
+    """
+    Translates a compose file into the resources of a deployment. Supported are the keys of a service that describe
+    a single container: image, command, entrypoint, environment, env_file, labels, ports, expose, volumes, networks,
+    healthcheck, restart, working_dir, user, hostname, cap_add, cap_drop, privileged, extra_hosts, dns, tty,
+    stdin_open, stop_signal and stop_grace_period, and of the deploy section replicas and restart_policy. Secrets and
+    configs must be files, they are mounted read-only. Other keys, e.g. placement and resources, are ignored.
+
+    Args:
+        descriptor: str - path of the compose file
+        project: str - name of the deployment
+        env: dict - variables, defaults to the environment
+        hashes: dict - see spec_hashes(), containers are labelled with the hash of their service
+        remap_ports: bool - let Docker assign the published ports, see unpublish_ports()
+
+    Returns:
+        dict: {
+            'networks': {name: {'name', 'external', 'driver', 'internal', 'options', 'labels'}},
+            'volumes': {name: {'name', 'external', 'driver', 'options', 'labels'}},
+            'containers': [{'name', 'service', 'image', 'create': kwargs of create_container,
+                            'host_config': kwargs of create_host_config, 'networks': [(network name, aliases)]}]
+        } - networks and volumes are keyed by their name in the descriptor, containers are in start order
+
+    """
+    content = load(descriptor, env)
+    base_dir = os.path.dirname(os.path.abspath(descriptor))
+    services = content.get('services') or {}
+    if not services:
+        raise DeploymentError('Descriptor {} has no services'.format(descriptor))
+
+    networks = {}
+    for name, definition in (content.get('networks') or {}).items():
+        definition = definition or {}
+        external = definition.get('external')
+        networks[name] = {
+            'name': definition.get('name') or (external.get('name') if isinstance(external, dict) else None) or
+            (name if external else '{}_{}'.format(project, name)),
+            'external': bool(external),
+            # overlay networks of the descriptor become bridge networks on a single node
+            'driver': 'bridge' if definition.get('driver', 'overlay') == 'overlay' else definition['driver'],
+            'internal': bool(definition.get('internal')),
+            'options': definition.get('driver_opts') or {},
+            'labels': dict(_as_dict(definition.get('labels')), **{project_label: project, network_label: name})
+        }
+    if any(not (s or {}).get('networks') and (s or {}).get('network_mode') is None for s in services.values()):
+        networks.setdefault('default', {
+            'name': '{}_default'.format(project), 'external': False, 'driver': 'bridge', 'internal': False,
+            'options': {}, 'labels': {project_label: project, network_label: 'default'}})
+
+    volumes = {}
+    for name, definition in (content.get('volumes') or {}).items():
+        definition = definition or {}
+        external = definition.get('external')
+        volumes[name] = {
+            'name': definition.get('name') or (external.get('name') if isinstance(external, dict) else None) or
+            (name if external else '{}_{}'.format(project, name)),
+            'external': bool(external),
+            'driver': definition.get('driver') or 'local',
+            'options': definition.get('driver_opts') or {},
+            'labels': dict(_as_dict(definition.get('labels')), **{project_label: project, volume_label: name})
+        }
+
+    containers = []
+    for service_name in start_order(dict((k, v or {}) for k, v in services.items())):
+        service = services[service_name] or {}
+        if not service.get('image'):
+            raise DeploymentError('Service {} has no image, building images is not supported'.format(service_name))
+
+        environment = {}
+        env_files = service.get('env_file') or []
+        for env_file in [env_files] if isinstance(env_files, basestring) else env_files:
+            environment.update(_read_env_file(_resolve(base_dir, env_file)))
+        environment.update(_as_dict(service.get('environment')))
+
+        ports = []
+        bindings = {}
+        for port in unpublish_ports(service.get('ports')) if remap_ports else service.get('ports') or []:
+            target, published = _port(port)
+            ports.append(target)
+            bindings[target] = published
+        for port in service.get('expose') or []:
+            ports.append(_port(port)[0])
+
+        service_networks = service.get('networks') or (['default'] if service.get('network_mode') is None else [])
+        if isinstance(service_networks, list):
+            service_networks = dict((n, None) for n in service_networks)
+        attached = []
+        for network in sorted(service_networks):
+            if network not in networks:
+                raise DeploymentError('Service {} uses undefined network {}'.format(service_name, network))
+            aliases = [service_name] + list((service_networks[network] or {}).get('aliases') or [])
+            attached.append((networks[network]['name'], aliases))
+
+        binds, anonymous = _mounts(service, volumes, content.get('secrets') or {}, content.get('configs') or {},
+                                   base_dir)
+
+        host_config = {
+            'binds': binds or None,
+            'port_bindings': bindings or None,
+            'restart_policy': _restart_policy(service),
+            'cap_add': service.get('cap_add'),
+            'cap_drop': service.get('cap_drop'),
+            'privileged': service.get('privileged') or False,
+            'extra_hosts': _as_dict(service.get('extra_hosts'), ':') or None,
+            'dns': service.get('dns'),
+            'network_mode': attached[0][0] if attached else service.get('network_mode'),
+        }
+        command = service.get('command')
+        entrypoint = service.get('entrypoint')
+        create = {
+            'command': command,
+            'entrypoint': entrypoint,
+            'environment': environment or None,
+            'ports': ports or None,
+            'volumes': anonymous or None,
+            'working_dir': service.get('working_dir'),
+            'user': '{}'.format(service['user']) if service.get('user') is not None else None,
+            'hostname': service.get('hostname'),
+            'healthcheck': _healthcheck(service.get('healthcheck')),
+            'tty': service.get('tty') or False,
+            'stdin_open': service.get('stdin_open') or False,
+            'stop_signal': service.get('stop_signal'),
+            'stop_timeout': int(duration(service['stop_grace_period'])) if service.get('stop_grace_period') else None,
+        }
+
+        deploy = service.get('deploy') or {}
+        replicas = 1 if deploy.get('mode') == 'global' else int(deploy.get('replicas', 1))
+        for number in range(1, replicas + 1):
+            labels = _as_dict(service.get('labels'))
+            labels.update({
+                project_label: project,
+                service_label: service_name,
+                number_label: '{}'.format(number),
+                oneoff_label: 'False',
+            })
+            if hashes:
+                labels[spec_hash_label] = hashes['{}_{}'.format(project, service_name)]
+            containers.append({
+                'name': '{}_{}_{}'.format(project, service_name, number),
+                'service': '{}_{}'.format(project, service_name),
+                'image': service['image'],
+                'create': dict(create, labels=labels),
+                'host_config': dict(host_config),
+                'networks': attached,
+            })
+
+    return {
+        'networks': networks,
+        'volumes': volumes,
+        'containers': containers,
+    }
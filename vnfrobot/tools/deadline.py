@@ -0,0 +1,135 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.exceptions import Timeout
+
+from exc import DeadlineExceeded
+
+# Deadlines are absolute points in time and nest: an inner deadline never extends the outer one. They are kept per
+# thread, so background threads like the sidecar pool warmer are not affected by the deadline of a keyword.
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def deadline(seconds, name, nested=True):
+    """
+    Runs the enclosed block with a deadline. All Docker API calls, subprocesses and wait loops within the block are
+    bounded by the remaining time.
+
+    Args:
+        seconds: float - time budget, None or 0 for no deadline
+        name: str - name of the block, used in error messages
+        nested: bool - if False, the deadline is not bounded by an enclosing deadline, e.g. for cleaning up after the
+            enclosing deadline expired
+
+    Returns:
+        None
+
+    """
+    stack = _stack()
+    if not seconds:
+        yield
+        return
+
+    at = time.time() + seconds
+    if stack and nested:
+        at = min(at, stack[-1][0])
+    stack.append((at, name))
+    try:
+        yield
+    finally:
+        stack.remove((at, name))
+
+
+def remaining():
+    """
+    Time left until the innermost deadline of the current thread.
+
+    Returns:
+        float or None if there is no deadline
+
+    """
+    stack = _stack()
+    return stack[-1][0] - time.time() if stack else None
+
+
+def check(what):
+    """
+    Raises DeadlineExceeded if the deadline already expired.
+
+    Args:
+        what: str - what was about to be done, used in the error message
+
+    Returns:
+        None
+
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded('Deadline of {} exceeded before {}'.format(_stack()[-1][1], what))
+
+
+def bound(timeout, what):
+    """
+    Bounds a timeout by the remaining time.
+
+    Args:
+        timeout: float or None - timeout of the operation
+        what: str - the operation, used in the error message
+
+    Returns:
+        float or None if there is neither a timeout nor a deadline
+
+    """
+    check(what)
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+
+def bound_requests(api, verbs=('_get', '_post', '_put', '_delete')):
+    """
+    Wraps the HTTP methods of a docker-py APIClient so that the timeout of every request is bounded by the remaining
+    time. A request that times out because of the deadline raises DeadlineExceeded.
+
+    Args:
+        api: docker.APIClient
+        verbs: names of the HTTP methods of the APIClient
+
+    Returns:
+        api
+
+    """
+    for verb in verbs:
+        request = getattr(api, verb, None)
+        if request is None or getattr(request, 'bounded', False):
+            continue
+        setattr(api, verb, _bounded_request(api, request, verb))
+    return api
+
+
+def _bounded_request(api, request, verb):
+    def wrapper(url, *args, **kwargs):
+        if remaining() is None:
+            return request(url, *args, **kwargs)
+
+        timeout = kwargs.get('timeout', api.timeout)
+        kwargs['timeout'] = bound(timeout, '{} {}'.format(verb.strip('_').upper(), url))
+        try:
+            return request(url, *args, **kwargs)
+        except Timeout:
+            if remaining() <= 0:
+                raise DeadlineExceeded('Deadline of {} exceeded during {} {}'.format(
+                    _stack()[-1][1], verb.strip('_').upper(), url))
+            raise
+
+    wrapper.bounded = True
+    return wrapper
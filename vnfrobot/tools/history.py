@@ -0,0 +1,331 @@
+import hashlib
+import json
+import math
+import sqlite3
+import time
+import uuid
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: list of float
+        p: float - percentile between 0 and 100
+
+    Returns:
+        float or None if values is empty
+
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(p / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def file_hash(path):
+    """
+    SHA-256 of a file, e.g. of the descriptor.
+
+    Args:
+        path: str
+
+    Returns:
+        str or None if the file cannot be read
+
+    """
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (IOError, OSError, TypeError):
+        return None
+
+
+def image_digests(services):
+    """
+    Images of the services of a deployment. Images of stack services are pinned to a digest by Docker.
+
+    Args:
+        services: list of docker.models.services.Service
+
+    Returns:
+        dict - service name: image
+
+    """
+    images = {}
+    for service in services or []:
+        try:
+            images[service.name] = service.attrs['Spec']['TaskTemplate']['ContainerSpec']['Image']
+        except (KeyError, TypeError, AttributeError):
+            continue
+    return images
+
+
+class KeywordHistory(object):
+    """
+    Stores the duration of every keyword in a SQLite database and compares it with the durations of the same
+    keyword in previous runs of the suite against the same descriptor.
+    """
+
+    schema = [
+        'CREATE TABLE IF NOT EXISTS keyword_runs ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'run_id TEXT, '
+        'created REAL, '
+        'suite TEXT, '
+        'test TEXT, '
+        'statement TEXT, '
+        'keyword_type TEXT, '
+        'duration REAL, '
+        'status TEXT, '
+        'descriptor_hash TEXT, '
+        'image_digests TEXT)',
+        'CREATE INDEX IF NOT EXISTS keyword_runs_baseline '
+        'ON keyword_runs (suite, test, statement, descriptor_hash, status, id)'
+    ]
+
+    def __init__(self, path, window=20, min_runs=5, ratio=1.5):
+        """
+
+        Args:
+            path: str - path of the SQLite database, created if it does not exist
+            window: int - number of previous runs the baseline is calculated from
+            min_runs: int - minimum number of previous runs before keywords are compared with the baseline
+            ratio: float - a keyword regressed if it took longer than ratio times the p95 of the baseline
+        """
+        self.path = path
+        self.window = window
+        self.min_runs = min_runs
+        self.ratio = ratio
+
+        self.run_id = None
+        self.suite = None
+        self.descriptor_hash = None
+        self.images = None
+
+        self._db = sqlite3.connect(path, timeout=30)
+        for statement in self.schema:
+            self._db.execute(statement)
+        self._db.commit()
+
+    def start_run(self, suite, descriptor_file=None, images=None):
+        """
+        Starts a new run of a suite. All following records belong to this run.
+
+        Args:
+            suite: str - name of the suite
+            descriptor_file: str - path of the descriptor
+            images: dict - images of the services, see image_digests()
+
+        Returns:
+            None
+
+        """
+        self.run_id = uuid.uuid4().hex
+        self.suite = suite
+        self.descriptor_hash = file_hash(descriptor_file)
+        self.images = json.dumps(images or {}, sort_keys=True)
+
+    def set_images(self, images):
+        """
+        Sets the images of the services once the deployment is ready.
+
+        Args:
+            images: dict - images of the services, see image_digests()
+
+        Returns:
+            None
+
+        """
+        self.images = json.dumps(images or {}, sort_keys=True)
+
+    def baseline(self, test, statement):
+        """
+        p50 and p95 of the passed runs of a keyword within the window, not including the current run.
+
+        Args:
+            test: str - name of the test case
+            statement: str - validation statement
+
+        Returns:
+            dict with runs, p50, p95 or None if there are less than min_runs previous runs
+
+        """
+        rows = self._db.execute(
+            'SELECT duration FROM keyword_runs '
+            'WHERE suite = ? AND test IS ? AND statement = ? AND descriptor_hash IS ? AND status = ? AND run_id != ? '
+            'ORDER BY id DESC LIMIT ?',
+            (self.suite, test, statement, self.descriptor_hash, 'PASS', self.run_id, self.window)).fetchall()
+        durations = [r[0] for r in rows]
+        if len(durations) < max(self.min_runs, 1):
+            return None
+        return {'runs': len(durations), 'p50': percentile(durations, 50), 'p95': percentile(durations, 95)}
+
+    def record(self, test, statement, keyword_type, duration, status):
+        """
+        Stores the duration of a keyword and compares passed keywords with the baseline.
+
+        Args:
+            test: str - name of the test case
+            statement: str - validation statement
+            keyword_type: str - e.g. Port, File
+            duration: float - seconds
+            status: str - PASS or FAIL
+
+        Returns:
+            str: description of the regression or None
+
+        """
+        regression = None
+        if status == 'PASS':
+            baseline = self.baseline(test, statement)
+            if baseline and duration > self.ratio * baseline['p95']:
+                regression = u'"{}" took {:.2f} s, more than {} x the p95 of {:.2f} s (p50 {:.2f} s) of the last {} ' \
+                             'runs'.format(statement, duration, self.ratio, baseline['p95'], baseline['p50'],
+                                           baseline['runs'])
+
+        self._db.execute(
+            'INSERT INTO keyword_runs (run_id, created, suite, test, statement, keyword_type, duration, status, '
+            'descriptor_hash, image_digests) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (self.run_id, time.time(), self.suite, test, statement, keyword_type, duration, status,
+             self.descriptor_hash, self.images))
+        self._db.commit()
+        return regression
+
+    def close(self):
+        self._db.close()
+
+
+class StartupHistory(object):
+    """
+    Stores how long services took to become ready after a deployment and derives timeouts and poll intervals for the
+    health check from it. Services are identified by their name within the descriptor and their image without
+    digest, so the history survives new stack names and image rebuilds.
+    """
+
+    schema = [
+        'CREATE TABLE IF NOT EXISTS startup_times ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+        'created REAL, '
+        'service TEXT, '
+        'image TEXT, '
+        'duration REAL)',
+        'CREATE INDEX IF NOT EXISTS startup_times_service ON startup_times (service, image, id)'
+    ]
+
+    def __init__(self, path, window=20, min_runs=3, factor=1.5, floor=10, ceiling=600):
+        """
+
+        Args:
+            path: str - path of the SQLite database, created if it does not exist
+            window: int - number of previous startups the timeout is calculated from
+            min_runs: int - minimum number of previous startups before the history is used
+            factor: float - the timeout is factor times the p99 of the startup times
+            floor: float - lower bound for timeouts in seconds
+            ceiling: float - upper bound for timeouts in seconds
+        """
+        self.path = path
+        self.window = window
+        self.min_runs = min_runs
+        self.factor = factor
+        self.floor = floor
+        self.ceiling = ceiling
+
+        # a new connection per operation, the health check may run on a background thread
+        db = self._connect()
+        for statement in self.schema:
+            db.execute(statement)
+        db.commit()
+        db.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(service, stack=None):
+        """
+        Name of a service within the descriptor.
+
+        Args:
+            service: docker.models.services.Service
+            stack: str - name of the deployment, taken from the labels of the service if not given
+
+        Returns:
+            tuple of service name and image without digest
+
+        """
+        spec = service.attrs.get('Spec', {})
+        stack = stack or (spec.get('Labels') or {}).get('com.docker.stack.namespace')
+        name = service.name[len(stack) + 1:] if stack and service.name.startswith(stack + '_') else service.name
+        image = spec.get('TaskTemplate', {}).get('ContainerSpec', {}).get('Image') or ''
+        return name, image.split('@')[0]
+
+    def durations(self, service, image):
+        db = self._connect()
+        try:
+            rows = db.execute('SELECT duration FROM startup_times WHERE service = ? AND image = ? '
+                              'ORDER BY id DESC LIMIT ?', (service, image, self.window)).fetchall()
+        finally:
+            db.close()
+        return [r[0] for r in rows]
+
+    def timeout(self, service, image, default):
+        """
+        Timeout for the startup of a service.
+
+        Args:
+            service: str - name of the service within the descriptor
+            image: str - image without digest
+            default: float - timeout if there are not enough previous startups
+
+        Returns:
+            float
+
+        """
+        durations = self.durations(service, image)
+        if len(durations) < max(self.min_runs, 1):
+            return default
+        return min(max(percentile(durations, 99) * self.factor, self.floor), self.ceiling)
+
+    def poll_interval(self, service, image, default, minimum=0.1, maximum=2.0):
+        """
+        Delay between two checks of a service, a tenth of its median startup time.
+
+        Args:
+            service: str - name of the service within the descriptor
+            image: str - image without digest
+            default: float - delay if there are not enough previous startups
+            minimum: float
+            maximum: float
+
+        Returns:
+            float
+
+        """
+        durations = self.durations(service, image)
+        if len(durations) < max(self.min_runs, 1):
+            return default
+        return min(max(percentile(durations, 50) / 10.0, minimum), maximum)
+
+    def record(self, service, image, duration):
+        """
+        Stores the startup time of a service.
+
+        Args:
+            service: str - name of the service within the descriptor
+            image: str - image without digest
+            duration: float - seconds
+
+        Returns:
+            None
+
+        """
+        db = self._connect()
+        try:
+            db.execute('INSERT INTO startup_times (created, service, image, duration) VALUES (?, ?, ?, ?)',
+                       (time.time(), service, image, duration))
+            db.commit()
+        finally:
+            db.close()
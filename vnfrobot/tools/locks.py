@@ -0,0 +1,102 @@
+"""
+Cross-process locks for resources that suites running in parallel on the same machine share, e.g. the test tool
+volume. The locks are advisory locks (flock) on files in the lock directory, they are released by the kernel when the
+process that holds them dies.
+"""
+import errno
+import fcntl
+import os
+import re
+from contextlib import contextmanager
+
+from settings import Settings
+from tools import tracing
+from tools.wait_on import wait_on_condition
+
+
+def lock_file(name):
+    """
+    Path of the lock file of a resource.
+
+    Args:
+        name: str - name of the resource, characters that are not allowed in file names are replaced
+
+    Returns:
+        str
+
+    """
+    return os.path.join(Settings.lock_dir, 'vnfrobot-{}.lock'.format(re.sub('[^A-Za-z0-9_.-]', '_', name)))
+
+
+def _try_lock(f):
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except IOError as exc:
+        if exc.errno in (errno.EAGAIN, errno.EACCES):
+            return False
+        raise
+
+
+@contextmanager
+def file_lock(name, timeout=None):
+    """
+    Holds the exclusive lock of a resource while the block runs.
+
+    Args:
+        name: str - name of the resource
+        timeout: float - seconds to wait for the lock, default is the setup timeout
+
+    Returns:
+        None
+
+    Raises:
+        DeadlineExceeded or AssertionError: if the lock is not acquired in time
+
+    """
+    with slot(name, 1, timeout):
+        yield
+
+
+@contextmanager
+def slot(name, slots, timeout=None):
+    """
+    Holds one of a number of slots of a resource while the block runs, e.g. to limit how many stacks are deployed at
+    once.
+
+    Args:
+        name: str - name of the resource
+        slots: int - number of slots, 0 for no limit
+        timeout: float - seconds to wait for a free slot, default is the setup timeout
+
+    Returns:
+        int - number of the slot, None if there is no limit
+
+    Raises:
+        DeadlineExceeded or AssertionError: if no slot gets free in time
+
+    """
+    if slots <= 0:
+        yield None
+        return
+
+    files = [open(lock_file(name if slots == 1 else '{}-{}'.format(name, number)), 'a') for number in range(slots)]
+    held = []
+
+    def condition():
+        for number, f in enumerate(files):
+            if _try_lock(f):
+                held.append(number)
+                return True
+        return False
+
+    try:
+        with tracing.span('lock {}'.format(name), 'wait', slots=slots):
+            wait_on_condition(condition, timeout=Settings.setup_timeout if timeout is None else timeout)
+        try:
+            yield held[0]
+        finally:
+            fcntl.flock(files[held[0]], fcntl.LOCK_UN)
+    finally:
+        for f in files:
+            f.close()
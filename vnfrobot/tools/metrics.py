@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class Histogram(object):
+    """
+    Cumulative histogram with labels as used by Prometheus.
+    """
+
+    def __init__(self, name, documentation, buckets, label_names=()):
+        """
+
+        Args:
+            name: str - metric name
+            documentation: str - HELP text
+            buckets: list of float - upper bounds of the buckets, +Inf is added automatically
+            label_names: tuple of str
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(float(b) for b in buckets)
+        self.label_names = tuple(label_names)
+        self.series = OrderedDict()
+
+    def observe(self, value, *labels):
+        """
+        Add an observation.
+
+        Args:
+            value: float - observed value, e.g. a duration in seconds
+            *labels: label values in the order of label_names
+
+        Returns:
+            None
+
+        """
+        series = self.series.setdefault(tuple(labels), {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series['buckets'][index] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def expose(self):
+        """
+        Text exposition of the histogram.
+
+        Returns:
+            list of str
+
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.documentation), '# TYPE {} histogram'.format(self.name)]
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, series['buckets']):
+                cumulative += n
+                lines.append(u'{}_bucket{} {}'.format(
+                    self.name, _labels(self.label_names + ('le',), labels + (repr(bound),)), cumulative))
+            lines.append(u'{}_bucket{} {}'.format(
+                self.name, _labels(self.label_names + ('le',), labels + ('+Inf',)), series['count']))
+            lines.append(u'{}_sum{} {}'.format(self.name, _labels(self.label_names, labels), repr(series['sum'])))
+            lines.append(u'{}_count{} {}'.format(self.name, _labels(self.label_names, labels), series['count']))
+        return lines
+
+
+def _escape(value):
+    return u'{}'.format(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return u'{{{}}}'.format(u','.join(u'{}="{}"'.format(n, _escape(v)) for n, v in zip(names, values)))
+
+
+class PrometheusExporter(object):
+    """
+    Tracing listener that collects latency histograms of a suite run and writes them in the Prometheus text exposition
+    format, e.g. into the directory of the textfile collector of the node exporter.
+    """
+
+    def __init__(self, suite, buckets, api_buckets=None):
+        """
+
+        Args:
+            suite: str - name of the suite, added as label to all metrics
+            buckets: list of float - buckets for keywords, deployment, health checks and sidecars
+            api_buckets: list of float - buckets for Docker API calls, defaults to buckets
+        """
+        self.suite = suite
+        self._lock = threading.Lock()
+        self.keywords = Histogram('vnfrobot_keyword_duration_seconds',
+                                  'Duration of validation keywords by keyword type.',
+                                  buckets, ('suite', 'type'))
+        self.deployments = Histogram('vnfrobot_deployment_duration_seconds',
+                                     'Duration of deploying the stack under test.',
+                                     buckets, ('suite',))
+        self.health_checks = Histogram('vnfrobot_health_check_wait_seconds',
+                                       'Time spent waiting for the services of the stack to become healthy.',
+                                       buckets, ('suite',))
+        self.api_calls = Histogram('vnfrobot_docker_api_duration_seconds',
+                                   'Latency of Docker API calls by docker-py method.',
+                                   api_buckets or buckets, ('suite', 'call', 'method'))
+        self.sidecars = Histogram('vnfrobot_sidecar_lifecycle_seconds',
+                                  'Time spent starting and stopping sidecars by operation and kind.',
+                                  buckets, ('suite', 'operation', 'kind'))
+
+    def on_span(self, record):
+        category = record['cat']
+        with self._lock:
+            if category == 'keyword':
+                self.keywords.observe(record['duration'], self.suite, record['args'].get('type', ''))
+            elif category == 'setup' and record['name'] == 'deploy':
+                self.deployments.observe(record['duration'], self.suite)
+            elif category == 'setup' and record['name'] == 'health check':
+                self.health_checks.observe(record['duration'], self.suite)
+            elif category == 'api':
+                self.api_calls.observe(record['duration'], self.suite, record['name'][len('api.'):],
+                                       record['args'].get('method', ''))
+            elif category == 'sidecar':
+                self.sidecars.observe(record['duration'], self.suite, record['name'].split(' ')[-1],
+                                      record['args'].get('kind', ''))
+
+    def on_count(self, name, n, record):
+        pass
+
+    def expose(self):
+        """
+        All metrics in the text exposition format.
+
+        Returns:
+            str
+
+        """
+        lines = []
+        with self._lock:
+            for histogram in (self.keywords, self.deployments, self.health_checks, self.api_calls, self.sidecars):
+                lines.extend(histogram.expose())
+        lines.append('# HELP vnfrobot_last_run_timestamp_seconds Time when the suite finished.')
+        lines.append('# TYPE vnfrobot_last_run_timestamp_seconds gauge')
+        lines.append(u'vnfrobot_last_run_timestamp_seconds{} {}'.format(
+            _labels(('suite',), (self.suite,)), repr(time.time())))
+        return u'\n'.join(lines) + u'\n'
+
+    def write(self, path):
+        """
+        Writes the metrics. The file is written next to the target and renamed, so a collector never reads a partially
+        written file.
+
+        Args:
+            path: str
+
+        Returns:
+            None
+
+        """
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(self.expose().encode('utf-8'))
+        os.rename(tmp, path)
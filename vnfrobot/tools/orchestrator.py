@@ -1,17 +1,46 @@
 import os
+import re
 from abc import ABCMeta, abstractmethod
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
+from docker.errors import APIError
 from robot.libraries.BuiltIn import BuiltIn
 from ruamel import yaml
 
 from DockerController import DockerController
-from exc import SetupError, DeploymentError
+from LocalDockerController import LocalDockerController
+from exc import SetupError, DeploymentError, DeadlineExceeded, NotFoundError
 from settings import Settings, set_breakpoint
-from tools import namesgenerator
+from testtools.GossTool import GossTool
+from tools import deadline, locks, namesgenerator, placement, thread_log, tracing
+from tools.circuit_breaker import CircuitBreaker
+from tools.data_structures import ProcessResult
+from tools.history import StartupHistory
+from tools.readiness import Readiness, parse_descriptor, required_services
+from tools.sidecar_pool import SidecarPool
 from tools.wait_on import wait_on_services_status
 from . import path
 
 
+def reset_tag(tag):
+    """
+    Parses a reset tag of a test case: `reset` resets all services before the test, `reset:<service>[,<service>]`
+    the given services.
+
+    Args:
+        tag: str
+
+    Returns:
+        list of service names, [] for all services, None if the tag is no reset tag
+
+    """
+    found = re.match('^reset(?::(.+))?$', tag.strip(), re.IGNORECASE)
+    if not found:
+        return None
+    return [name.strip() for name in (found.group(1) or '').split(',') if name.strip()]
+
+
 class Orchestrator:
     __metaclass__ = ABCMeta
 
@@ -54,8 +83,205 @@ class DockerOrchestrator(Orchestrator):
 
     def __init__(self, robot_instance):
         super(DockerOrchestrator, self).__init__(robot_instance)
-        self.controller = self._get_controller(self.robot_instance.suite_source) \
+        self.docker_host = self._place() if Settings.docker_hosts and not self.controller else None
+        self.controller = self._get_controller(self.robot_instance.suite_source, self.docker_host) \
             if not self.controller else self.controller
+        self.goss_servers = {}
+        self.health_breaker = CircuitBreaker('Deployment',
+                                             threshold=Settings.health_breaker_threshold,
+                                             reset_timeout=Settings.circuit_breaker_reset)
+        self.sidecar_pool = SidecarPool(self.controller, size=Settings.sidecar_pool_size) \
+            if Settings.sidecar_pool_size > 0 else None
+        self.startup_history = StartupHistory(Settings.history_db,
+                                              window=Settings.history_window,
+                                              factor=Settings.wait_timeout_factor,
+                                              floor=Settings.wait_timeout_floor,
+                                              ceiling=Settings.wait_timeout_ceiling) \
+            if Settings.history_db else None
+        self._setup = None
+        self.image_pulls = {}
+        self.snapshots = {}
+        # services whose containers are retrieved on first use, see collect_containers()
+        self.pending_containers = []
+        # log messages of the background setup, written to the log by replay_log()
+        self.background_log = []
+
+    @staticmethod
+    def sidecar_volumes(volume):
+        """
+        Volume configuration for sidecars that run a test tool from the test tool volume.
+
+        Args:
+            volume: str - name of the test tool volume
+
+        Returns:
+            dict
+
+        """
+        return {
+            volume: {
+                'bind': '/goss',
+                'mode': 'ro'
+            }
+        }
+
+    def start_setup(self):
+        """
+        Starts the setup of the suite on background threads: the deployment, the preparation of the sidecar image and
+        the provisioning of the test tool volume run in parallel, the sidecar pool is warmed once all of them are
+        done. Use wait_for_setup() before the deployment is needed.
+
+        Returns:
+            None
+
+        """
+        if self._setup:
+            return
+        pool = ThreadPool(3)
+        image = pool.apply_async(self._in_background, ('sidecar image', self.controller.get_or_pull_image,
+                                                       Settings.sidecar_image))
+        volume = pool.apply_async(self._in_background, ('volume prep', self.check_or_create_test_tool_volume,
+                                                        Settings.goss_helper_volume))
+        self._setup = pool.apply_async(self._in_background, ('suite setup', self._setup_deployment, image, volume))
+        pool.close()
+
+    def _in_background(self, name, func, *args):
+        # deadlines are thread-local, every background task gets the deadline of the suite setup. Robot Framework
+        # drops log messages of other threads, they are collected and logged from the main thread.
+        with thread_log.collect(self.background_log), deadline.deadline(Settings.setup_timeout, name):
+            return func(*args)
+
+    def replay_log(self):
+        """
+        Writes the log messages of the background setup to the log. Must be called from the main thread.
+
+        Returns:
+            None
+
+        """
+        thread_log.replay(self.background_log)
+
+    def _setup_deployment(self, image, volume):
+        with tracing.span('suite setup', 'setup'):
+            try:
+                self.get_or_create_deployment()
+            finally:
+                # from now on, the deployment counts as active stack of the host
+                if self.docker_host:
+                    placement.release(self.docker_host)
+            image.get()
+            self.snapshot_volumes()
+            volume.get()
+            self.warm_sidecar_pool()
+
+    def setup_done(self):
+        """
+        Returns:
+            bool: True if the setup of the suite finished, successfully or not
+
+        """
+        return bool(self._setup and self._setup.ready())
+
+    def wait_for_setup(self):
+        """
+        Blocks until the setup of the suite is done. Starts the setup if it was not started yet.
+
+        Returns:
+            None
+
+        Raises:
+            the exception of the setup if it failed
+            DeadlineExceeded: if the deadline of the caller expires first
+
+        """
+        self.start_setup()
+        left = deadline.remaining()
+        with tracing.span('wait for setup', 'wait'):
+            try:
+                # AsyncResult.get() without timeout cannot be interrupted in Python 2
+                self._setup.get(left if left is not None else 10 ** 6)
+            except TimeoutError:
+                raise DeadlineExceeded('Deadline exceeded while waiting for the deployment')
+
+    def warm_sidecar_pool(self):
+        """
+        Starts idle sidecars in the background for every network context that is used in the suite.
+
+        Returns:
+            None
+
+        """
+        if not self.sidecar_pool:
+            return
+
+        contexts = set()
+        for test_case in self.robot_instance.test_cases:
+            for step in test_case.steps:
+                found = re.search('set network context to (\S+)', ' '.join(step), re.IGNORECASE)
+                if found:
+                    contexts.add(found.group(1))
+        if not contexts:
+            return
+
+        volume = self.check_or_create_test_tool_volume(Settings.goss_helper_volume)
+        self.sidecar_pool.warm([
+            ('{}_{}'.format(self.robot_instance.deployment_name, context), self.sidecar_volumes(volume))
+            for context in sorted(contexts)])
+
+    def remove_sidecar_pool(self):
+        """
+        Removes all sidecars of the pool.
+
+        Returns:
+            None
+
+        """
+        if self.sidecar_pool:
+            self.sidecar_pool.drain()
+
+    def get_or_create_goss_server(self, network, volumes):
+        """
+        Retrieves the goss server sidecar for a network or starts a new one. The sidecar is kept running until the end
+        of the suite, gossfiles are pushed to it for every validation statement.
+
+        Args:
+            network: str - name of the network the sidecar is attached to
+            volumes: dict - volumes for the sidecar, must contain the test tool volume
+
+        Returns:
+            docker.models.containers.Container
+
+        """
+        server = self.goss_servers.get(network)
+        if server:
+            return server
+
+        BuiltIn().log('Starting goss server for network {}...'.format(network), level='INFO',
+                      console=Settings.to_console)
+        server = self.controller.get_or_create_long_running_sidecar(
+            name='robot_goss_server_for_{}_{}'.format(network, os.getpid()),
+            command=GossTool.serve_command(port=Settings.goss_serve_port),
+            volumes=volumes,
+            network=network)
+        self.goss_servers[network] = server
+        return server
+
+    def remove_goss_servers(self):
+        """
+        Removes all goss server sidecars that were started during the suite.
+
+        Returns:
+            None
+
+        """
+        for network, server in self.goss_servers.items():
+            BuiltIn().log('Removing goss server {}'.format(server.name), level='INFO', console=Settings.to_console)
+            try:
+                self.controller._kill_and_delete_container(server)
+            except APIError as exc:
+                BuiltIn().log('Could not remove goss server {}: {}'.format(server.name, exc), level='ERROR',
+                              console=Settings.to_console)
+        self.goss_servers = {}
 
     def get_or_create_test_tool_volume(self, volume):
         try:
@@ -64,7 +290,13 @@ class DockerOrchestrator(Orchestrator):
             if 'not find' in exc:
                 return self.check_or_create_test_tool_volume(volume)
 
+    @tracing.traced('volume prep', 'setup')
     def check_or_create_test_tool_volume(self, volume):
+        # suites that run in parallel share the volume, only one of them may provision it
+        with locks.file_lock('volume-{}-{}'.format(volume, self.controller.docker_host)):
+            return self._check_or_create_test_tool_volume(volume)
+
+    def _check_or_create_test_tool_volume(self, volume):
         expected = 'goss-linux-amd64'
         BuiltIn().log('Preparing volume for test tool...', level='INFO', console=Settings.to_console)
         try:
@@ -86,13 +318,44 @@ class DockerOrchestrator(Orchestrator):
             return volume
 
     @staticmethod
-    def _get_controller(source):
-        try:
-            return DockerController(base_dir=os.path.dirname(source))
-        except SetupError as exc:
-            raise exc
+    def _get_controller(source, docker_host=None):
+        if Settings.docker_mode not in ('swarm', 'local', 'auto'):
+            raise SetupError('\nUnknown VNFROBOT_DOCKER_MODE {}, use swarm, local or auto.'.format(
+                Settings.docker_mode))
+        controller = LocalDockerController if Settings.docker_mode == 'local' else DockerController
+        ctl = controller(base_dir=os.path.dirname(source), docker_host=docker_host)
+        if Settings.docker_mode == 'auto' and not ctl.swarm_active():
+            ctl = LocalDockerController(base_dir=os.path.dirname(source), docker_host=docker_host)
+        return ctl
+
+    def _place(self):
+        """
+        Chooses the Docker host of the suite among the hosts of VNFROBOT_DOCKER_HOSTS, see tools/placement.py. A suite
+        that uses an existing deployment is placed on the host that runs it. The suite stays on the host until it ends.
+
+        Returns:
+            str - URL of the Docker host
 
-    def _get_deployment(self, deployment_name=None):
+        """
+        options = self.robot_instance.deployment_options
+        try:
+            try:
+                host, loads = placement.place(Settings.docker_hosts, deployment_name=options.get('USE_DEPLOYMENT'))
+            except DeploymentError:
+                if not (options.get('USE_DEPLOYMENT') and options.get('REDEPLOY')):
+                    raise
+                # the deployment is created by the update
+                host, loads = placement.place(Settings.docker_hosts)
+        except DeploymentError as exc:
+            raise SetupError('\nCannot place the suite on a Docker host: {}'.format(exc))
+        BuiltIn().log('Placing suite on Docker host {} ({})'.format(host, ', '.join(
+            '{}: {}'.format(h, 'unreachable' if load is None else '{} stacks, {:.1f} ms'.format(
+                load['stacks'], load['latency'] * 1000)) for h, load in sorted(loads.items()))),
+            level='INFO', console=True)
+        return host
+
+    @tracing.traced('get deployment', 'setup')
+    def _get_deployment(self, deployment_name=None, created=False, changed=None, ignore_tasks=None):
         if self.robot_instance.suite_source is None:
             raise SetupError('\nCannot determine directory of robot file.')
 
@@ -109,24 +372,211 @@ class DockerOrchestrator(Orchestrator):
             assert len(self.robot_instance.services) > 0, \
                 "instance.services should not be empty after get_or_create_deployment()"
 
-            # retrieve and store containers that belong to the deployment
-            for service in self.robot_instance.services:
-                self.robot_instance.containers.extend(self.controller.get_containers_for_service(service.name))
+            self._health_check_services(self.robot_instance, ignore_existing=not created,
+                                        deployment_name=deployment_name, changed=changed, ignore_tasks=ignore_tasks)
+
+            # retrieve and store containers of the services that are ready: the services the suite needs and the
+            # services an update did not change. The containers of the others are retrieved on first use, so the
+            # suite does not wait for them.
+            required = self.required_services(deployment_name)
+            if required is not None:
+                required = required_services(parse_descriptor(self.robot_instance.descriptor_file, deployment_name),
+                                             required)
+            ready = [s for s in self.robot_instance.services
+                     if required is None or s.name in required or (changed is not None and s.name not in changed)]
+            self.pending_containers = [s.name for s in self.robot_instance.services if s not in ready]
+            containers = []
+            for service in ready:
+                containers.extend(self.controller.get_containers_for_service(service.name))
+            self.robot_instance.containers.extend(containers)
             # set_breakpoint()
-            if len(self.robot_instance.containers) < len(self.robot_instance.services):
+            if len(containers) < len(ready):
                 BuiltIn().log("There are not enough containers for the number of services. Something is wrong "
                               "with the deployment", level='ERROR', console=True)
                 raise DeploymentError('Not all containers are alive and well.')
 
-            self._health_check_services(self.robot_instance)
             self.robot_instance.deployment_name = deployment_name
         except DeploymentError as exc:
             raise SetupError('\nError during health check: {}'.format(exc.message))
 
-    def _health_check_services(self, instance):
+    def collect_containers(self):
+        """
+        Retrieves the containers of the services the suite did not wait for at setup. Services that do not become
+        ready are skipped with a warning.
+
+        Returns:
+            None
+
+        """
+        pending, self.pending_containers = self.pending_containers, []
+        for name in pending:
+            try:
+                self.robot_instance.containers.extend(self.controller.get_containers_for_service(name))
+            except (NotFoundError, DeploymentError, AssertionError) as exc:
+                BuiltIn().log('No containers of service {}: {}'.format(name, exc), level='WARN',
+                              console=Settings.to_console)
+
+    @tracing.traced('health check', 'setup')
+    def _health_check_services(self, instance, ignore_existing=True, deployment_name=None, changed=None,
+                               ignore_tasks=None):
         if not self.robot_instance.services:
             raise SetupError('\n_health_check_services: services list should not be empty')
-        wait_on_services_status(self.controller, instance.services)
+        deployment_name = deployment_name or instance.deployment_name
+        # after an update only the changed services are waited on, the others are ready already
+        services = [s for s in instance.services if changed is None or s.name in changed]
+        if not services:
+            return
+        graph = parse_descriptor(instance.descriptor_file, deployment_name)
+        required = self.required_services(deployment_name)
+        readiness = Readiness(self.controller, graph,
+                              required=required_services(graph, required) if required is not None else None,
+                              workers=Settings.readiness_workers,
+                              ready=[s.name for s in instance.services if s not in services])
+        with self.health_breaker.guard(failures=(DeploymentError, AssertionError)):
+            converged = wait_on_services_status(self.controller, services, ignore_existing=ignore_existing,
+                                                readiness=readiness, startup=self.startup_history,
+                                                ignore_tasks=ignore_tasks)
+        if self.startup_history and not ignore_existing:
+            # only startups of new deployments are representative
+            for service in services:
+                if service.name in converged:
+                    name, image = StartupHistory.key(service, deployment_name)
+                    self.startup_history.record(name, image, converged[service.name])
+
+    def required_services(self, deployment_name):
+        """
+        Services the suite validates, taken from the service contexts of the test cases.
+
+        Args:
+            deployment_name: str
+
+        Returns:
+            list of service names or None if the suite needs all services, e.g. because it uses a network context
+
+        """
+        services = set()
+        for test_case in self.robot_instance.test_cases:
+            for step in test_case.steps:
+                line = ' '.join(step)
+                if re.search('set network context to', line, re.IGNORECASE):
+                    return None
+                found = re.search('set service context to (\S+)', line, re.IGNORECASE)
+                if found:
+                    services.add('{}_{}'.format(deployment_name, found.group(1)))
+        return sorted(services) or None
+
+    def reset_targets(self, deployment_name):
+        """
+        Services the suite resets between tests with the reset tag or the Reset service keyword.
+
+        Args:
+            deployment_name: str
+
+        Returns:
+            list of service names, None if all services are reset
+
+        """
+        services = set()
+        for test_case in self.robot_instance.test_cases:
+            for tag in test_case.tags:
+                names = reset_tag(tag)
+                if names == []:
+                    return None
+                services.update('{}_{}'.format(deployment_name, name) for name in names or [])
+            for step in test_case.steps:
+                found = re.search('reset service (\S+)', ' '.join(step), re.IGNORECASE)
+                if found:
+                    services.add('{}_{}'.format(deployment_name, found.group(1)))
+        return sorted(services)
+
+    def snapshot_volumes(self):
+        """
+        Copies the volumes of the services the suite resets right after the deployment, see reset_services().
+
+        Returns:
+            None
+
+        """
+        targets = self.reset_targets(self.robot_instance.deployment_name)
+        volumes = set()
+        for service in self.robot_instance.services:
+            if targets is None or service.name in targets:
+                volumes.update(self.controller.service_volumes(service))
+        if not volumes:
+            return
+        with tracing.span('snapshot', 'setup', volumes=len(volumes)):
+            try:
+                for volume in sorted(volumes):
+                    self.snapshots[volume] = self.controller.snapshot_volume(volume)
+            except DeploymentError as exc:
+                raise SetupError('\nError during snapshot of the volumes: {}'.format(exc))
+
+    def reset_services(self, names=None):
+        """
+        Restores services to their state after the deployment without redeploying the stack: their tasks are replaced
+        and their volumes are restored from the snapshots taken at suite setup. Waits until the services are ready
+        again.
+
+        Args:
+            names: list of service names without the name of the deployment, None for all services
+
+        Returns:
+            None
+
+        Raises:
+            DeploymentError: if a service cannot be reset or does not get ready
+
+        """
+        instance = self.robot_instance
+        deployment_name = instance.deployment_name
+        full_names = ['{}_{}'.format(deployment_name, name) for name in names] if names is not None else None
+        services = [s for s in instance.services if full_names is None or s.name in full_names]
+        unknown = set(full_names or []) - set(s.name for s in services)
+        if unknown:
+            raise DeploymentError('Cannot reset unknown service {}'.format(', '.join(sorted(unknown))))
+
+        with tracing.span('reset', 'setup', services=len(services)):
+            before = set(t.get('ID') for t in self.controller.get_tasks([s.id for s in services]))
+            for service in services:
+                BuiltIn().log('Resetting service {}...'.format(service.name), level='INFO',
+                              console=Settings.to_console)
+                missing = [v for v in self.controller.service_volumes(service) if v not in self.snapshots]
+                if missing:
+                    BuiltIn().log('No snapshot of volume {} of {}, it is not restored'.format(
+                        ', '.join(missing), service.name), level='WARN', console=Settings.to_console)
+                self.controller.reset_service(service, self.snapshots)
+
+            graph = parse_descriptor(instance.descriptor_file, deployment_name)
+            readiness = Readiness(self.controller, graph, workers=Settings.readiness_workers,
+                                  ready=[s.name for s in instance.services if s not in services])
+            with self.health_breaker.guard(failures=(DeploymentError, AssertionError)):
+                try:
+                    wait_on_services_status(self.controller, services, readiness=readiness, ignore_tasks=before)
+                except AssertionError as exc:
+                    raise DeploymentError(exc)
+
+            # the containers of the services were replaced
+            reset = set(s.name for s in services)
+            instance.containers = [c for c in instance.containers
+                                   if (c.labels or {}).get(self.controller.service_label) not in reset]
+            for service in services:
+                instance.containers.extend(self.controller.get_containers_for_service(service.name))
+
+    def remove_snapshots(self):
+        """
+        Removes the snapshots of the volumes.
+
+        Returns:
+            None
+
+        """
+        for volume, snapshot in sorted(self.snapshots.items()):
+            try:
+                self.controller.delete_volume(snapshot)
+            except DeploymentError as exc:
+                BuiltIn().log('Could not remove snapshot of volume {}: {}'.format(volume, exc), level='WARN',
+                              console=Settings.to_console)
+        self.snapshots = {}
 
     def get_or_create_deployment(self):
         # set_breakpoint()
@@ -139,7 +589,9 @@ class DockerOrchestrator(Orchestrator):
 
             deployment_name = self.robot_instance.deployment_name or \
                 self.robot_instance.deployment_options.get('USE_DEPLOYMENT')
-            if deployment_name:
+            if deployment_name and self.robot_instance.deployment_options.get('REDEPLOY'):
+                self._update_deployment(deployment_name)
+            elif deployment_name:
                 self._get_deployment(deployment_name)
             elif len(self.robot_instance.services) is 0:
                 self.robot_instance.deployment_name = namesgenerator.get_random_name()
@@ -172,17 +624,92 @@ class DockerOrchestrator(Orchestrator):
         assert isinstance(ctl, DockerController), "docker_controller is required"
 
         try:
-            BuiltIn().log('Deploying {} as {}'.format(descriptor, deployment_name), level='INFO',
-                          console=True)
-            res = self.controller.deploy_stack(descriptor, deployment_name)
-            assert res
-            self._get_deployment(deployment_name)
+            # limits the number of suites running in parallel that deploy at the same time
+            with locks.slot('deploy-{}'.format(ctl.docker_host), Settings.deploy_slots):
+                BuiltIn().log('Deploying {} as {}'.format(descriptor, deployment_name), level='INFO',
+                              console=True)
+                self.pull_images(descriptor, deployment_name)
+                with tracing.span('deploy', 'setup', descriptor=descriptor):
+                    res = self.controller.deploy_stack(
+                        descriptor, deployment_name, owned=not self.robot_instance.deployment_options['SKIP_UNDEPLOY'])
+                assert res
+                self._get_deployment(deployment_name, created=True)
         except (DeploymentError, TypeError) as exc:
             raise SetupError('\nError during deployment of {}: \n\t{}'.format(deployment_name, exc))
 
+    def _update_deployment(self, deployment_name):
+        """
+        Brings an existing deployment up to date with the descriptor. Only services whose definition or image changed
+        are updated and waited on, services that are not in the descriptor anymore are removed. A deployment that
+        does not exist yet is created.
+
+        Args:
+            deployment_name: str
+
+        Returns:
+            None
+
+        """
+        try:
+            # suites that share the deployment update it one after the other
+            with locks.file_lock('deployment-{}'.format(deployment_name)), \
+                    locks.slot('deploy-{}'.format(self.controller.docker_host), Settings.deploy_slots):
+                self._update_services(deployment_name)
+        except (DeploymentError, TypeError) as exc:
+            raise SetupError('\nError during update of {}: \n\t{}'.format(deployment_name, exc))
+
+    def _update_services(self, deployment_name):
+        descriptor = self.robot_instance.descriptor_file
+        ctl = self.controller
+        self.pull_images(descriptor, deployment_name)
+        hashes = ctl.spec_hashes(descriptor, deployment_name)
+        deployed = ctl.deployed_hashes(deployment_name)
+        changed = set(name for name, value in hashes.items() if deployed.get(name) != value)
+        removed = set(deployed) - set(hashes)
+        BuiltIn().log('Updating {} of {} services of deployment {}'.format(
+            len(changed), len(hashes), deployment_name), level='INFO', console=True)
+
+        # tasks of the services before the update must not count as ready
+        before = set(t.get('ID') for t in ctl.get_tasks(sorted(changed & set(deployed)))) \
+            if changed & set(deployed) else set()
+        if changed or removed:
+            with tracing.span('deploy', 'setup', descriptor=descriptor, changed=len(changed)):
+                res = ctl.deploy_stack(descriptor, deployment_name, hashes=hashes,
+                                       owned=not self.robot_instance.deployment_options['SKIP_UNDEPLOY'])
+            assert res
+        self._get_deployment(deployment_name, created=True, changed=changed, ignore_tasks=before)
+
+    @tracing.traced('image pull', 'setup')
+    def pull_images(self, descriptor, deployment_name):
+        """
+        Pulls all images of the descriptor concurrently before the stack is deployed, so tasks start at once and image
+        errors surface before the stack is created. The pull time per image is kept in image_pulls.
+
+        Args:
+            descriptor: str - path of the descriptor
+            deployment_name: str
+
+        Returns:
+            None
+
+        """
+        graph = parse_descriptor(descriptor, deployment_name)
+        # images with variables are resolved by docker stack deploy
+        images = sorted(set(service['image'] for service in graph.values()
+                            if service.get('image') and '$' not in service['image']))
+        self.image_pulls = self.controller.pull_images(images, workers=Settings.pull_workers)
+
     def remove_deployment(self):
         if not self.robot_instance.deployment_options['SKIP_UNDEPLOY']:
             if self.robot_instance.services:
+                if Settings.detached_teardown:
+                    log_file = self.robot_instance.output_file('reaper', 'log')
+                    pid = self.controller.undeploy_stack_detached(self.robot_instance.deployment_name, log_file)
+                    BuiltIn().log('Removing deployment {} in the background (pid {}, log {})'.format(
+                        self.robot_instance.deployment_name, pid, log_file), level='INFO', console=True)
+                    self.controller = None
+                    return ProcessResult('', '')
+
                 BuiltIn().log('Removing deployment {}...'.format(self.robot_instance.deployment_name), level='INFO',
                               console=True)
                 res = self.controller.undeploy_stack(self.robot_instance.deployment_name)
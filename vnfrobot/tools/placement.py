@@ -0,0 +1,185 @@
+"""
+Places the deployment of a suite on one of several Docker hosts, so many suites that run at the same time do not share
+the API throughput of a single daemon. Every host is probed for its active stacks and its API latency, the suite is
+placed on the host with the lowest load. Suites that were placed on a host by processes of this machine count as
+active stacks until their deployment exists, so suites that start at the same time spread over the hosts.
+"""
+import json
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+import docker
+from requests.exceptions import RequestException
+
+from exc import DeploymentError
+from settings import Settings
+from tools import compose, locks, reaper
+
+
+def state_file():
+    """
+    Returns:
+        str: path of the file with the placements of the processes of this machine
+
+    """
+    return os.path.join(Settings.lock_dir, 'vnfrobot-placement.json')
+
+
+def _client(host, timeout):
+    return docker.from_env(timeout=timeout, environment=dict(os.environ, DOCKER_HOST=host)).api
+
+
+def active_stacks(api):
+    """
+    Number of deployments on a Docker host: Swarm stacks and deployments of the local mode.
+
+    Args:
+        api: docker.APIClient
+
+    Returns:
+        int
+
+    """
+    stacks = set()
+    try:
+        for service in api.services(filters={'label': reaper.namespace_label}):
+            stacks.add((service['Spec'].get('Labels') or {}).get(reaper.namespace_label))
+    except docker.errors.APIError:
+        # not a swarm manager
+        pass
+    for container in api.containers(filters={'label': compose.project_label}):
+        stacks.add((container.get('Labels') or {}).get(compose.project_label))
+    stacks.discard(None)
+    return len(stacks)
+
+
+def probe(host, probes=3, timeout=5):
+    """
+    Measures the load of a Docker host.
+
+    Args:
+        host: str - URL of the Docker host
+        probes: int - number of pings, the median latency is used
+        timeout: float - timeout of every request in seconds
+
+    Returns:
+        dict: {'stacks': int, 'latency': float}, None if the host is not reachable
+
+    """
+    try:
+        api = _client(host, timeout)
+        latencies = []
+        for _ in range(probes):
+            start = time.time()
+            api.ping()
+            latencies.append(time.time() - start)
+        return {'stacks': active_stacks(api), 'latency': sorted(latencies)[len(latencies) // 2]}
+    except (docker.errors.APIError, docker.errors.DockerException, RequestException):
+        return None
+
+
+def score(load, claims=0):
+    """
+    Load of a host: its active stacks, including the suites that were just placed on it, weighted with its API latency.
+    A host that takes twice as long to answer counts as if it had twice as many stacks.
+
+    Args:
+        load: dict - see probe()
+        claims: int - suites of this machine that were placed on the host and did not deploy yet
+
+    Returns:
+        float
+
+    """
+    return (load['stacks'] + claims + 1) * max(load['latency'], 0.001)
+
+
+def _read_claims():
+    try:
+        with open(state_file(), 'r') as f:
+            claims = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    # processes that are gone do not use their host anymore
+    return dict((host, [o for o in owners if not reaper.is_orphan({reaper.owner_label: o}, 0)])
+                for host, owners in claims.items())
+
+
+def _write_claims(claims):
+    with open(state_file(), 'w') as f:
+        json.dump(dict((host, owners) for host, owners in claims.items() if owners), f)
+
+
+def place(hosts, deployment_name=None, workers=8):
+    """
+    Chooses the Docker host for a suite. A new deployment is recorded as claim on the host until release() is called,
+    e.g. once the deployment exists, or until the process is gone.
+
+    Args:
+        hosts: list of str - URLs of the Docker hosts
+        deployment_name: str - existing deployment the suite uses, the suite is placed on the host that runs it
+        workers: int - number of hosts that are probed in parallel
+
+    Returns:
+        tuple: host, dict - host: load of every probed host, see probe(), None for hosts that are not reachable
+
+    Raises:
+        DeploymentError: if no host is reachable or no host runs the deployment
+
+    """
+    pool = ThreadPool(max(min(len(hosts), workers), 1))
+    try:
+        loads = dict(zip(hosts, pool.map(probe, hosts)))
+    finally:
+        pool.close()
+    reachable = [h for h in hosts if loads[h]]
+    if not reachable:
+        raise DeploymentError('No Docker host is reachable: {}'.format(', '.join(hosts)))
+
+    if deployment_name:
+        found = [h for h in reachable if _runs(h, deployment_name)]
+        if not found:
+            raise DeploymentError('Deployment {} not found on {}'.format(deployment_name, ', '.join(reachable)))
+        return found[0], loads
+
+    with locks.file_lock('placement'):
+        claims = _read_claims()
+        host = min(reachable, key=lambda h: (score(loads[h], len(claims.get(h, []))), hosts.index(h)))
+        claims.setdefault(host, []).append(reaper.owner())
+        _write_claims(claims)
+    return host, loads
+
+
+def _runs(host, deployment_name):
+    try:
+        api = _client(host, float(Settings.docker.get('DOCKER_TIMEOUT')))
+        label = '{}={}'.format(reaper.namespace_label, deployment_name)
+        try:
+            if api.services(filters={'label': label}):
+                return True
+        except docker.errors.APIError:
+            pass
+        return bool(api.containers(all=True, filters={'label': '{}={}'.format(compose.project_label,
+                                                                              deployment_name)}))
+    except (docker.errors.APIError, docker.errors.DockerException, RequestException):
+        return False
+
+
+def release(host):
+    """
+    Removes the claim of the current process on a host.
+
+    Args:
+        host: str
+
+    Returns:
+        None
+
+    """
+    with locks.file_lock('placement'):
+        claims = _read_claims()
+        owners = claims.get(host, [])
+        if reaper.owner() in owners:
+            owners.remove(reaper.owner())
+        _write_claims(claims)
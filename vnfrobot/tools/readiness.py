@@ -0,0 +1,191 @@
+import re
+from multiprocessing.pool import ThreadPool
+
+from ruamel import yaml
+
+from exc import SetupError, NotFoundError
+from tools import tracing
+
+# state of a listening socket in /proc/net/tcp
+LISTEN = '0A'
+
+
+def parse_descriptor(descriptor, stack):
+    """
+    Reads images, dependencies and TCP ports of the services from a compose file.
+
+    Args:
+        descriptor: str - path of the compose file
+        stack: str - name of the deployment, services of the stack are prefixed with it
+
+    Returns:
+        dict - service name: {'image': str, 'depends_on': set of service names, 'ports': set of int}
+
+    """
+    try:
+        with open(descriptor, 'r') as f:
+            services = (yaml.safe_load(f) or {}).get('services') or {}
+    except (IOError, OSError, TypeError, yaml.YAMLError):
+        return {}
+
+    graph = {}
+    for name, definition in services.items():
+        definition = definition or {}
+        depends_on = definition.get('depends_on') or []
+        ports = set()
+        for port in (definition.get('ports') or []) + (definition.get('expose') or []):
+            target = _target_port(port)
+            if target:
+                ports.add(target)
+        graph['{}_{}'.format(stack, name)] = {
+            'image': definition.get('image'),
+            'depends_on': set('{}_{}'.format(stack, d) for d in depends_on),
+            'ports': ports
+        }
+    return graph
+
+
+def _target_port(port):
+    if isinstance(port, dict):
+        if port.get('protocol', 'tcp') != 'tcp':
+            return None
+        port = port.get('target')
+    port = '{}'.format(port)
+    if port.endswith('/udp'):
+        return None
+    found = re.search('(\d+)(/tcp)?$', port)
+    if not found or '-' in port.split(':')[-1]:
+        return None
+    return int(found.group(1))
+
+
+def required_services(graph, services):
+    """
+    Services and all services they depend on.
+
+    Args:
+        graph: dict - see parse_descriptor()
+        services: iterable of service names
+
+    Returns:
+        set of service names
+
+    """
+    required = set()
+    todo = list(services)
+    while todo:
+        service = todo.pop()
+        if service in required:
+            continue
+        required.add(service)
+        todo.extend(graph.get(service, {}).get('depends_on', []))
+    return required
+
+
+def listening_ports(proc_net_tcp):
+    """
+    TCP ports in state LISTEN.
+
+    Args:
+        proc_net_tcp: str - contents of /proc/net/tcp and /proc/net/tcp6
+
+    Returns:
+        set of int
+
+    """
+    ports = set()
+    for line in proc_net_tcp.splitlines():
+        fields = line.split()
+        if len(fields) < 4 or ':' not in fields[1] or fields[3] != LISTEN:
+            continue
+        try:
+            ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+        except ValueError:
+            continue
+    return ports
+
+
+class Readiness(object):
+    """
+    Decides when the services of a deployment are ready. A service is ready if its container reports healthy when the
+    image or the descriptor defines a HEALTHCHECK, otherwise if the container listens on all TCP ports the descriptor
+    publishes or exposes for it. Services are probed in parallel once all services they depend on are ready.
+    """
+
+    def __init__(self, controller, graph, required=None, workers=4, ready=None):
+        """
+
+        Args:
+            controller: DockerController
+            graph: dict - see parse_descriptor()
+            required: iterable of service names the suite needs, including their dependencies. None for all services
+            workers: int - number of parallel probes
+            ready: iterable of service names that are known to be ready, e.g. services an update did not change
+        """
+        self.controller = controller
+        self.graph = graph
+        self.required = set(required) if required is not None else None
+        self.workers = max(workers, 1)
+        self.ready = set(ready or [])
+
+    def update(self, running):
+        """
+        Probes the running services that are not ready yet and whose dependencies are ready.
+
+        Args:
+            running: set of service names with a running task
+
+        Returns:
+            set of service names that are ready
+
+        """
+        candidates = [s for s in sorted(running) if s not in self.ready and
+                      (self.required is None or s in self.required) and
+                      self.graph.get(s, {}).get('depends_on', set()) <= self.ready]
+        if len(candidates) > 1:
+            pool = ThreadPool(min(len(candidates), self.workers))
+            try:
+                results = pool.map(self.probe, candidates)
+            finally:
+                pool.close()
+        else:
+            results = [self.probe(s) for s in candidates]
+        self.ready.update(s for s, ok in zip(candidates, results) if ok)
+        return self.ready
+
+    def probe(self, service):
+        """
+        Checks if a service is ready.
+
+        Args:
+            service: str - service name
+
+        Returns:
+            bool
+
+        """
+        with tracing.span('readiness probe', 'wait', service=service):
+            try:
+                containers = self.controller.get_containers(
+                    filters={'label': '{}={}'.format(self.controller.service_label, service), 'status': 'running'})
+            except NotFoundError:
+                return False
+            if not containers:
+                return False
+
+            container = containers[0]
+            health = container.attrs.get('State', {}).get('Health')
+            if health:
+                return health.get('Status') == 'healthy'
+
+            ports = self.graph.get(service, {}).get('ports')
+            if not ports:
+                return True
+            try:
+                res = self.controller._run_in_container(container, ['cat', '/proc/net/tcp', '/proc/net/tcp6'])
+            except SetupError:
+                return False
+            if res['code'] in (126, 127):
+                # the image has no cat, the ports cannot be probed
+                return True
+            return ports <= listening_ports(res['res'] or '')
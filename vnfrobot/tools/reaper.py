@@ -0,0 +1,271 @@
+"""
+Removes deployments in a process that is detached from the suite, so the next suite does not wait for the teardown.
+Only objects labelled with the namespace of the stack are removed, networks of other deployments are not touched.
+
+Every container, network and stack that vnf-robot creates is labelled with its owner, i.e. host and pid of the
+process that created it, and its creation time. Resources whose owner process on this host is gone, or resources of
+other hosts that are older than the TTL, are orphans and can be removed with
+
+    python reaper.py <stack> [<stack> ...]
+    python reaper.py --orphans [--ttl <seconds>]
+"""
+import argparse
+import errno
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import docker
+from requests.exceptions import ConnectionError
+
+namespace_label = 'com.docker.stack.namespace'
+owner_label = 'vnfrobot.owner'
+created_label = 'vnfrobot.created'
+
+
+def owner():
+    """
+    Owner id of the current process.
+
+    Returns:
+        str: <hostname>:<pid>
+
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def labels(**kwargs):
+    """
+    Labels for a resource that is created by the current process.
+
+    Args:
+        **kwargs: further labels
+
+    Returns:
+        dict
+
+    """
+    res = {owner_label: owner(), created_label: '{:.0f}'.format(time.time())}
+    res.update(kwargs)
+    return res
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as exc:
+        return exc.errno == errno.EPERM
+    return True
+
+
+def is_orphan(resource_labels, ttl, now=None):
+    """
+    Decides if a resource is an orphan. On the same host, a resource is an orphan if its owner process is gone, no
+    matter how old it is. The owner process of other hosts cannot be checked, their resources are orphans only after
+    the TTL.
+
+    Args:
+        resource_labels: dict - labels of the resource
+        ttl: float - seconds after which a resource of another host is an orphan, 0 to never reap resources of other
+            hosts
+        now: float - current time
+
+    Returns:
+        bool
+
+    """
+    resource_labels = resource_labels or {}
+    if owner_label not in resource_labels:
+        return False
+
+    host, _, pid = resource_labels[owner_label].rpartition(':')
+    if host == socket.gethostname():
+        try:
+            return not _alive(int(pid))
+        except ValueError:
+            return False
+
+    try:
+        created = float(resource_labels.get(created_label))
+    except (TypeError, ValueError):
+        return False
+    return bool(ttl) and (now or time.time()) - created > ttl
+
+
+def _label(stack):
+    return '{}={}'.format(namespace_label, stack)
+
+
+def remove_networks(client, stack):
+    """
+    Removes the networks of a stack.
+
+    Args:
+        client: docker.DockerClient
+        stack: str - name of the deployment
+
+    Returns:
+        list of str: names of the networks that are still in use
+
+    """
+    in_use = []
+    for network in client.networks.list(filters={'label': _label(stack)}):
+        try:
+            network.remove()
+        except docker.errors.NotFound:
+            pass
+        except docker.errors.APIError:
+            in_use.append(network.name)
+    return in_use
+
+
+def remove_stack(client, stack, timeout=120, delay=1):
+    """
+    Removes the services, secrets, configs, containers and networks of a stack. Networks can only be removed once the
+    tasks of the services are gone, so their removal is repeated until the timeout. Deployments without Swarm only
+    consist of containers and networks.
+
+    Args:
+        client: docker.DockerClient
+        stack: str - name of the deployment
+        timeout: float - seconds
+        delay: float - seconds between attempts to remove the networks
+
+    Returns:
+        list of str: names of the networks that could not be removed
+
+    """
+    for kind in ('services', 'secrets', 'configs'):
+        collection = getattr(client, kind, None)
+        if collection is None:
+            continue
+        try:
+            items = collection.list(filters={'label': _label(stack)})
+        except docker.errors.APIError:
+            # the daemon is not a swarm manager
+            continue
+        for item in items:
+            try:
+                item.remove()
+            except docker.errors.NotFound:
+                pass
+    for container in client.containers.list(all=True, filters={'label': _label(stack)}):
+        try:
+            container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+
+    end = time.time() + timeout
+    while True:
+        in_use = remove_networks(client, stack)
+        if not in_use or time.time() > end:
+            return in_use
+        time.sleep(delay)
+
+
+def reap_orphans(client, ttl, timeout=30):
+    """
+    Removes orphaned stacks, containers and networks. Every kind of resource is found with one query by its owner
+    label.
+
+    Args:
+        client: docker.DockerClient
+        ttl: float - seconds after which a resource of another host is an orphan, 0 to only check owner processes
+            of this host
+        timeout: float - seconds to wait for the networks of a stack
+
+    Returns:
+        dict - kind: names of the removed resources
+
+    """
+    now = time.time()
+    removed = {'stacks': [], 'containers': [], 'networks': []}
+    configs = getattr(client, 'configs', None)
+    try:
+        markers = configs.list(filters={'label': owner_label}) if configs is not None else []
+    except docker.errors.APIError:
+        # stacks are only marked on swarm managers
+        markers = []
+    for marker in markers:
+        marker_labels = marker.attrs.get('Spec', {}).get('Labels') or {}
+        stack = marker_labels.get(namespace_label)
+        if stack and is_orphan(marker_labels, ttl, now):
+            remove_stack(client, stack, timeout=timeout)
+            removed['stacks'].append(stack)
+
+    for container in client.containers.list(all=True, filters={'label': owner_label}):
+        if is_orphan(container.labels, ttl, now):
+            try:
+                container.remove(force=True)
+                removed['containers'].append(container.name)
+            except docker.errors.NotFound:
+                pass
+
+    for network in client.networks.list(filters={'label': owner_label}):
+        if is_orphan(network.attrs.get('Labels'), ttl, now):
+            try:
+                network.remove()
+                removed['networks'].append(network.name)
+            except docker.errors.APIError:
+                pass
+    return removed
+
+
+def spawn(arguments, log_file, docker_host=None):
+    """
+    Starts the reaper in a new session, it keeps running when the suite ends.
+
+    Args:
+        arguments: list of str - command line arguments, e.g. names of the deployments
+        log_file: str - output of the reaper
+        docker_host: str - Docker engine, defaults to DOCKER_HOST of the environment
+
+    Returns:
+        int: pid of the reaper
+
+    """
+    env = dict(os.environ)
+    if docker_host:
+        env['DOCKER_HOST'] = docker_host
+    with open(log_file, 'a') as log, open(os.devnull, 'r') as devnull:
+        proc = subprocess.Popen([sys.executable, os.path.splitext(os.path.abspath(__file__))[0] + '.py'] +
+                                list(arguments),
+                                stdin=devnull, stdout=log, stderr=subprocess.STDOUT, env=env, close_fds=True,
+                                preexec_fn=os.setsid)
+    return proc.pid
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='reaper.py', description='Removes deployments and orphaned resources of '
+                                                                   'vnf-robot.')
+    parser.add_argument('stacks', nargs='*', help='names of deployments to remove')
+    parser.add_argument('--orphans', action='store_true', help='remove resources whose owner process is gone or, '
+                                                               'for resources of other hosts, whose TTL expired')
+    parser.add_argument('--ttl', type=float, default=0, help='seconds after which a resource of another host is an '
+                                                             'orphan, default: never')
+    args = parser.parse_args(argv[1:])
+
+    client = docker.from_env(timeout=60)
+    failed = False
+    try:
+        for stack in args.stacks:
+            print('Removing {}'.format(stack))
+            in_use = remove_stack(client, stack)
+            if in_use:
+                failed = True
+                print('Networks of {} are still in use: {}'.format(stack, ', '.join(in_use)))
+            else:
+                print('Removed {}'.format(stack))
+        if args.orphans:
+            for kind, names in sorted(reap_orphans(client, args.ttl).items()):
+                print('Removed {} orphaned {}{}'.format(len(names), kind, ': ' + ', '.join(names) if names else ''))
+    except (docker.errors.APIError, ConnectionError) as exc:
+        print('Docker is not available: {}'.format(exc))
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
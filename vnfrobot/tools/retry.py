@@ -0,0 +1,223 @@
+import random
+import re
+import threading
+import time
+
+from requests.exceptions import ConnectionError
+
+from tools import deadline, tracing
+
+# Error messages of server errors of the daemon that indicate that the operation was not applied and can safely be
+# repeated. Messages that may follow an applied operation, e.g. timeouts of the swarm manager, are not listed.
+transient_messages = re.compile('|'.join([
+    'failed to allocate gateway',
+    'network \S+ not found',
+    'is already in progress',
+    'try again',
+]), re.IGNORECASE)
+
+transient_statuses = (500, 502, 503, 504)
+
+
+class RetryBudget(object):
+    """
+    Limits the number of retries within a suite, so a broken daemon does not multiply the runtime of the suite.
+    """
+
+    def __init__(self, size=50):
+        self.size = size
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reset(self, size):
+        with self._lock:
+            self.size = size
+            self.used = 0
+
+    def take(self):
+        """
+        Takes one retry from the budget.
+
+        Returns:
+            bool: False if the budget is exhausted
+
+        """
+        with self._lock:
+            if self.used >= self.size:
+                return False
+            self.used += 1
+            return True
+
+
+budget = RetryBudget()
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with full jitter for one class of operations.
+    """
+
+    def __init__(self, name, attempts=3, base_delay=0.2, max_delay=5.0, retry_budget=None):
+        """
+
+        Args:
+            name: str - operation class, e.g. read, exec or mutate
+            attempts: int - maximum number of retries of one call
+            base_delay: float - delay before the first retry in seconds
+            max_delay: float - upper bound for the delay
+            retry_budget: RetryBudget - defaults to the budget of the suite
+        """
+        self.name = name
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = retry_budget or budget
+
+    def delay(self, attempt):
+        """
+        Delay before a retry.
+
+        Args:
+            attempt: int - number of the retry, starting at 1
+
+        Returns:
+            float
+
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def backoff(self, attempt, reason):
+        """
+        Decides if a call is retried and waits before the retry.
+
+        Args:
+            attempt: int - number of the retry, starting at 1
+            reason: str - why the call failed
+
+        Returns:
+            bool: True if the call should be retried
+
+        """
+        if attempt > self.attempts:
+            return False
+        delay = self.delay(attempt)
+        left = deadline.remaining()
+        if left is not None and left <= delay:
+            return False
+        if not self.budget.take():
+            return False
+
+        record = tracing.current_span()
+        if record:
+            record['retries'] += 1
+        tracing.count('retry')
+        time.sleep(delay)
+        return True
+
+
+def operation(verb, url):
+    """
+    Operation class of a request to the Docker API.
+
+    Args:
+        verb: str - e.g. _get
+        url: str
+
+    Returns:
+        str: read, exec or mutate
+
+    """
+    if '/exec' in url:
+        return 'exec'
+    return 'read' if verb == '_get' else 'mutate'
+
+
+def transient(verb, url, response):
+    """
+    Decides if a failed request can be repeated. Only server errors are repeated, client errors like 404 and 409 are
+    answers of the daemon. Reads and creating or inspecting exec instances are idempotent, starting an exec instance
+    is never repeated. Other modifications are only repeated if they are idempotent themselves, i.e. PUT and DELETE,
+    or if the error message indicates that they were not applied.
+
+    Args:
+        verb: str - e.g. _get
+        url: str
+        response: requests.Response
+
+    Returns:
+        str: the reason if the request can be repeated, otherwise None
+
+    """
+    status = getattr(response, 'status_code', None)
+    if status not in transient_statuses:
+        return None
+
+    try:
+        message = response.text
+    except (AttributeError, RuntimeError, ValueError):
+        message = ''
+    message = message or ''
+    reason = '{} {}'.format(status, message.strip()[:200])
+
+    kind = operation(verb, url)
+    if kind == 'exec' and url.rstrip('/').endswith('/start'):
+        return None
+    if kind in ('read', 'exec') or verb in ('_put', '_delete'):
+        return reason
+    if transient_messages.search(message):
+        return reason
+    return None
+
+
+def _streamed_body(data):
+    """
+    Returns:
+        bool: True if the body of a request is a file or a generator, which is consumed by the first attempt
+    """
+    return data is not None and (hasattr(data, 'read') or
+                                 (hasattr(data, '__iter__') and not isinstance(data, (str, bytes, dict, list))))
+
+
+def retry_requests(api, policies, verbs=('_get', '_post', '_put', '_delete')):
+    """
+    Wraps the HTTP methods of a docker-py APIClient so that transient errors are retried with the policy of the
+    operation class. Streamed requests and requests with a streamed body, e.g. loading images, are never retried.
+
+    Args:
+        api: docker.APIClient
+        policies: dict - operation class: RetryPolicy
+        verbs: names of the HTTP methods of the APIClient
+
+    Returns:
+        api
+
+    """
+    for verb in verbs:
+        request = getattr(api, verb, None)
+        if request is None or getattr(request, 'retried', False):
+            continue
+        setattr(api, verb, _retried_request(request, verb, policies))
+    return api
+
+
+def _retried_request(request, verb, policies):
+    def wrapper(url, *args, **kwargs):
+        if kwargs.get('stream') or _streamed_body(kwargs.get('data')):
+            return request(url, *args, **kwargs)
+
+        policy = policies[operation(verb, url)]
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = request(url, *args, **kwargs)
+            except ConnectionError as exc:
+                if operation(verb, url) == 'read' and policy.backoff(attempt, str(exc)):
+                    continue
+                raise
+            reason = transient(verb, url, response)
+            if not reason or not policy.backoff(attempt, reason):
+                return response
+
+    wrapper.retried = True
+    return wrapper
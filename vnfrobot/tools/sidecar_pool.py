@@ -0,0 +1,168 @@
+import itertools
+import os
+import threading
+
+from docker.errors import APIError
+from robot.libraries.BuiltIn import BuiltIn
+
+from exc import DeploymentError
+from settings import Settings
+
+
+class SidecarPool(object):
+    """
+    Keeps idle, running sidecars per network and volume combination. Commands are executed in the sidecars via exec,
+    so every run gets its own output and a sidecar never needs to be recreated between validation statements.
+    """
+
+    idle_command = ['sh', '-c', 'trap "exit 0" TERM; while true; do sleep 1; done']
+
+    def __init__(self, controller, size=1, image=Settings.sidecar_image, prefix='robot_sidecar_pool'):
+        """
+
+        Args:
+            controller: DockerController
+            size: int - number of idle sidecars that are kept per network and volume combination
+            image: str - image of the sidecars
+            prefix: str - prefix for the names of the sidecars
+        """
+        self.controller = controller
+        self.size = size
+        self.image = image
+        self.prefix = '{}_{}'.format(prefix, os.getpid())
+
+        self._idle = {}
+        self._busy = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._warmer = None
+
+    @staticmethod
+    def key(network=None, volumes=None):
+        """
+        Identifies a network and volume combination.
+
+        Args:
+            network: str - name of the network
+            volumes: dict - volumes as used by docker-py
+
+        Returns:
+            tuple
+
+        """
+        volumes = volumes or {}
+        return (network or '',
+                tuple(sorted((name, v.get('bind'), v.get('mode')) for name, v in volumes.items())))
+
+    def acquire(self, network=None, volumes=None):
+        """
+        Hand out an idle sidecar for the network and volume combination. If there is none, a new one is started.
+
+        Args:
+            network: str - name of the network
+            volumes: dict - volumes as used by docker-py
+
+        Returns:
+            docker.models.containers.Container
+
+        """
+        key = self.key(network, volumes)
+        with self._lock:
+            idle = self._idle.get(key, [])
+            sidecar = idle.pop() if idle else None
+
+        if not sidecar:
+            sidecar = self._create(network, volumes)
+
+        with self._lock:
+            self._busy[sidecar.id] = key
+        return sidecar
+
+    def release(self, sidecar):
+        """
+        Return a sidecar to the pool. If the pool is already full, the sidecar is removed.
+
+        Args:
+            sidecar: docker.models.containers.Container
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            key = self._busy.pop(sidecar.id, None)
+            idle = self._idle.setdefault(key, []) if key else None
+            keep = idle is not None and len(idle) < self.size
+            if keep:
+                idle.append(sidecar)
+
+        if not keep:
+            self._remove(sidecar)
+
+    def warm(self, combinations):
+        """
+        Start idle sidecars for the given network and volume combinations in the background.
+
+        Args:
+            combinations: list of (network, volumes) tuples
+
+        Returns:
+            threading.Thread
+
+        """
+        def fill():
+            for network, volumes in combinations:
+                key = self.key(network, volumes)
+                while len(self._idle.get(key, [])) < self.size:
+                    try:
+                        sidecar = self._create(network, volumes)
+                    except DeploymentError as exc:
+                        BuiltIn().log('Could not warm sidecar pool for {}: {}'.format(network, exc),
+                                      level='WARN',
+                                      console=Settings.to_console)
+                        break
+                    with self._lock:
+                        self._idle.setdefault(key, []).append(sidecar)
+
+        self._warmer = threading.Thread(target=fill, name='sidecar-pool-warmer')
+        self._warmer.daemon = True
+        self._warmer.start()
+        return self._warmer
+
+    def drain(self):
+        """
+        Remove all sidecars of the pool, idle and busy ones.
+
+        Returns:
+            None
+
+        """
+        if self._warmer:
+            self._warmer.join()
+            self._warmer = None
+
+        with self._lock:
+            sidecars = [s for idle in self._idle.values() for s in idle]
+            busy = list(self._busy.keys())
+            self._idle = {}
+            self._busy = {}
+
+        for sidecar in sidecars + busy:
+            self._remove(sidecar)
+
+    def _create(self, network, volumes):
+        name = '{}_{}'.format(self.prefix, next(self._counter))
+        return self.controller.get_or_create_long_running_sidecar(
+            name=name,
+            image=self.image,
+            command=self.idle_command,
+            volumes=volumes,
+            network=network)
+
+    def _remove(self, sidecar):
+        try:
+            self.controller._kill_and_delete_container(sidecar)
+        except APIError as exc:
+            BuiltIn().log('Could not remove pooled sidecar {}: {}'.format(getattr(sidecar, 'name', sidecar), exc),
+                          level='WARN',
+                          console=Settings.to_console)
@@ -0,0 +1,166 @@
+import re
+
+from exc import DeploymentError
+from tools import retry, tracing
+
+# Task errors that do not go away when swarm reschedules the task
+terminal_messages = re.compile('|'.join([
+    'No such image',
+    'pull access denied',
+    'manifest unknown',
+    'manifest for \S+ not found',
+    'repository does not exist',
+    'invalid reference format',
+    'invalid mount config',
+    'no suitable node',
+    'executable file not found',
+]), re.IGNORECASE)
+
+final_states = ('complete', 'shutdown', 'failed', 'rejected', 'orphaned', 'remove')
+
+
+def classify(task):
+    """
+    Classifies the state of a task.
+
+    Args:
+        task: dict - task as returned by the tasks endpoint of the Docker API
+
+    Returns:
+        str: terminal, transient or failed, None if the task has no error
+
+    """
+    status = task.get('Status') or {}
+    state = status.get('State')
+    err = status.get('Err') or ''
+    if err and retry.transient_messages.search(err):
+        return 'transient'
+    if err and terminal_messages.search(err):
+        return 'terminal'
+    if state == 'rejected':
+        return 'terminal'
+    if state == 'failed':
+        return 'failed'
+    return None
+
+
+class TaskWatcher(object):
+    """
+    Follows the state transitions of all tasks of a stack. Every update takes the result of one bulk query of the
+    tasks and fails at once if a task has a terminal error, e.g. an unknown image, or if the tasks of a service keep
+    failing (crash loop).
+    """
+
+    def __init__(self, services, crash_loop=3, ignore_existing=False, ignore=None):
+        """
+
+        Args:
+            services: dict - service ID: service name
+            crash_loop: int - number of failed tasks of a service after which the service is considered to be in a
+                crash loop, 0 disables the detection
+            ignore_existing: bool - ignore tasks that had already ended before the first update, e.g. failures of
+                an existing deployment
+            ignore: iterable of task IDs to ignore, e.g. the tasks of services before they were updated
+        """
+        self.services = services
+        self.crash_loop = crash_loop
+        self.ignore_existing = ignore_existing
+        self.ignore = set(ignore or [])
+
+        self.states = {}
+        self.transitions = []
+        self._tasks = {}
+        self._ignored = None
+        self._failed = {}
+        self._transient = set()
+
+    def update(self, tasks):
+        """
+        Processes the current tasks of the services.
+
+        Args:
+            tasks: list of dict - tasks as returned by the tasks endpoint of the Docker API
+
+        Returns:
+            None
+
+        Raises:
+            DeploymentError: if a task has a terminal error, a service is in a crash loop or the retry budget for
+                transient errors is exhausted
+
+        """
+        if self._ignored is None:
+            self._ignored = set(t.get('ID') for t in tasks if self.ignore_existing and self._state(t) in final_states)
+            self._ignored |= self.ignore
+
+        for task in tasks:
+            task_id = task.get('ID')
+            if task_id in self._ignored:
+                continue
+            state = self._state(task)
+            if self.states.get(task_id) != state:
+                self.transitions.append((self.service_of(task), task_id, self.states.get(task_id), state))
+                self.states[task_id] = state
+                self._tasks[task_id] = self.service_of(task)
+                tracing.count('task_transition')
+            self._check(task)
+
+    def running(self):
+        """
+        Returns:
+            set of names of the services that have a running task
+
+        """
+        return set(self._tasks[task_id] for task_id, state in self.states.items() if state == 'running')
+
+    def ready(self):
+        """
+        Returns:
+            bool: True if every service has a running task
+
+        """
+        running = self.running()
+        return all(name in running for name in self.services.values())
+
+    def service_of(self, task):
+        """
+        Name of the service a task belongs to.
+
+        Args:
+            task: dict
+
+        Returns:
+            str
+
+        """
+        return self.services.get(task.get('ServiceID'), task.get('ServiceID'))
+
+    @staticmethod
+    def _state(task):
+        return (task.get('Status') or {}).get('State')
+
+    def _check(self, task):
+        service = self.service_of(task)
+        err = (task.get('Status') or {}).get('Err') or ''
+        kind = classify(task)
+        if kind == 'terminal':
+            raise DeploymentError('Service {}: task {} is {}: {}'.format(
+                service, task.get('ID'), self._state(task), err or 'rejected by the scheduler'))
+        if kind == 'transient':
+            # swarm reschedules the task, every failed task takes one retry from the budget
+            if task.get('ID') not in self._transient:
+                if not retry.budget.take():
+                    raise DeploymentError('Could not deploy {}, retry budget exhausted: {}'.format(service, err))
+                self._transient.add(task.get('ID'))
+                tracing.count('retry')
+        elif kind == 'failed':
+            failed = self._failed.setdefault(service, set())
+            failed.add(task.get('ID'))
+            if self.crash_loop and len(failed) >= self.crash_loop:
+                raise DeploymentError('Service {} is in a crash loop, {} tasks failed. Last error: {}'.format(
+                    service, len(failed), err or self._exit_code(task)))
+
+    @staticmethod
+    def _exit_code(task):
+        code = (task.get('Status') or {}).get('ContainerStatus', {}).get('ExitCode')
+        return 'exit code {}'.format(code) if code is not None else 'unknown'
@@ -0,0 +1,65 @@
+"""
+Robot Framework drops the log messages of threads other than the main thread. Messages of code that runs on
+background threads, e.g. the setup of the suite, are collected instead and written to the log from the main thread
+with replay().
+"""
+import threading
+from contextlib import contextmanager
+
+from robot.api import logger
+from robot.output import librarylogger
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _install():
+    with _lock:
+        if getattr(librarylogger.write, 'collecting', False):
+            return
+        write = librarylogger.write
+
+        def wrapper(msg, level, html=False):
+            messages = getattr(_local, 'messages', None)
+            if messages is not None and threading.currentThread().getName() not in librarylogger.LOGGING_THREADS:
+                messages.append((msg, level, html))
+            return write(msg, level, html)
+
+        wrapper.collecting = True
+        librarylogger.write = wrapper
+
+
+@contextmanager
+def collect(messages):
+    """
+    Collects the log messages of the current thread while the enclosed block runs.
+
+    Args:
+        messages: list - the messages are appended as (message, level, html)
+
+    Returns:
+        None
+
+    """
+    _install()
+    _local.messages = messages
+    try:
+        yield
+    finally:
+        _local.messages = None
+
+
+def replay(messages):
+    """
+    Writes collected messages to the log. Must be called from the main thread.
+
+    Args:
+        messages: list - see collect(), the list is emptied
+
+    Returns:
+        None
+
+    """
+    while messages:
+        msg, level, html = messages.pop(0)
+        logger.write(msg, level, html)
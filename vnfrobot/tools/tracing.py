@@ -0,0 +1,419 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Listeners receive every finished span via on_span(record) and every counter increment via on_count(name, n, record).
+# Without listeners, spans and counters cost next to nothing.
+_listeners = []
+_local = threading.local()
+
+
+def add_listener(listener):
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span():
+    """
+    Returns the innermost open span of the current thread.
+
+    Returns:
+        dict or None
+
+    """
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def begin(name, category, **args):
+    """
+    Opens a span that is closed with end(). Used where a span cannot enclose a block, e.g. between listener methods.
+
+    Args:
+        name: str - name of the span, e.g. the name of the method or keyword
+        category: str - e.g. keyword, controller, api, wait, subprocess
+        **args: arguments summary
+
+    Returns:
+        dict or None if there are no listeners
+
+    """
+    if not _listeners:
+        return None
+
+    parent = current_span()
+    record = {
+        'name': name,
+        'cat': category,
+        'args': args,
+        'start': time.time(),
+        'duration': None,
+        'tid': threading.current_thread().ident,
+        'thread': threading.current_thread().name,
+        'depth': parent['depth'] + 1 if parent else 0,
+        'keyword': name if category == 'keyword' else (parent['keyword'] if parent else None),
+        'retries': 0,
+        'error': None,
+    }
+    _stack().append(record)
+    return record
+
+
+def end(record):
+    """
+    Closes a span opened with begin() and reports it to all listeners.
+
+    Args:
+        record: dict - as returned by begin()
+
+    Returns:
+        None
+
+    """
+    if record is None or record['duration'] is not None:
+        return
+
+    record['duration'] = time.time() - record['start']
+    stack = _stack()
+    if record in stack:
+        stack.remove(record)
+    for listener in list(_listeners):
+        listener.on_span(record)
+
+
+@contextmanager
+def span(name, category, **args):
+    """
+    Measures the enclosed block and reports it to all listeners when it is left.
+    The yielded record can be used to attach additional data, e.g. the size of a response.
+
+    Args:
+        name: str - name of the span, e.g. the name of the method or keyword
+        category: str - e.g. keyword, controller, api, wait, subprocess
+        **args: arguments summary
+
+    Returns:
+        dict
+
+    """
+    record = begin(name, category, **args)
+    if record is None:
+        yield {'args': args}
+        return
+
+    try:
+        yield record
+    except Exception as exc:
+        record['error'] = '{}: {}'.format(type(exc).__name__, exc)
+        raise
+    finally:
+        end(record)
+
+
+def traced(name, category):
+    """
+    Decorator that reports every call of a function as a span.
+
+    Args:
+        name: str - name of the span
+        category: str - span category
+
+    Returns:
+        decorator
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """
+    Increments a counter, e.g. for started subprocesses or wait loop iterations. The counter is attributed to the
+    innermost open span.
+
+    Args:
+        name: str - name of the counter
+        n: int - increment
+
+    Returns:
+        None
+
+    """
+    if not _listeners:
+        return
+    record = current_span()
+    for listener in list(_listeners):
+        listener.on_count(name, n, record)
+
+
+def summarize(value, limit=80):
+    """
+    Short, printable representation of an argument.
+
+    Args:
+        value: any
+        limit: int - maximum length
+
+    Returns:
+        str
+
+    """
+    name = getattr(value, 'name', None)
+    text = name if isinstance(name, basestring) else repr(value)
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+
+def trace_methods(obj, category, skip=None):
+    """
+    Wraps all public and private methods of an object so that every call is reported as a span.
+
+    Args:
+        obj: instance whose methods are wrapped
+        category: str - span category
+        skip: list of method names that are not wrapped
+
+    Returns:
+        obj
+
+    """
+    skip = skip or []
+    cls = type(obj)
+    for attr in dir(cls):
+        if attr.startswith('__') or attr in skip:
+            continue
+        method = getattr(obj, attr, None)
+        if not callable(method) or not hasattr(method, '__self__') or method.__self__ is not obj:
+            continue
+        setattr(obj, attr, _traced(method, '{}.{}'.format(cls.__name__, attr), category))
+    return obj
+
+
+def _traced(method, name, category):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not _listeners:
+            return method(*args, **kwargs)
+        with span(name, category,
+                  args=[summarize(a) for a in args],
+                  kwargs=dict((k, summarize(v)) for k, v in kwargs.items())):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def trace_requests(api, verbs=('_get', '_post', '_put', '_delete')):
+    """
+    Wraps the HTTP methods of a docker-py APIClient. The span is named after the docker-py method that issued the
+    request, e.g. inspect_container or exec_start.
+
+    Args:
+        api: docker.APIClient
+        verbs: names of the HTTP methods of the APIClient
+
+    Returns:
+        api
+
+    """
+    for verb in verbs:
+        request = getattr(api, verb, None)
+        if request is None or getattr(request, 'traced', False):
+            continue
+        setattr(api, verb, _traced_request(request, verb))
+    return api
+
+
+def _traced_request(request, verb):
+    def wrapper(url, *args, **kwargs):
+        if not _listeners:
+            return request(url, *args, **kwargs)
+        caller = sys._getframe(1).f_code.co_name
+        if caller.startswith('_'):
+            caller = sys._getframe(2).f_code.co_name
+        with span('api.{}'.format(caller), 'api', method=verb.strip('_').upper(), url=summarize(url, 120)) as record:
+            response = request(url, *args, **kwargs)
+            record['size'] = _response_size(response, kwargs.get('stream', False))
+            record['status'] = getattr(response, 'status_code', None)
+            return response
+
+    wrapper.traced = True
+    return wrapper
+
+
+def _response_size(response, stream=False):
+    headers = getattr(response, 'headers', None) or {}
+    if headers.get('Content-Length'):
+        return int(headers.get('Content-Length'))
+    if stream:
+        return None
+    try:
+        return len(response.content)
+    except (AttributeError, TypeError, RuntimeError):
+        return None
+
+
+class DaemonCallTracer(object):
+    """
+    Collects spans and counters of a suite run. Produces a summary table per call and per keyword and writes the raw
+    trace as one JSON object per line.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.counters = {}
+        self.keyword_counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_span(self, record):
+        with self._lock:
+            self.records.append(record)
+            if record['cat'] in ('api', 'controller') and record['keyword']:
+                self._keyword(record['keyword'])[record['cat']] += 1
+                self._keyword(record['keyword'])['retries'] += record['retries']
+
+    def on_count(self, name, n, record):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if record and record['keyword']:
+                keyword = self._keyword(record['keyword'])
+                keyword[name] = keyword.get(name, 0) + n
+
+    def _keyword(self, name):
+        return self.keyword_counters.setdefault(name, {'api': 0, 'controller': 0, 'retries': 0})
+
+    def calls(self):
+        """
+        Aggregates the recorded API and controller calls by name.
+
+        Returns:
+            list of dict
+
+        """
+        rows = OrderedDict()
+        for r in self.records:
+            if r['cat'] not in ('api', 'controller'):
+                continue
+            row = rows.setdefault(r['name'], {'name': r['name'], 'calls': 0, 'total': 0.0, 'max': 0.0, 'size': 0,
+                                              'retries': 0, 'errors': 0})
+            row['calls'] += 1
+            row['total'] += r['duration']
+            row['max'] = max(row['max'], r['duration'])
+            row['size'] += r.get('size') or 0
+            row['retries'] += r['retries']
+            row['errors'] += 1 if r['error'] else 0
+        return sorted(rows.values(), key=lambda x: x['total'], reverse=True)
+
+    def summary(self):
+        """
+        Summary table as plain text.
+
+        Returns:
+            str
+
+        """
+        lines = ['{:<55} {:>6} {:>9} {:>9} {:>9} {:>10} {:>7} {:>6}'.format(
+            'call', 'calls', 'total[s]', 'mean[ms]', 'max[ms]', 'bytes', 'retries', 'errors')]
+        for row in self.calls():
+            lines.append('{:<55} {:>6} {:>9.3f} {:>9.1f} {:>9.1f} {:>10} {:>7} {:>6}'.format(
+                row['name'][:55], row['calls'], row['total'], row['total'] / row['calls'] * 1000, row['max'] * 1000,
+                row['size'], row['retries'], row['errors']))
+
+        lines.append('')
+        lines.append('{:<55} {:>6} {:>10} {:>11} {:>8} {:>7}'.format(
+            'keyword', 'api', 'controller', 'subprocess', 'waits', 'retries'))
+        for name, c in self.keyword_counters.items():
+            lines.append('{:<55} {:>6} {:>10} {:>11} {:>8} {:>7}'.format(
+                name[:55], c['api'], c['controller'], c.get('subprocess', 0), c.get('wait_iteration', 0),
+                c['retries']))
+
+        lines.append('')
+        lines.append('counters: {}'.format(', '.join('{}={}'.format(k, v) for k, v in sorted(self.counters.items()))))
+        return '\n'.join(lines)
+
+    def write(self, path):
+        """
+        Writes the raw trace, one JSON object per span.
+
+        Args:
+            path: str
+
+        Returns:
+            None
+
+        """
+        with open(path, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record, default=str) + '\n')
+
+
+class ChromeTrace(object):
+    """
+    Collects spans as complete events in the Chrome Trace Event format. The written file can be loaded into
+    chrome://tracing or Perfetto to inspect nesting and the critical path of a suite run.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    def on_span(self, record):
+        args = dict(record['args'])
+        for key in ('size', 'status', 'error'):
+            if record.get(key) is not None:
+                args[key] = record[key]
+        if record['retries']:
+            args['retries'] = record['retries']
+
+        with self._lock:
+            self.threads[record['tid']] = record['thread']
+            self.events.append({
+                'name': record['name'],
+                'cat': record['cat'],
+                'ph': 'X',
+                'ts': int(record['start'] * 1e6),
+                'dur': int(record['duration'] * 1e6),
+                'pid': os.getpid(),
+                'tid': record['tid'],
+                'args': args
+            })
+
+    def on_count(self, name, n, record):
+        pass
+
+    def write(self, path):
+        """
+        Writes the trace as JSON object with the events sorted by start time.
+
+        Args:
+            path: str
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                        for tid, name in self.threads.items()]
+            events = sorted(self.events, key=lambda e: (e['ts'], -e['dur']))
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, default=str)
@@ -1,5 +1,7 @@
 # helpers from https://github.com/docker/compose/blob/master/tests/acceptance/cli_test.py
 import subprocess
+import sys
+import threading
 import time
 from string import lower
 
@@ -8,17 +10,23 @@ from docker.models.containers import Container
 from docker.models.services import Service
 from robot.libraries.BuiltIn import BuiltIn
 
-from exc import DeploymentError
+from exc import DeploymentError, DeadlineExceeded
 from settings import Settings
+from tools import deadline, tracing
 from tools.data_structures import ProcessResult
+from tools.history import StartupHistory
+from tools.task_watch import TaskWatcher, final_states
 
 
-def start_process(base_dir, options):
+def start_process(base_dir, options, env=None):
+    deadline.check('docker {}'.format(' '.join(options)))
     proc = subprocess.Popen(
         ['docker'] + options,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        cwd=base_dir)
+        cwd=base_dir,
+        env=env)
+    tracing.count('subprocess')
     BuiltIn().log("Running process: %s" % proc.pid,
                   level='DEBUG',
                   console=False)
@@ -26,7 +34,19 @@ def start_process(base_dir, options):
 
 
 def wait_on_process(proc, returncode=0):
-    stdout, stderr = proc.communicate()
+    # the process is killed if the deadline expires before it terminates
+    left = deadline.remaining()
+    killer = threading.Timer(max(left, 0), proc.kill) if left is not None else None
+    if killer:
+        killer.daemon = True
+        killer.start()
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        if killer:
+            killer.cancel()
+    if killer and deadline.remaining() <= 0:
+        raise DeadlineExceeded('Deadline exceeded: process {} was killed'.format(proc.pid))
     if proc.returncode != returncode:
         BuiltIn().log("Stdout: {}".format(stdout),
                       level='DEBUG',
@@ -38,16 +58,38 @@ def wait_on_process(proc, returncode=0):
     return ProcessResult(stdout.decode('utf-8'), stderr.decode('utf-8'))
 
 
-def wait_on_condition(condition, delay=0.1, timeout=40):
-    start_time = time.time()
-    # last_time = start_time
-    while not condition():
-        if time.time() - start_time > timeout:
-            raise AssertionError("Timeout: %s" % condition)
-        # if time.time() - last_time > 15:
-        #     BuiltIn().log('Waiting since {} seconds now...'.format(time.time() - start_time),
-        # level='DEBUG', console=Settings.to_console)
-        time.sleep(delay)
+def wait_on_condition(condition, delay=None, timeout=None):
+    """
+    Polls a condition until it is true.
+
+    Args:
+        condition: callable
+        delay: float or callable that returns the delay before the next check, default is Settings.wait_delay
+        timeout: float - seconds, default is Settings.wait_timeout
+
+    Returns:
+        None
+
+    """
+    caller = sys._getframe(1).f_code.co_name
+    delay = Settings.wait_delay if delay is None else delay
+    timeout = Settings.wait_timeout if timeout is None else timeout
+    next_delay = delay if callable(delay) else lambda: delay
+    with tracing.span(caller, 'wait', delay=None if callable(delay) else delay, timeout=timeout):
+        bounded = deadline.bound(timeout, caller)
+        start_time = time.time()
+        # last_time = start_time
+        tracing.count('wait_iteration')
+        while not condition():
+            if time.time() - start_time > bounded:
+                if bounded < timeout:
+                    raise DeadlineExceeded('Deadline exceeded while waiting in {}'.format(caller))
+                raise AssertionError("Timeout: %s" % condition)
+            # if time.time() - last_time > 15:
+            #     BuiltIn().log('Waiting since {} seconds now...'.format(time.time() - start_time),
+            # level='DEBUG', console=Settings.to_console)
+            time.sleep(next_delay())
+            tracing.count('wait_iteration')
 
 
 def kill_service(service):
@@ -107,6 +149,24 @@ def wait_on_container_status(client, container, status='Running'):
     return wait_on_condition(condition)
 
 
+def wait_on_tasks_stopped(client, services):
+    """
+    Wait until no task of the services is running anymore, e.g. after they were scaled to 0.
+
+    Args:
+        client: DockerController
+        services: list of service names or IDs
+
+    Returns:
+        None
+
+    """
+    def condition():
+        return all((t.get('Status') or {}).get('State') in final_states for t in client.get_tasks(services))
+
+    return wait_on_condition(condition)
+
+
 # noinspection PyProtectedMember
 def wait_on_service_status(client, service, status='Running'):
     """
@@ -152,7 +212,7 @@ def wait_on_service_container_status(client, service=None, current_instances=Non
         # logger.console('waiting for {} to have a container in state {}'.format(service, status))
         # noinspection PyProtectedMember
         res = client._docker.containers.list(filters={
-            'label': 'com.docker.swarm.service.name={}'.format(service),
+            'label': '{}={}'.format(client.service_label, service),
             'status': lower(status)
         })
         # logger.console([c.name for c in res])
@@ -172,52 +232,61 @@ def wait_on_service_container_status(client, service=None, current_instances=Non
     return wait_on_condition(condition)
 
 
-# noinspection PyProtectedMember
-def wait_on_services_status(client, services=None):
+def wait_on_services_status(client, services=None, ignore_existing=True, readiness=None, startup=None,
+                            ignore_tasks=None):
     """
-    Wait until all provided services are in the desired state.
+    Wait until all provided services have a running task. The tasks of all services are retrieved with one query on
+    every iteration, the wait fails as soon as a task has a terminal error or a service is in a crash loop.
 
     Args:
         services: List of services to wait for
         client: DockerController
+        ignore_existing: bool - ignore tasks that had already ended when the wait started, e.g. for an existing
+            deployment
+        readiness: Readiness - if given, the wait also ends only when the services the suite needs are ready
+        startup: StartupHistory - if given, every service gets a timeout and poll interval learned from its previous
+            startups instead of the defaults
+        ignore_tasks: iterable of task IDs to ignore, e.g. the tasks of services before they were updated
 
     Returns:
+        dict - service name: seconds until the service was ready
 
     """
+    services = [s if isinstance(s, Service) else client._docker.services.get(s) for s in services or []]
+    keys = dict((s.name, StartupHistory.key(s)) for s in services)
+    services = dict((s.id, s.name) for s in services)
+    watcher = TaskWatcher(services, crash_loop=Settings.crash_loop_threshold, ignore_existing=ignore_existing,
+                          ignore=ignore_tasks)
+
+    waited = [name for name in services.values()
+              if readiness is None or readiness.required is None or name in readiness.required]
+    timeouts = dict((name, Settings.wait_timeout) for name in waited)
+    delays = dict((name, Settings.wait_delay) for name in waited)
+    if startup:
+        for name in waited:
+            service, image = keys[name]
+            timeouts[name] = startup.timeout(service, image, Settings.wait_timeout)
+            delays[name] = startup.poll_interval(service, image, Settings.wait_delay)
+    converged = {}
+    start = time.time()
 
-    # noinspection PyProtectedMember,PyProtectedMember,PyProtectedMember
     def condition():
-        if isinstance(services, list) and len(services) > 0:
-            state_ok = 0
-            for service in services:
-                service_name = service.name if isinstance(service, Service) else service
-
-                res = client._docker.containers.list(filters={
-                    'label': 'com.docker.swarm.service.name={}'.format(service_name)
-                })
-
-                if res:
-                    # logger.console('Found container {} belonging to service {}...'.format(res[0].name, service))
-                    state_ok += 1
-                else:
-                    # BuiltIn().log('Waiting for service {}...'.format(service_name),
-                    #               level='DEBUG',
-                    #               console=Settings.to_console)
-
-                    # try to find out if an error occured
-                    tasks = service.tasks(filters={"desired-state": "Ready"})
-                    if len(tasks) > 0:
-                        task = tasks[0]
-                        err = task.get('Status', {}).get('Err')
-                        if err:
-                            if 'failed to allocate gateway' in err:
-                                client._docker_api.prune_networks()
-                            elif 'No such image' in err:
-                                raise DeploymentError('Service {}: {}'.format(service_name, err))
-                            else:
-                                raise DeploymentError('Could not deploy {}: {}'.format(service.name, err))
-            return len(services) == state_ok
-        return False
+        if not services:
+            return False
+        watcher.update(client.get_tasks(services.keys()))
+        ready = watcher.running() if readiness is None else readiness.update(watcher.running())
+
+        elapsed = time.time() - start
+        for name in waited:
+            if name in ready:
+                converged.setdefault(name, elapsed)
+            elif elapsed > timeouts[name]:
+                raise AssertionError('Timeout: service {} is not ready after {:.1f} s'.format(name, elapsed))
+        return len(converged) == len(waited)
+
+    def delay():
+        return min([delays[name] for name in waited if name not in converged] or [Settings.wait_delay])
 
     assert isinstance(client._docker, docker.DockerClient)
-    return wait_on_condition(condition)
+    wait_on_condition(condition, delay=delay, timeout=max(timeouts.values() or [Settings.wait_timeout]) + 1)
+    return converged